@@ -0,0 +1,192 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from flask import jsonify
+from .metrics import (ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED,
+                      ADMISSION_WAIT_SECONDS, CIRCUIT_STATE)
+
+# Bounds on the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class Overloaded(Exception):
+    """The LLM backend cannot take this call now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message, retry_after=MIN_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = max(MIN_RETRY_AFTER, min(int(math.ceil(retry_after)), MAX_RETRY_AFTER))
+
+
+class CircuitOpen(Overloaded):
+    pass
+
+
+def overloaded_response(e):
+    """503 JSON response for an Overloaded error, with a Retry-After header."""
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+class AdmissionGate:
+    """Caps concurrent calls to one backend, with a bounded FIFO wait queue.
+
+    A call either gets one of ``max_concurrency`` slots, waits in a queue
+    of at most ``max_queue`` callers for up to ``queue_timeout`` seconds,
+    or is rejected at once with Overloaded. Rejections carry a Retry-After
+    estimate from the queue depth and recent call durations.
+    """
+
+    def __init__(self, name, max_concurrency=4, max_queue=16, queue_timeout=10.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._hold_seconds = 1.0     # moving average of slot hold times
+        self.admitted = 0
+        self.rejected = 0
+        self._publish()
+
+    def _publish(self):
+        ADMISSION_IN_FLIGHT.set(self._active, backend=self.name)
+        ADMISSION_QUEUE_DEPTH.set(self._waiting, backend=self.name)
+
+    def _retry_after(self):
+        return self._hold_seconds * (self._waiting + 1) / max(self.max_concurrency, 1)
+
+    def _reject(self, reason, message):
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(backend=self.name, reason=reason)
+        raise Overloaded(message, self._retry_after())
+
+    def acquire(self, timeout=-1):
+        """Take a slot, waiting in the queue if needed.
+
+        Args:
+            timeout (float): Longest wait in seconds; -1 uses queue_timeout.
+                None waits as long as it takes and is never turned away,
+                for background work such as ingestion
+        Raises:
+            Overloaded: The queue is full or the wait timed out
+        """
+        if timeout == -1:
+            timeout = self.queue_timeout
+        start = time.monotonic()
+        with self._cond:
+            if self._active >= self.max_concurrency:
+                if timeout is not None and self._waiting >= self.max_queue:
+                    self._reject('queue_full', f"The {self.name} backend is saturated; try again later")
+                self._waiting += 1
+                self._publish()
+                try:
+                    deadline = None if timeout is None else start + timeout
+                    while self._active >= self.max_concurrency:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._reject('timeout', f"Timed out waiting for the {self.name} backend")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    self._publish()
+            self._active += 1
+            self.admitted += 1
+            self._publish()
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, backend=self.name)
+        return time.monotonic()
+
+    def release(self, acquired_at):
+        with self._cond:
+            self._active -= 1
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - acquired_at)
+            self._publish()
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout=-1):
+        acquired_at = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'in_flight': self._active,
+                'queued': self._waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_call_seconds': round(self._hold_seconds, 3),
+            }
+
+
+class CircuitBreaker:
+    """Stops calling a failing backend for ``reset_timeout`` seconds.
+
+    After ``failure_threshold`` consecutive failures (connection errors,
+    timeouts, 5xx) the circuit opens and calls fail fast with CircuitOpen.
+    Once the timeout passes a single probe call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._publish()
+
+    def _publish(self):
+        CIRCUIT_STATE.set({self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self.state])
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+                self._probing = False
+                self._publish()
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            ADMISSION_REJECTED.inc(backend='ollama', reason='circuit_open')
+            raise CircuitOpen("The language model backend is unavailable; try again later",
+                              max(remaining, MIN_RETRY_AFTER))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._publish()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._publish()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self._failures}
@@ -0,0 +1,111 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# Preferred chunk boundaries, strongest first
+SEPARATORS = ("\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ")
+
+_NON_SPACE = re.compile(r'\S')
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int   # offset of the first character in the source text
+    end: int     # offset just past the last character
+    index: int
+
+
+@lru_cache(maxsize=None)
+def token_length(tokenizer_name):
+    """Token counter for a Hugging Face tokenizer, loaded once per process."""
+    from transformers import AutoTokenizer  # optional dependency; only token budgets need it
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _split_point(buffer, start, limit, separators):
+    """End of the chunk starting at ``start``: the strongest separator in the
+    second half of the window, or a hard cut at ``limit``."""
+    floor = start + (limit - start) // 2
+    for separator in separators:
+        found = buffer.rfind(separator, floor, limit)
+        if found != -1:
+            return found + len(separator)
+    return limit
+
+
+def iter_chunks(source, chunk_size=512, overlap=0, length=None, separators=SEPARATORS):
+    """Lazily split text into chunks that break at natural boundaries.
+
+    Chunks are yielded as they are found, so callers can start embedding
+    before the whole document is split. Input is read piece by piece and
+    only about one window of it is buffered, so multi-megabyte documents
+    stream through in bounded memory.
+
+    Args:
+        source (str or iterable): The text, or an iterable of text pieces
+            (e.g. an open file)
+        chunk_size (int): Budget per chunk, in characters or in ``length`` units
+        overlap (int): Budget repeated from the end of the previous chunk
+        length (callable): Measures a chunk, e.g. token_length(name) for a
+            token budget; None counts characters
+        separators (tuple): Boundaries to prefer, strongest first
+    Yields:
+        Chunk: text with whitespace trimmed, its offsets and its position
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    pieces = iter((source,)) if isinstance(source, str) else iter(source)
+    buffer = ''
+    base = 0        # offset of buffer[0] in the source
+    pos = 0         # start of the next chunk within buffer
+    exhausted = False
+    # Characters per length unit, refined as chunks are measured
+    ratio = 1.0 if length is None else 4.0
+    index = 0
+
+    while True:
+        window = max(int(chunk_size * ratio), 1)
+        while not exhausted and len(buffer) - pos <= window:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                # Drop consumed text before growing, keeping the buffer near one window
+                buffer = buffer[pos:] + piece
+                base += pos
+                pos = 0
+
+        match = _NON_SPACE.search(buffer, pos)
+        if match is None:
+            if exhausted:
+                return
+            pos = len(buffer)
+            continue
+        pos = match.start()
+
+        limit = min(pos + window, len(buffer))
+        end = limit if limit == len(buffer) and exhausted else _split_point(buffer, pos, limit, separators)
+        text = buffer[pos:end].rstrip()
+        if length is not None:
+            size = length(text)
+            while size > chunk_size and end - pos > 1:
+                window = max(int((end - pos) * chunk_size / size * 0.9), 1)
+                end = _split_point(buffer, pos, pos + window, separators)
+                text = buffer[pos:end].rstrip()
+                size = length(text)
+            ratio = max(len(text) / max(size, 1), 0.5)
+
+        yield Chunk(text, base + pos, base + pos + len(text), index)
+        index += 1
+        if end >= len(buffer) and exhausted:
+            return
+
+        next_pos = end
+        if overlap:
+            # Step back by the overlap budget, then forward to a word start
+            back = max(end - int(overlap * ratio), pos + 1)
+            space = buffer.find(' ', back, end)
+            next_pos = space + 1 if space != -1 else end
+        pos = next_pos
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from .metrics import EMBED_BATCH_TEXTS, EMBED_COALESCED
+
+
+class EmbeddingBatcher:
+    """Coalesces single-text embedding requests from many threads into batches.
+
+    Callers block on a future while ``workers`` dispatcher threads drain
+    the queue, each sending up to ``max_batch_size`` distinct texts per
+    upstream call. Texts queued while calls are running form the next
+    batch, so batches grow with load; a second worker keeps the next call
+    on the wire while one is in flight. Under load (the last batch had company) the dispatcher also
+    waits up to ``max_wait`` seconds for a batch to fill; a lone request on
+    an idle service is sent at once. Identical texts in flight share one
+    future.
+    """
+
+    def __init__(self, embed_batch, max_batch_size=16, max_wait=0.005, workers=2):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._queue = []        # distinct texts waiting for a batch, oldest first
+        self._pending = {}      # text -> Future, until its batch returns
+        self._threads = []
+        self._pid = None
+        self._last_batch_size = 0
+
+    def _ensure_dispatcher(self):
+        # A forked worker inherits the state but not the threads
+        if not self._threads or self._pid != os.getpid():
+            self._queue, self._pending = [], {}
+            self._pid = os.getpid()
+            self._threads = [threading.Thread(target=self._run, name=f'embed-batcher-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, text):
+        """Queue ``text`` and return a Future of its embedding.
+
+        The result is None when the upstream call failed; errors that must
+        reach the caller, such as Overloaded, are raised from the future.
+        """
+        with self._cond:
+            self._ensure_dispatcher()
+            future = self._pending.get(text)
+            if future is not None:
+                EMBED_COALESCED.inc()
+                return future
+            future = self._pending[text] = Future()
+            self._queue.append(text)
+            self._cond.notify()
+            return future
+
+    def embed(self, text, timeout=None):
+        return self.submit(text).result(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + (self.max_wait if self._last_batch_size > 1 else 0)
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            self._last_batch_size = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            texts = self._next_batch()
+            EMBED_BATCH_TEXTS.observe(len(texts))
+            error = None
+            try:
+                embeddings = self.embed_batch(texts)
+            except Exception as e:
+                # e.g. Overloaded; every waiter of the batch gets the error
+                error = e
+            with self._cond:
+                futures = [self._pending.pop(text) for text in texts]
+            for i, future in enumerate(futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(embeddings[i])
@@ -0,0 +1,176 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies of a text share a key."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cache_key(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (model_name, hash of normalized text).
+
+    A bounded in-process LRU sits in front of a SQLite table holding raw
+    float32 vectors, so embeddings survive restarts and are shared between
+    re-scrapes, documents with common boilerplate and repeated questions.
+    The file is only an optimisation: if SQLite fails (say it stays locked
+    by another worker), a lookup is a miss and a write is skipped.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.path = None
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # Serialises use of the connection, so LRU hits never wait on disk
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # In memory only until open() attaches the SQLite tier
+        self._conn = None
+
+    def open(self, path, busy_timeout=5000):
+        """Keep vectors in the SQLite file at ``path`` too; an empty path keeps them in memory only.
+
+        The file is put in WAL mode so workers can read while one writes, and
+        a writer waits up to ``busy_timeout`` milliseconds for the lock.
+        """
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.path = path
+            if not path:
+                return
+            conn = None
+            try:
+                conn = sqlite3.connect(path, check_same_thread=False)
+                conn.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                    " model TEXT NOT NULL,"
+                    " key TEXT NOT NULL,"
+                    " dim INTEGER NOT NULL,"
+                    " vector BLOB NOT NULL,"
+                    " PRIMARY KEY (model, key))"
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                if conn is not None:
+                    conn.close()
+                print(f"Embedding cache kept in memory only: {str(e)}")
+                return
+            self._conn = conn
+
+    def _remember(self, lru_key, vector):
+        self._lru[lru_key] = vector
+        self._lru.move_to_end(lru_key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def _read(self, model, key):
+        if self._conn is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT vector FROM embedding_cache WHERE model = ? AND key = ?",
+                    (model, key)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Embedding cache read failed: {str(e)}")
+            return None
+        return np.frombuffer(row[0], dtype=np.float32) if row is not None else None
+
+    def _write(self, statement, rows):
+        """Run ``statement`` once per parameter row and commit; a failure is logged, not raised."""
+        if self._conn is None:
+            return
+        try:
+            with self._db_lock:
+                try:
+                    self._conn.executemany(statement, rows)
+                    self._conn.commit()
+                except sqlite3.Error:
+                    self._conn.rollback()
+                    raise
+        except sqlite3.Error as e:
+            print(f"Embedding cache write skipped: {str(e)}")
+
+    def get(self, model, text):
+        """Return the cached embedding for ``text`` or None."""
+        key = cache_key(text)
+        lru_key = (model, key)
+        with self._lock:
+            vector = self._lru.get(lru_key)
+            if vector is not None:
+                self._lru.move_to_end(lru_key)
+                self.hits += 1
+                return vector
+
+        vector = self._read(model, key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self._remember(lru_key, vector)
+            self.hits += 1
+            self.persistent_hits += 1
+            return vector
+
+    def put(self, model, text, embedding):
+        self.put_many(model, [(text, embedding)])
+
+    def put_many(self, model, items):
+        """Store (text, embedding) pairs in both tiers with a single commit."""
+        rows = []
+        with self._lock:
+            for text, embedding in items:
+                if embedding is None:
+                    continue
+                vector = np.array(embedding, dtype=np.float32)
+                vector.flags.writeable = False
+                key = cache_key(text)
+                self._remember((model, key), vector)
+                rows.append((model, key, vector.shape[0], vector.tobytes()))
+        if rows:
+            self._write(
+                "INSERT OR REPLACE INTO embedding_cache (model, key, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def invalidate(self, keep_model=None):
+        """Drop every entry not produced by ``keep_model`` (all entries if None)."""
+        with self._lock:
+            self._lru = OrderedDict(
+                (k, v) for k, v in self._lru.items() if keep_model is not None and k[0] == keep_model
+            )
+        if keep_model is None:
+            self._write("DELETE FROM embedding_cache", [()])
+        else:
+            self._write("DELETE FROM embedding_cache WHERE model != ?", [(keep_model,)])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
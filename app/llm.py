@@ -1,45 +1,255 @@
 import requests
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from .embedding_cache import EmbeddingCache
+from .embedding_batcher import EmbeddingBatcher
+from .admission import AdmissionGate, CircuitBreaker, Overloaded
+from .chunking import iter_chunks
+from .metrics import UPSTREAM_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_ERRORS
+
+# Upstream failures worth retrying; anything else is returned to the caller
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class GenerationError(Exception):
+    """Ollama could not produce an answer; the message is what the user is shown."""
+
 
 class LLMService:
-    def __init__(self):
+    def __init__(self, api_base=None, embed_workers=4, embed_batch_size=16, max_retries=3,
+                 embedding_cache=None, embed_max_batch_size=16, embed_max_wait=0.005):
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
         self.model_name = "llama3.2:latest"
-        self.api_base = "http://localhost:11434"
+        self.api_base = api_base or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+        self.embed_workers = embed_workers
+        self.embed_batch_size = embed_batch_size
+        self.max_retries = max_retries
+        # Seconds; reads are per chunk, so a streamed answer may take longer overall
+        self.connect_timeout = 5
+        self.timeout = 120
+        self.embed_timeout = 30
+        self.last_embed_stats = None
+        # None until probed; False once Ollama turns out to have no /api/embed route
+        self._batch_endpoint = None
+        # Single-text lookups from concurrent requests share upstream calls
+        self.embedding_batcher = EmbeddingBatcher(self._embed_and_cache, embed_max_batch_size, embed_max_wait)
+        # Admission control: bounded concurrency and wait queues per kind of call,
+        # and a breaker that fails fast while Ollama is down
+        self.generate_gate = AdmissionGate('generate', max_concurrency=2, max_queue=16, queue_timeout=10)
+        self.embed_gate = AdmissionGate('embed', max_concurrency=16, max_queue=64, queue_timeout=5)
+        self.circuit_breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+
+        # One keep-alive session shared by every call, sized for the embed workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(embed_workers, 10))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def init_app(self, app):
+        from .database import data_directory
+
+        path = app.config.get('EMBEDDING_CACHE_PATH')
+        if path is None:
+            path = os.path.join(data_directory(app), 'embedding_cache.db')
+        self.embedding_cache.open(path)
+        # The file may hold vectors from a model used before
+        self.embedding_cache.invalidate(keep_model=self.model_name)
+        self.embedding_batcher.max_batch_size = app.config.get('EMBED_MAX_BATCH_SIZE',
+                                                               self.embedding_batcher.max_batch_size)
+        self.embedding_batcher.max_wait = app.config.get('EMBED_MAX_WAIT_MS',
+                                                         self.embedding_batcher.max_wait * 1000) / 1000
+        self.embedding_batcher.workers = app.config.get('EMBED_BATCH_WORKERS', self.embedding_batcher.workers)
+        for prefix, gate in (('GENERATE', self.generate_gate), ('EMBED', self.embed_gate)):
+            gate.max_concurrency = app.config.get(f'{prefix}_CONCURRENCY', gate.max_concurrency)
+            gate.max_queue = app.config.get(f'{prefix}_QUEUE_SIZE', gate.max_queue)
+            gate.queue_timeout = app.config.get(f'{prefix}_QUEUE_TIMEOUT', gate.queue_timeout)
+        self.circuit_breaker.failure_threshold = app.config.get('CIRCUIT_FAILURE_THRESHOLD',
+                                                                self.circuit_breaker.failure_threshold)
+        self.circuit_breaker.reset_timeout = app.config.get('CIRCUIT_RESET_SECONDS',
+                                                            self.circuit_breaker.reset_timeout)
+        self.connect_timeout = app.config.get('LLM_CONNECT_TIMEOUT', self.connect_timeout)
+        self.timeout = app.config.get('LLM_TIMEOUT', self.timeout)
+        self.embed_timeout = app.config.get('EMBED_TIMEOUT', self.embed_timeout)
+        app.extensions['llm_service'] = self
+
+    def admission_stats(self):
+        return {
+            'generate': self.generate_gate.stats(),
+            'embed': self.embed_gate.stats(),
+            'circuit': self.circuit_breaker.stats(),
+        }
+
+    @property
+    def model_name(self):
+        return self._model_name
+
+    @model_name.setter
+    def model_name(self, value):
+        # Vectors from another model are meaningless here, so drop them
+        self._model_name = value
+        self.embedding_cache.invalidate(keep_model=value)
+
+    def _post(self, path, payload, **kwargs):
+        """POST to the Ollama API, retrying transient failures with backoff.
+
+        Every attempt is recorded in the upstream latency, request and error
+        metrics, labelled by endpoint, and in the circuit breaker; while the
+        circuit is open calls fail fast with CircuitOpen.
+        """
+        timeout = (self.connect_timeout, kwargs.pop("timeout", self.timeout))
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            self.circuit_breaker.before_call()
+            start_time = time.perf_counter()
+            try:
+                response = self.session.post(
+                    f"{self.api_base}{path}",
+                    json=payload,
+                    timeout=timeout,
+                    **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - start_time, endpoint=path)
+                UPSTREAM_ERRORS.inc(endpoint=path,
+                                    reason="timeout" if isinstance(e, requests.Timeout) else "connection")
+                self.circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+            else:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - start_time, endpoint=path)
+                UPSTREAM_REQUESTS.inc(endpoint=path, status=response.status_code)
+                if response.status_code >= 400:
+                    UPSTREAM_ERRORS.inc(endpoint=path, reason=str(response.status_code))
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+            time.sleep(delay)
+            delay *= 2
+
+    def _generate_payload(self, prompt, context, max_length, stream, conversation=None, history=()):
+        if conversation:
+            # The model already holds the earlier context and turns; send only what is new
+            text = f"Question: {prompt}\n\nAnswer:"
+            if context:
+                text = f"Context: {context}\n\n{text}"
+        else:
+            turns = "".join(f"Question: {question}\n\nAnswer: {answer}\n\n" for question, answer in history)
+            text = f"Context: {context}\n\n{turns}Question: {prompt}\n\nAnswer:"
+        payload = {
+            "model": self.model_name,
+            "prompt": text,
+            "stream": stream,
+            "options": {
+                "temperature": 0.7,
+                "max_length": max_length
+            }
+        }
+        if conversation:
+            payload["context"] = conversation
+        return payload
 
     def generate_response(self, prompt, context="", max_length=512):
-        """Generate response using LLaMA model with given prompt and context."""
-        full_prompt = f"Context: {context}\n\nQuestion: {prompt}\n\nAnswer:"
-        
+        """Generate response using LLaMA model with given prompt and context.
+
+        Raises:
+            Overloaded: No generation slot is free; other errors are returned
+                as the response text
+        """
         try:
-            response = requests.post(
-                f"{self.api_base}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "max_length": max_length
-                    }
-                }
+            return self.generate_with_context(prompt, context, max_length)[0]
+        except GenerationError as e:
+            return str(e)
+
+    def generate_with_context(self, prompt, context="", max_length=512, conversation=None, history=()):
+        """Generate a response and return Ollama's token context with it.
+
+        Args:
+            conversation (list): Token context returned for the previous turn
+                of a session; the prompt then carries only the new question
+                and ``context``
+            history (list): (question, answer) turns to put in a full prompt
+                when there is no ``conversation`` to continue
+        Returns:
+            tuple: (response text, token context or None)
+        Raises:
+            Overloaded: No generation slot is free
+            GenerationError: The request to Ollama failed
+        """
+        with self.generate_gate.slot():
+            try:
+                response = self._post(
+                    "/api/generate",
+                    self._generate_payload(prompt, context, max_length, stream=False, conversation=conversation,
+                                           history=history)
+                )
+                response.raise_for_status()
+                result = response.json()
+                return result['response'].strip(), result.get('context')
+            except Overloaded:
+                raise
+            except Exception as e:
+                raise GenerationError(f"Error generating response: {str(e)}") from e
+
+    def generate_response_stream(self, prompt, context="", max_length=512, conversation=None, history=()):
+        """Start a streamed generation and return its tokens as a TokenStream.
+
+        The generation slot is taken and the request sent before this
+        returns, so Overloaded and connection errors surface while the
+        caller can still answer 503; the slot is held until the stream is
+        exhausted or closed. Later errors propagate from iteration so a
+        partially streamed answer is never mistaken for a complete one.
+        ``conversation`` and ``history`` are as for generate_with_context;
+        the stream's ``context`` is set once it completes.
+        """
+        acquired_at = self.generate_gate.acquire()
+        try:
+            response = self._post(
+                "/api/generate",
+                self._generate_payload(prompt, context, max_length, stream=True, conversation=conversation,
+                                       history=history),
+                stream=True
             )
             response.raise_for_status()
-            result = response.json()
-            return result['response'].strip()
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
+        except BaseException:
+            self.generate_gate.release(acquired_at)
+            raise
+        return TokenStream(response, lambda: self.generate_gate.release(acquired_at))
 
     def get_embedding(self, text):
-        """Generate embeddings for the given text using Ollama's embedding endpoint."""
+        """Generate embeddings for the given text using Ollama's embedding endpoint.
+
+        Cache misses go through the embedding batcher, so concurrent callers
+        are served by shared batched calls. Admission control applies to
+        those upstream calls: when no slot frees up in time every caller
+        of the batch gets Overloaded.
+        """
+        cached = self.embedding_cache.get(self.model_name, text)
+        if cached is not None:
+            return cached
+        return self.embedding_batcher.embed(text)
+
+    def _embed_and_cache(self, texts):
+        # Runs on a batcher dispatch thread: one slot per upstream call, however many questions share it
+        with self.embed_gate.slot():
+            embeddings = self._embed_batch(texts)
+        self.embedding_cache.put_many(self.model_name, zip(texts, embeddings))
+        return embeddings
+
+    def _fetch_embedding(self, text):
         try:
-            response = requests.post(
-                f"{self.api_base}/api/embeddings",
-                json={
+            response = self._post(
+                "/api/embeddings",
+                {
                     "model": self.model_name,
                     "prompt": text
-                }
+                },
+                timeout=self.embed_timeout
             )
-            print("response", response)
             response.raise_for_status()
             result = response.json()
             
@@ -49,66 +259,157 @@ class LLMService:
             import numpy as np
             embedding = np.array(result['embedding'], dtype=np.float32)
             return embedding
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
             return None
 
-    def chunk_text(self, text, chunk_size=512):
-        """Split text into semantically meaningful chunks for processing.
+    def _embed_batch(self, texts):
+        """Embed one batch, using Ollama's multi-input endpoint when it exists."""
+        import numpy as np
+
+        if self._batch_endpoint is not False:
+            try:
+                response = self._post("/api/embed", {"model": self.model_name, "input": texts},
+                                      timeout=self.embed_timeout)
+                if response.status_code == 404 and _route_missing(response):
+                    self._batch_endpoint = False
+                else:
+                    response.raise_for_status()
+                    embeddings = response.json().get("embeddings")
+                    if embeddings is None or len(embeddings) != len(texts):
+                        raise ValueError("Batch embedding response does not match input")
+                    self._batch_endpoint = True
+                    return [np.array(e, dtype=np.float32) for e in embeddings]
+            except Overloaded:
+                raise
+            except Exception as e:
+                print(f"Error generating batch embedding: {str(e)}")
+                return [None] * len(texts)
+
+        return [self._fetch_embedding(text) for text in texts]
+
+    def _embed_batch_queued(self, texts):
+        # Background work waits its turn for a slot instead of being turned away
+        with self.embed_gate.slot(timeout=None):
+            return self._embed_batch(texts)
+
+    def embed_texts(self, texts):
+        """Embed many texts concurrently over the pooled session.
+        Args:
+            texts (list): Texts to embed
+        Returns:
+            list: Embeddings in the same order as ``texts``; failed items are None
+        """
+        embeddings, self.last_embed_stats = self.embed_texts_with_stats(texts)
+        return embeddings
+
+    def embed_texts_with_stats(self, texts):
+        """Same as embed_texts, but also returns this call's throughput stats.
+
+        Prefer this from worker threads, where last_embed_stats may already
+        have been overwritten by another call.
+        """
+        texts = list(texts)
+        start_time = time.time()
+
+        # Serve what we can from the cache and embed each distinct miss once
+        embeddings = [self.embedding_cache.get(self.model_name, text) for text in texts]
+        cache_hits = sum(1 for e in embeddings if e is not None)
+        misses = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        batches = [misses[i:i + self.embed_batch_size] for i in range(0, len(misses), self.embed_batch_size)]
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.embed_workers) as executor:
+                results = list(executor.map(self._embed_batch_queued, batches))
+            fetched = dict(zip(misses, (e for batch in results for e in batch)))
+            self.embedding_cache.put_many(self.model_name, fetched.items())
+            embeddings = [e if e is not None else fetched.get(t) for t, e in zip(texts, embeddings)]
+
+        elapsed = time.time() - start_time
+        stats = {
+            "texts": len(texts),
+            "characters": sum(len(t) for t in texts),
+            "cache_hits": cache_hits,
+            "batches": len(batches),
+            "failed": sum(1 for e in embeddings if e is None),
+            "seconds": round(elapsed, 3),
+            "texts_per_second": round(len(texts) / elapsed, 2) if elapsed > 0 else None,
+        }
+        return embeddings, stats
+
+    def chunk_text(self, text, chunk_size=512, overlap=0):
+        """Split text into chunks that break at paragraph, sentence or word boundaries.
         Args:
             text (str): The input text to be chunked
             chunk_size (int): Target size for each chunk in characters
+            overlap (int): Characters repeated from the end of the previous chunk
         Returns:
-            list: List of text chunks
+            list: List of text chunks; use chunking.iter_chunks to stream them
         """
-        # Split into paragraphs first
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for paragraph in paragraphs:
-            # Split paragraph into sentences (simple approach)
-            sentences = [s.strip() for s in paragraph.split('.') if s.strip()]
-            
-            for sentence in sentences:
-                sentence = sentence.strip() + '.'
-                sentence_length = len(sentence)
-                
-                # If single sentence exceeds chunk size, split by words
-                if sentence_length > chunk_size:
-                    words = sentence.split()
-                    temp_chunk = []
-                    temp_length = 0
-                    
-                    for word in words:
-                        word_length = len(word) + 1  # +1 for space
-                        if temp_length + word_length > chunk_size:
-                            chunks.append(' '.join(temp_chunk))
-                            temp_chunk = [word]
-                            temp_length = word_length
-                        else:
-                            temp_chunk.append(word)
-                            temp_length += word_length
-                    
-                    if temp_chunk:
-                        chunks.append(' '.join(temp_chunk))
+        return [chunk.text for chunk in iter_chunks(text, chunk_size, overlap)]
+
+
+def _route_missing(response):
+    """True when a 404 is for the route itself rather than, say, an unknown model.
+
+    Ollama reports API errors such as "model not found" as a JSON ``error``;
+    a route it does not have gets its HTTP router's plain-text 404 page.
+    """
+    try:
+        return 'error' not in response.json()
+    except ValueError:
+        return True
+
+
+class TokenStream:
+    """Iterator over the tokens of a streamed /api/generate response.
+
+    ``close()`` (called automatically once the stream is exhausted or
+    fails) closes the HTTP response and runs ``on_close`` exactly once,
+    even if iteration never started.
+    """
+
+    def __init__(self, response, on_close):
+        self._response = response
+        self._on_close = on_close
+        self._lines = response.iter_lines()
+        self._done = False
+        # Ollama's token context, from the final chunk
+        self.context = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            while not self._done:
+                line = next(self._lines, None)
+                if line is None:
+                    break
+                if not line:
                     continue
-                
-                # Check if adding this sentence would exceed chunk size
-                if current_length + sentence_length > chunk_size and current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                    current_chunk = [sentence]
-                    current_length = sentence_length
-                else:
-                    current_chunk.append(sentence)
-                    current_length += sentence_length
-        
-        # Add any remaining text
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                self._done = bool(chunk.get("done"))
+                if self._done:
+                    self.context = chunk.get("context")
+                if chunk.get("response"):
+                    return chunk["response"]
+        except BaseException:
+            self.close()
+            raise
+        self.close()
+        raise StopIteration
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            self._response.close()
+            on_close()
+
 
 # Initialize LLM service as a singleton
 llm_service = LLMService()
\ No newline at end of file
@@ -1,8 +1,15 @@
-from flask import Blueprint, request, jsonify
-from .models import db, Document, DocumentChunk, ChatHistory
+from flask import Blueprint, Response, request, jsonify
+from .models import db
 from .llm import llm_service
-import numpy as np
-from datetime import datetime
+from .ingest import ingest_document
+from .ask import answer_question
+from .jobs import job_manager
+from .answer_cache import answer_cache
+from .metrics import metrics, stage_timings
+from .history import chat_history_page, DEFAULT_PAGE_SIZE
+from .history_writer import history_writer
+from .sessions import session_store
+from .admission import Overloaded
 
 main_bp = Blueprint('main', __name__)
 
@@ -13,34 +20,67 @@ def process_document():
         return jsonify({'error': 'Missing required fields'}), 400
 
     try:
-        # Create new document
-        document = Document(
-            url=data['url'],
-            content=data['content'],
-            embedding=np.array(llm_service.get_embedding(data['content'])).tobytes()
-        )
-        db.session.add(document)
-        db.session.flush()
-
-        # Process document chunks
-        chunks = llm_service.chunk_text(data['content'])
-        for idx, chunk in enumerate(chunks):
-            chunk_embedding = np.array(llm_service.get_embedding(chunk)).tobytes()
-            doc_chunk = DocumentChunk(
-                document_id=document.id,
-                content=chunk,
-                embedding=chunk_embedding,
-                chunk_index=idx
-            )
-            db.session.add(doc_chunk)
-
-        db.session.commit()
-        return jsonify({'message': 'Document processed successfully', 'document_id': document.id})
+        document, stats = ingest_document(data['url'], data['content'])
+        body = {
+            'message': 'Document processed successfully',
+            'document_id': document.id,
+            'embedding_stats': stats
+        }
+        if data.get('timings'):
+            body['timings'] = stage_timings()
+        return jsonify(body)
 
+    except Overloaded:
+        # The app's error handler answers 503
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json()
+    if not data or 'url' not in data:
+        return jsonify({'error': 'URL is required'}), 400
+
+    job = job_manager.submit(data['url'], data.get('content'))
+    return jsonify({'job_id': job.id, 'status_url': f"/api/jobs/{job.id}"}), 202
+
+@main_bp.route('/api/maintenance', methods=['POST'])
+def submit_maintenance():
+    """Start a retention and compaction run in the background; poll /api/jobs/<id> for its report."""
+    data = request.get_json(silent=True) or {}
+    if 'everything' in data:
+        # Wiping the database is left to the command line, out of reach of any web page
+        return jsonify({'error': 'everything is only available from db_maintenance.py'}), 400
+    options = {}
+    for key, kind in (('history_max_age_days', (int, float)), ('history_max_rows', int),
+                      ('batch_size', int), ('pause_ms', (int, float))):
+        value = data.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, kind) or value < 0:
+            return jsonify({'error': f'{key} must be a non-negative number'}), 400
+        options[key] = value
+    for key in ('superseded', 'vacuum', 'convert'):
+        if key in data:
+            if not isinstance(data[key], bool):
+                return jsonify({'error': f'{key} must be true or false'}), 400
+            options[key] = data[key]
+    if options.get('batch_size') == 0:
+        return jsonify({'error': 'batch_size must be positive'}), 400
+
+    job = job_manager.submit_maintenance(**options)
+    return jsonify({'job_id': job.id, 'status_url': f"/api/jobs/{job.id}"}), 202
+
+@main_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @main_bp.route('/ask', methods=['POST'])
 def ask_question():
     data = request.get_json()
@@ -48,53 +88,50 @@ def ask_question():
         return jsonify({'error': 'Question is required'}), 400
 
     try:
-        # Get question embedding
-        question_embedding = llm_service.get_embedding(data['question'])
-
-        # Find most relevant chunks
-        chunks = DocumentChunk.query.all()
-        similarities = []
-        for chunk in chunks:
-            chunk_embedding = np.frombuffer(chunk.embedding, dtype=np.float32)
-            similarity = np.dot(question_embedding, chunk_embedding)
-            similarities.append((similarity, chunk))
-
-        # Sort by similarity and get top chunks
-        similarities.sort(key=lambda x: x[0], reverse=True)
-        top_chunks = [chunk.content for _, chunk in similarities[:3]]
-        context = '\n'.join(top_chunks)
-
-        # Generate response
-        answer = llm_service.generate_response(data['question'], context)
-
-        # Save to chat history
-        chat_history = ChatHistory(
-            question=data['question'],
-            answer=answer,
-            context=context
-        )
-        db.session.add(chat_history)
-        db.session.commit()
-
-        return jsonify({
-            'answer': answer,
-            'context': context
-        })
+        return answer_question(data)
 
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/api/answer_cache', methods=['GET'])
+def get_answer_cache_stats():
+    return jsonify(answer_cache.stats())
+
+@main_bp.route('/api/sessions', methods=['GET'])
+def get_session_stats():
+    return jsonify(session_store.stats())
+
+@main_bp.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if not session_store.drop(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    return '', 204
+
+@main_bp.route('/api/admission', methods=['GET'])
+def get_admission_stats():
+    return jsonify(llm_service.admission_stats())
+
+@main_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @main_bp.route('/chat_history', methods=['GET'])
 def get_chat_history():
+    fields = request.args.get('fields')
+    # Rows still queued behind /ask are committed first, so a client sees its own questions
+    history_writer.flush(timeout=5)
     try:
-        history = ChatHistory.query.order_by(ChatHistory.created_at.desc()).all()
-        return jsonify([
-            {
-                'id': h.id,
-                'question': h.question,
-                'answer': h.answer,
-                'created_at': h.created_at.isoformat()
-            } for h in history
-        ])
+        page = chat_history_page(
+            before=request.args.get('before'),
+            since=request.args.get('since'),
+            document_id=request.args.get('document_id', type=int),
+            fields=fields.split(',') if fields else None,
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+    return jsonify(page)
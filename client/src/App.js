@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import "./App.css";
 
 function App() {
@@ -9,7 +9,10 @@ function App() {
   const [isLoading, setIsLoading] = useState(false);
   const [isInitialized, setIsInitialized] = useState(false);
   const [scrapedText, setScrapedText] = useState("");
+  const [documentId, setDocumentId] = useState(null);
   const [chatHistory, setChatHistory] = useState([]);
+  // Cursor of the newest history row we hold; later fetches only ask for newer rows
+  const historyCursor = useRef(null);
 
   useEffect(() => {
     fetchChatHistory();
@@ -17,9 +20,27 @@ function App() {
 
   const fetchChatHistory = async () => {
     try {
-      const response = await fetch("http://localhost:5000/chat_history");
-      const data = await response.json();
-      setChatHistory(data);
+      if (historyCursor.current === null) {
+        const response = await fetch("http://localhost:5000/chat_history");
+        const data = await response.json();
+        historyCursor.current = data.latest_cursor;
+        setChatHistory(data.items);
+        return;
+      }
+
+      // Rows newer than the cursor come back oldest first
+      let hasMore = true;
+      while (hasMore) {
+        const response = await fetch(
+          `http://localhost:5000/chat_history?since=${encodeURIComponent(historyCursor.current)}`
+        );
+        const data = await response.json();
+        historyCursor.current = data.latest_cursor;
+        hasMore = data.has_more;
+        if (data.items.length) {
+          setChatHistory((history) => [...data.items.reverse(), ...history]);
+        }
+      }
     } catch (err) {
       console.error("Failed to fetch chat history:", err);
     }
@@ -65,6 +86,7 @@ function App() {
       }
 
       setScrapedText(data.text);
+      setDocumentId(data.document_id);
       setIsInitialized(true);
       setUrl("");
     } catch (err) {
@@ -86,17 +108,47 @@ function App() {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Accept: "text/event-stream",
         },
-        body: JSON.stringify({ question }),
+        // Only search the document that was just analyzed
+        body: JSON.stringify({ question, document_id: documentId, stream: true }),
       });
 
-      const data = await response.json();
-
       if (!response.ok) {
+        const data = await response.json();
         throw new Error(data.error || "Failed to get answer");
       }
 
-      setAnswer(data.answer);
+      // Render tokens as they arrive instead of waiting for the full answer
+      setAnswer("");
+      let streamed = "";
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const eventLine = raw.split("\n").find((l) => l.startsWith("event: "));
+          const dataLine = raw.split("\n").find((l) => l.startsWith("data: "));
+          if (!eventLine || !dataLine) continue;
+          const event = eventLine.substring(7);
+          const payload = JSON.parse(dataLine.substring(6));
+
+          if (event === "token") {
+            streamed += payload.token;
+            setAnswer(streamed);
+          } else if (event === "error") {
+            throw new Error(payload.error);
+          }
+        }
+      }
+
       setQuestion("");
       fetchChatHistory(); // Refresh chat history after new question
     } catch (err) {
@@ -2,23 +2,90 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
+import time
+from .metrics import STARTUP_SECONDS
+from .database import database_uri, configure_database
 
 db = SQLAlchemy()
 migrate = Migrate()
 
 def create_app():
+    start_time = time.perf_counter()
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rag.db'
+    # DATABASE_URL picks another database; SQLite (rag.db) is the default
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    print("Initializing app")
-    
+    app.config['EMBEDDING_DTYPE'] = 'float32'
+    # Embedding cache file: None keeps embedding_cache.db beside the database, '' keeps the cache in memory
+    app.config['EMBEDDING_CACHE_PATH'] = None
+    # Chunk budget in characters, or in tokens of CHUNK_TOKENIZER when it is set
+    app.config['CHUNK_SIZE'] = 512
+    app.config['CHUNK_OVERLAP'] = 0
+    # Default /ask ranking: 'vector', 'bm25' or 'hybrid'; a request may pick its own
+    app.config['RETRIEVAL_MODE'] = 'vector'
+    # /ask prompt context: tokens of chunk text (estimated unless CHUNK_TOKENIZER is set),
+    # chosen by MMR from CONTEXT_CANDIDATES retrieved chunks (per document when comparing)
+    app.config['CONTEXT_TOKEN_BUDGET'] = 384
+    app.config['CONTEXT_CANDIDATES'] = 12
+    app.config['CONTEXT_MMR_LAMBDA'] = 0.7
+    # Chat history is written behind /ask by one thread, up to HISTORY_BATCH_SIZE
+    # rows per commit; a full queue makes /ask write its row itself
+    app.config['HISTORY_WRITE_BEHIND'] = True
+    app.config['HISTORY_QUEUE_SIZE'] = 1024
+    app.config['HISTORY_BATCH_SIZE'] = 256
+    # Retention applied by maintenance runs (db_maintenance.py, /api/maintenance); None keeps everything.
+    # Rows are deleted MAINTENANCE_BATCH_SIZE at a time, MAINTENANCE_PAUSE_MS apart
+    app.config['HISTORY_MAX_AGE_DAYS'] = None
+    app.config['HISTORY_MAX_ROWS'] = None
+    app.config['MAINTENANCE_BATCH_SIZE'] = 500
+    app.config['MAINTENANCE_PAUSE_MS'] = 50
+    # /ask conversation sessions keep Ollama's token context in this process: at most
+    # SESSION_MAX_ENTRIES sessions and SESSION_MAX_BYTES, each idle for at most SESSION_TTL seconds
+    app.config['SESSION_MAX_ENTRIES'] = 1000
+    app.config['SESSION_TTL'] = 1800
+    app.config['SESSION_MAX_BYTES'] = 64 * 1024 * 1024
+    app.config['SESSION_MAX_CONTEXT_TOKENS'] = 4096
+    # Tokens of new chunk text a follow-up adds to the context the model already holds
+    app.config['SESSION_CONTEXT_TOKEN_BUDGET'] = 128
+    app.config['SESSION_HISTORY_TURNS'] = 4
+    # Any setting can be overridden with a FLASK_ prefixed environment variable
+    app.config.from_prefixed_env()
     db.init_app(app)
+    configure_database(app)
     migrate.init_app(app, db)
-    print("Done")
     CORS(app)
 
 
     from .routes import main_bp
     app.register_blueprint(main_bp)
 
+    # Any route whose Ollama call is rejected or fails fast answers 503 with Retry-After
+    from .admission import Overloaded, overloaded_response
+    app.register_error_handler(Overloaded, overloaded_response)
+
+    from .llm import llm_service
+    llm_service.init_app(app)
+
+    from .vector_index import vector_index
+    vector_index.init_app(app)
+
+    from .lexical_index import lexical_index
+    lexical_index.init_app(app)
+
+    from .jobs import job_manager
+    job_manager.init_app(app)
+
+    from .answer_cache import answer_cache
+    answer_cache.init_app(app)
+
+    from .history_writer import history_writer
+    history_writer.init_app(app)
+
+    from .sessions import session_store
+    session_store.init_app(app)
+
+    from .warmup import start_warmup
+    start_warmup(app)
+
+    STARTUP_SECONDS.set(round(time.perf_counter() - start_time, 3), phase='create_app')
     return app
\ No newline at end of file
@@ -0,0 +1,157 @@
+import json
+import os
+import numpy as np
+
+
+class FaissBackend:
+    """Approximate nearest-neighbour search over the vector index via faiss.
+
+    Supports ``hnsw`` (graph index, no training, removals handled with
+    tombstones on the graph's internal labels, so a chunk id that SQLite
+    reuses is live again once re-added) and ``ivf`` (inverted lists, trained once enough vectors
+    exist). Scores are inner products, matching the exact index.
+    """
+
+    def __init__(self, kind='hnsw', hnsw_m=32, ef_construction=80, ef_search=64,
+                 ivf_nlist=1024, nprobe=16):
+        import faiss  # optional dependency; callers fall back to exact search without it
+
+        if kind not in ('hnsw', 'ivf'):
+            raise ValueError(f"Unknown ANN backend: {kind}")
+        self.faiss = faiss
+        self.kind = kind
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.ivf_nlist = ivf_nlist
+        self.nprobe = nprobe
+        self.index = None
+        self.dim = None
+        self._tombstones = set()    # hnsw: internal labels of removed vectors
+        self._labels = None         # hnsw: chunk id of each internal label
+
+    @property
+    def ready(self):
+        return self.index is not None and self.index.is_trained and self.index.ntotal > 0
+
+    @property
+    def ntotal(self):
+        return 0 if self.index is None else self.index.ntotal - len(self._tombstones)
+
+    def _new_index(self, dim):
+        faiss = self.faiss
+        if self.kind == 'hnsw':
+            hnsw = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = self.ef_construction
+            return faiss.IndexIDMap2(hnsw)
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, self.ivf_nlist, faiss.METRIC_INNER_PRODUCT)
+
+    def min_train_size(self):
+        # faiss warns below ~39 points per centroid
+        return self.ivf_nlist * 39 if self.kind == 'ivf' else 1
+
+    def build(self, ids, matrix):
+        """(Re)build the index from scratch over all current vectors."""
+        self._tombstones = set()
+        self._labels = None
+        self.dim = matrix.shape[1] if matrix.ndim == 2 and matrix.shape[0] else None
+        self.index = None
+        if self.dim is None or matrix.shape[0] < self.min_train_size():
+            return
+        index = self._new_index(self.dim)
+        if not index.is_trained:
+            index.train(np.ascontiguousarray(matrix, dtype=np.float32))
+        index.add_with_ids(np.ascontiguousarray(matrix, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+        self.index = index
+        if self.kind == 'hnsw':
+            self._labels = np.array(ids, dtype=np.int64)
+
+    def add(self, ids, vectors):
+        if self.index is None:
+            return False
+        ids = np.asarray(ids, dtype=np.int64)
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+        if self.kind == 'hnsw':
+            self._labels = np.concatenate([self._labels, ids])
+        return True
+
+    def remove(self, ids):
+        if self.index is None:
+            return
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if self.kind == 'ivf':
+            self.index.remove_ids(ids)
+        else:
+            # HNSW graphs cannot drop nodes; filter them at query time instead
+            self._tombstones.update(np.flatnonzero(np.isin(self._labels, ids)).tolist())
+
+    def needs_compaction(self):
+        return self.index is not None and len(self._tombstones) > 0.1 * max(self.index.ntotal, 1)
+
+    def search(self, query, k):
+        """Return (ids, scores) arrays for the approximate top-k, best first."""
+        query = np.ascontiguousarray(query.reshape(1, -1), dtype=np.float32)
+        if self.kind == 'ivf':
+            self.index.nprobe = self.nprobe
+            scores, ids = self.index.search(query, k)
+            keep = ids[0] >= 0
+            return ids[0][keep], scores[0][keep]
+        # Search the graph itself for internal labels, then map the live ones to chunk ids
+        hnsw = self.faiss.downcast_index(self.index.index)
+        hnsw.hnsw.efSearch = max(self.ef_search, k)
+        fetch = k + len(self._tombstones) if self._tombstones else k
+        scores, labels = hnsw.search(query, fetch)
+        scores, labels = scores[0], labels[0]
+        keep = labels >= 0
+        if self._tombstones:
+            keep &= ~np.isin(labels, np.fromiter(self._tombstones, dtype=np.int64))
+        return self._labels[labels[keep][:k]], scores[keep][:k]
+
+    def save(self, path, meta):
+        if self.index is None:
+            return
+        # Per process, so workers saving at exit do not write over each other's file
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+        meta = dict(meta, kind=self.kind, tombstone_labels=sorted(self._tombstones))
+        with open(path + '.json', 'w') as f:
+            json.dump(meta, f)
+
+    def load(self, path):
+        """Load a saved index; returns its metadata or None if absent or incompatible."""
+        if not (os.path.exists(path) and os.path.exists(path + '.json')):
+            return None
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if meta.get('kind') != self.kind:
+            return None
+        self.index = self.faiss.read_index(path)
+        self.dim = self.index.d
+        self._tombstones = set(meta.get('tombstone_labels', []))
+        if self.kind == 'hnsw':
+            self._labels = self.faiss.vector_to_array(self.index.id_map).astype(np.int64)
+            if 'tombstones' in meta:
+                # Saved before tombstones were kept by label: they are chunk ids
+                self._tombstones = set(np.flatnonzero(np.isin(self._labels, meta['tombstones'])).tolist())
+        return meta
+
+
+def make_backend(config):
+    """Build the ANN backend named by VECTOR_INDEX_BACKEND, or None for exact search."""
+    kind = config.get('VECTOR_INDEX_BACKEND', 'exact')
+    if kind == 'exact':
+        return None
+    try:
+        return FaissBackend(
+            kind=kind,
+            hnsw_m=config.get('ANN_HNSW_M', 32),
+            ef_construction=config.get('ANN_EF_CONSTRUCTION', 80),
+            ef_search=config.get('ANN_EF_SEARCH', 64),
+            ivf_nlist=config.get('ANN_IVF_NLIST', 1024),
+            nprobe=config.get('ANN_NPROBE', 16),
+        )
+    except ImportError:
+        print("faiss is not installed; falling back to exact search")
+        return None
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class CachedAnswer:
+    def __init__(self, question, answer, context, document_ids, scope, retrieval=None):
+        self.question = question
+        self.answer = answer
+        self.context = context
+        self.document_ids = frozenset(document_ids)
+        self.scope = scope
+        self.retrieval = retrieval
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """Semantic cache of generated answers for near-duplicate questions.
+
+    Question embeddings are L2-normalised into a fixed slot matrix, so a
+    lookup is one matmul over at most ``max_entries`` rows. An entry is
+    served when its cosine similarity clears ``threshold``, it was asked
+    against the same document scope with the same retrieval mode and it is
+    younger than ``ttl``.
+    Re-ingesting a document drops every entry that could depend on it.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('ANSWER_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('ANSWER_CACHE_TTL', self.ttl)
+        self.threshold = app.config.get('ANSWER_CACHE_THRESHOLD', self.threshold)
+        with self._lock:
+            self._reset()
+        app.extensions['answer_cache'] = self
+
+    def _reset(self):
+        self._vectors = None
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._entries = [None] * self.max_entries
+        self._lru = OrderedDict()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _drop(self, slot):
+        self._entries[slot] = None
+        self._valid[slot] = False
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, question_embedding, scope=None, retrieval=None):
+        """Return the CachedAnswer for a near-identical earlier question, or None."""
+        query = self._normalize(question_embedding) if question_embedding is not None else None
+        with self._lock:
+            if query is None or self._vectors is None or not self._lru or query.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[~self._valid] = -np.inf
+            now = time.time()
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                entry = self._entries[slot]
+                if now - entry.created_at > self.ttl:
+                    self._drop(slot)
+                    self.expirations += 1
+                    continue
+                if entry.scope != scope or entry.retrieval != retrieval:
+                    continue
+                self._lru.move_to_end(slot)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            return None
+
+    def store(self, question_embedding, question, answer, context, document_ids, scope=None, retrieval=None):
+        if self.max_entries <= 0:
+            return
+        vector = self._normalize(question_embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._reset()
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if not self._free:
+                oldest, _ = self._lru.popitem(last=False)
+                self._drop(oldest)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = CachedAnswer(question, answer, context, document_ids, scope, retrieval)
+            self._lru[slot] = None
+
+    def invalidate(self, document_ids=None):
+        """Drop entries that used, or could now use, the given documents.
+
+        Entries asked across every document (scope None) are always dropped,
+        since a new or changed document may change their best chunks. With
+        no ``document_ids`` the whole cache is cleared.
+        """
+        document_ids = set(document_ids or ())
+        with self._lock:
+            for slot in list(self._lru):
+                entry = self._entries[slot]
+                if (not document_ids or entry.scope is None
+                        or entry.document_ids & document_ids
+                        or set(entry.scope) & document_ids):
+                    self._drop(slot)
+                    self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._lru),
+            'max_entries': self.max_entries,
+            'threshold': self.threshold,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# Initialize answer cache as a singleton
+answer_cache = AnswerCache()
@@ -1,7 +1,10 @@
 from flask import Flask, request, jsonify
 from llm import llm_service
+from admission import Overloaded, overloaded_response
 
 app = Flask(__name__)
+# generate_response and get_embedding raise Overloaded when Ollama is saturated or down
+app.register_error_handler(Overloaded, overloaded_response)
 
 @app.route('/api/query', methods=['POST'])
 def query():
@@ -24,7 +27,13 @@ def embed():
     
     text = data['text']
     embedding = llm_service.get_embedding(text)
-    return jsonify({'embedding': embedding})
+    if embedding is None:
+        return jsonify({'error': 'Failed to generate embedding'}), 502
+    return jsonify({'embedding': embedding.tolist()})
+
+@app.route('/api/embed/cache', methods=['GET'])
+def embed_cache_stats():
+    return jsonify(llm_service.embedding_cache.stats())
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
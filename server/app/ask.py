@@ -0,0 +1,174 @@
+from flask import current_app, jsonify
+from .llm import GenerationError, llm_service
+from .retrieval import RETRIEVAL_MODES, find_relevant_chunks, resolve_document_ids, sync_indexes
+from .context_builder import build_context
+from .answer_cache import answer_cache
+from .history_writer import history_writer
+from .sessions import session_store
+from .streaming import wants_stream, stream_answer
+from .metrics import ASK_REQUESTS, mark_first_ask, timed, stage_timings
+from .admission import Overloaded
+
+
+def save_chat_history(question, answer, context, document_id, wait=False):
+    """Queue a chat history row for the write-behind writer.
+
+    Returns:
+        int: The row id when ``wait`` is set (after it is committed), else None
+    """
+    with timed('ask', 'history'):
+        future = history_writer.submit(question, answer, context, document_id)
+        return future.result() if wait else None
+
+
+def answer_question(data):
+    """Shared body of the /ask routes: embed, retrieve, generate, record.
+
+    Returns a JSON response, or a Server-Sent Events stream when the
+    client asked for one. With ``"timings": true`` the response also
+    carries the milliseconds spent in each stage. When the language model
+    backend is saturated or down it raises Overloaded, which the app
+    answers with 503 and Retry-After.
+
+    ``"session": true`` starts a conversation and ``"session_id"``
+    continues one: follow-ups resend Ollama's token context from the
+    previous turn with only the new question and chunks not yet seen,
+    instead of the full prompt.
+    """
+    try:
+        return _answer_question(data)
+    except Overloaded:
+        ASK_REQUESTS.inc(outcome='rejected')
+        raise
+
+
+def _answer_question(data):
+    question = data['question']
+    with_timings = bool(data.get('timings'))
+
+    def respond(body):
+        if with_timings:
+            body['timings'] = stage_timings()
+        return jsonify(body)
+
+    session_id = data.get('session_id')
+    if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= 64):
+        return jsonify({'error': 'session_id must be a string of up to 64 characters'}), 400
+    session = None
+    if session_id is not None or data.get('session'):
+        # An unknown or expired id is a miss: the conversation goes on under that id from a full prompt
+        session = (session_id and session_store.get(session_id)) or session_store.create(session_id)
+
+    try:
+        document_ids = resolve_document_ids(data)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    if session is not None:
+        # Follow-ups stay on the documents the conversation started with unless they name others
+        if document_ids is None and session.scope is not None:
+            document_ids = list(session.scope)
+        session.scope = tuple(document_ids) if document_ids is not None else None
+    scope = tuple(document_ids) if document_ids is not None else None
+    retrieval = data.get('retrieval') or current_app.config.get('RETRIEVAL_MODE', 'vector')
+    if retrieval not in RETRIEVAL_MODES:
+        return jsonify({'error': f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}"}), 400
+
+    # Get question embedding
+    with timed('ask', 'embed'):
+        question_embedding = llm_service.get_embedding(question)
+    if question_embedding is None:
+        raise ValueError("Failed to generate embedding for the question")
+
+    # Near-duplicate questions are answered from the cache, once it reflects other workers' ingestion;
+    # a conversation's answers depend on its earlier turns, so sessions skip it
+    sync_indexes()
+    cached = None
+    if session is None:
+        with timed('ask', 'cache'):
+            cached = answer_cache.lookup(question_embedding, scope=scope, retrieval=retrieval)
+    if cached is not None:
+        ASK_REQUESTS.inc(outcome='cached')
+        mark_first_ask()
+        history_document_id = document_ids[0] if document_ids else min(cached.document_ids)
+        if wants_stream(data):
+            return stream_answer(question, cached.context,
+                                 lambda answer, model_context: save_chat_history(question, answer, cached.context,
+                                                                                 history_document_id, wait=True),
+                                 answer=cached.answer, timings=with_timings)
+        save_chat_history(question, cached.answer, cached.context, history_document_id)
+        return respond({
+            'answer': cached.answer,
+            'context': cached.context,
+            'document_ids': sorted(cached.document_ids),
+            'cached': True
+        })
+
+    # Find candidate chunks, then pick a diverse subset that fits the prompt budget
+    candidates = find_relevant_chunks(question_embedding, top_k=current_app.config.get('CONTEXT_CANDIDATES', 12),
+                                      document_ids=document_ids, question=question, retrieval=retrieval)
+    if not candidates:
+        ASK_REQUESTS.inc(outcome='no_documents')
+        return jsonify({'error': 'No documents to answer from; scrape a URL first'}), 404
+    conversation, history, seen = None, (), set()
+    if session is not None:
+        conversation = session_store.reusable_context(session, llm_service.model_name)
+        if conversation is not None:
+            # Chunks from earlier turns are already in the model's context
+            seen = session.chunk_ids
+        else:
+            history = session.turns
+    with timed('ask', 'prompt'):
+        # A continued conversation only adds evidence it has not seen, under a smaller budget
+        context, chunks, _ = build_context(question_embedding, [c for c in candidates if c.id not in seen],
+                                           token_budget=current_app.config.get('SESSION_CONTEXT_TOKEN_BUDGET')
+                                           if conversation is not None else None,
+                                           per_document=document_ids is not None and len(document_ids) > 1)
+    used_document_ids = {chunk.document_id for chunk in chunks}
+    # Scoped questions are recorded against the first requested document,
+    # unscoped ones against the document of the best matching chunk
+    history_document_id = document_ids[0] if document_ids else (chunks or candidates)[0].document_id
+
+    def complete(answer, model_context=None, wait=False):
+        chat_id = save_chat_history(question, answer, context, history_document_id, wait=wait)
+        if session is not None:
+            session_store.record_turn(session, question, answer, llm_service.model_name, model_context,
+                                      seen | {chunk.id for chunk in chunks})
+        if conversation is None and not history:
+            answer_cache.store(question_embedding, question, answer, context, used_document_ids,
+                               scope=scope, retrieval=retrieval)
+        return chat_id
+
+    session_id = session.id if session is not None else None
+    if wants_stream(data):
+        # The stream's done event carries the chat history id, so it waits for the commit
+        response = stream_answer(question, context,
+                                 lambda answer, model_context: complete(answer, model_context, wait=True),
+                                 timings=with_timings, conversation=conversation, history=history,
+                                 session_id=session_id)
+        mark_first_ask()
+        return response
+
+    # Generate response
+    try:
+        with timed('ask', 'generate'):
+            answer, model_context = llm_service.generate_with_context(question, context, conversation=conversation,
+                                                                      history=history)
+    except GenerationError as e:
+        # Recorded in chat history, but never cached or continued by a session
+        answer = str(e)
+        ASK_REQUESTS.inc(outcome='error')
+        save_chat_history(question, answer, context, history_document_id)
+    else:
+        ASK_REQUESTS.inc(outcome='answered')
+        mark_first_ask()
+        complete(answer, model_context)
+
+    body = {
+        'answer': answer,
+        'context': context,
+        'document_ids': sorted(used_document_ids)
+    }
+    if session is not None:
+        body['session_id'] = session_id
+        body['session_continued'] = conversation is not None
+    return respond(body)
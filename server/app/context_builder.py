@@ -0,0 +1,163 @@
+from typing import NamedTuple
+import numpy as np
+from flask import current_app
+from .vector_index import vector_index
+from .metrics import CONTEXT_TOKENS
+
+# Rough characters per token, for budgets when no CHUNK_TOKENIZER is configured
+CHARS_PER_TOKEN = 4
+# Shortest overlap between consecutive chunks that is removed when they are merged
+MIN_OVERLAP = 8
+
+
+class Context(NamedTuple):
+    text: str
+    chunks: list     # DocumentChunk rows used, in prompt order
+    tokens: int
+
+
+def context_length(config):
+    """Token counter for context budgets: CHUNK_TOKENIZER when set, else an estimate."""
+    tokenizer = config.get('CHUNK_TOKENIZER')
+    if tokenizer:
+        from .chunking import token_length
+        return token_length(tokenizer)
+    return lambda text: -(-len(text) // CHARS_PER_TOKEN)
+
+
+def mmr_order(query, vectors, mmr_lambda=0.7, k=None, seeds=()):
+    """Maximal-marginal-relevance order of candidate vectors.
+
+    Each step picks the candidate maximizing
+    ``mmr_lambda * sim(query, c) - (1 - mmr_lambda) * max sim(c, picked)``,
+    with every similarity computed up front as one matrix product.
+
+    Args:
+        query: Question embedding
+        vectors: Candidate embeddings, one row each
+        mmr_lambda (float): 1 ranks by relevance only, 0 by novelty only
+        k (int): Number of candidates to order; None orders all
+        seeds (iterable): Rows to place first, in the given order
+    Returns:
+        list: Row numbers, best first
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    k = n if k is None else min(k, n)
+    if not k:
+        return []
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms[:, None]
+    query = np.asarray(query, dtype=np.float32)
+    relevance = unit @ (query / (np.linalg.norm(query) or 1.0))
+    similarity = unit @ unit.T
+
+    order = []
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    def pick(row):
+        # Highest similarity of each candidate to anything picked so far
+        if order:
+            np.maximum(redundancy, similarity[row], out=redundancy)
+        else:
+            redundancy[:] = similarity[row]
+        order.append(int(row))
+        available[row] = False
+
+    for row in seeds:
+        if len(order) < k and available[row]:
+            pick(row)
+    while len(order) < k:
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        pick(np.argmax(scores))
+    return order
+
+
+def join_adjacent(first, second):
+    """Join the texts of consecutive chunks, dropping the longest overlap they share."""
+    probe = second[:MIN_OVERLAP]
+    start = first.find(probe, max(len(first) - len(second), 0))
+    while start != -1 and len(first) - start >= MIN_OVERLAP:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(probe, start + 1)
+    return f"{first} {second}"
+
+
+def merge_passages(chunks):
+    """Group chunks into passages of consecutive chunk_index within a document.
+
+    Passages keep the order of their best-placed chunk; chunks inside a
+    passage are in document order with their overlaps removed.
+
+    Returns:
+        list: Passage texts
+    """
+    rank = {chunk.id: i for i, chunk in enumerate(chunks)}
+    ordered = sorted(chunks, key=lambda c: (c.document_id, c.chunk_index is None, c.chunk_index or 0, c.id))
+    passages = []       # [best rank, text]
+    previous = None
+    for chunk in ordered:
+        if previous is not None and chunk.chunk_index is not None and \
+                previous.document_id == chunk.document_id and previous.chunk_index == chunk.chunk_index - 1:
+            passage = passages[-1]
+            passage[0] = min(passage[0], rank[chunk.id])
+            passage[1] = join_adjacent(passage[1], chunk.content)
+        else:
+            passages.append([rank[chunk.id], chunk.content])
+        previous = chunk
+    return [text for _, text in sorted(passages, key=lambda passage: passage[0])]
+
+
+def build_context(question_embedding, candidates, token_budget=None, mmr_lambda=None, per_document=False):
+    """Prompt context from retrieval candidates, within a token budget.
+
+    Candidates are re-ranked by maximal marginal relevance on their
+    embeddings from the vector index, so near-duplicate neighbours do not
+    crowd out other evidence. They are then taken in that order while
+    they fit CONTEXT_TOKEN_BUDGET, and chunks adjacent in a document are
+    merged into one passage. The best candidate is always kept.
+
+    Args:
+        question_embedding: Question embedding
+        candidates (list): DocumentChunk rows from retrieval, best first
+        token_budget (int): Overrides CONTEXT_TOKEN_BUDGET
+        mmr_lambda (float): Overrides CONTEXT_MMR_LAMBDA
+        per_document (bool): Start with each document's best candidate,
+            so a comparison sees every document
+    Returns:
+        Context: Prompt text, the chunks used and their token count
+    """
+    config = current_app.config
+    token_budget = token_budget or config.get('CONTEXT_TOKEN_BUDGET', 384)
+    mmr_lambda = config.get('CONTEXT_MMR_LAMBDA', 0.7) if mmr_lambda is None else mmr_lambda
+    length = context_length(config)
+
+    found, vectors = vector_index.vectors([chunk.id for chunk in candidates])
+    by_id = {chunk.id: chunk for chunk in candidates}
+    ranked = [by_id[chunk_id] for chunk_id in found]
+    if len(ranked) > 1 and question_embedding is not None:
+        seeds = []
+        if per_document:
+            seen = set()
+            for row, chunk in enumerate(ranked):
+                if chunk.document_id not in seen:
+                    seen.add(chunk.document_id)
+                    seeds.append(row)
+        ranked = [ranked[row] for row in mmr_order(question_embedding, vectors, mmr_lambda, seeds=seeds)]
+    # Chunks missing from the vector index keep their retrieval rank, after the rest
+    indexed = set(found)
+    ranked.extend(chunk for chunk in candidates if chunk.id not in indexed)
+
+    chosen, tokens = [], 0
+    for chunk in ranked:
+        size = length(chunk.content)
+        if chosen and tokens + size > token_budget:
+            continue
+        chosen.append(chunk)
+        tokens += size
+    CONTEXT_TOKENS.observe(tokens)
+    return Context('\n\n'.join(merge_passages(chosen)), chosen, tokens)
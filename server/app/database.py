@@ -0,0 +1,69 @@
+import os
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URI = 'sqlite:///rag.db'
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+# write commits, and with synchronous=NORMAL a commit no longer waits for an
+# fsync; busy_timeout makes a writer wait for the lock instead of failing
+# with "database is locked"
+DEFAULT_SQLITE_PRAGMAS = {
+    # Only takes effect on a new database; lets maintenance free pages a step at a time
+    'auto_vacuum': 'incremental',
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -65536,       # negative: KiB, so 64 MiB per connection
+    'temp_store': 'memory',
+}
+
+
+def database_uri():
+    """Database URI from DATABASE_URL, defaulting to the local SQLite file."""
+    return os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URI
+
+
+def data_directory(app):
+    """Directory for the app's own files: beside the SQLite database, else the instance path."""
+    from .models import db
+
+    with app.app_context():
+        engine = db.engine
+    database = engine.url.database if engine.dialect.name == 'sqlite' else None
+    directory = os.path.dirname(os.path.abspath(database)) if database else app.instance_path
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def sqlite_pragmas(config):
+    """DEFAULT_SQLITE_PRAGMAS with the SQLITE_PRAGMAS config merged over them.
+
+    A pragma set to None is left at SQLite's default.
+    """
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS, **(config.get('SQLITE_PRAGMAS') or {}))
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+def configure_database(app):
+    """Tune the app's SQLite connections; other databases are left as they are.
+
+    Call after db.init_app(app), before anything opens a connection.
+    """
+    from .models import db
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+    if engine.url.database in (None, '', ':memory:'):
+        # An in-memory database has no journal file to put in WAL mode
+        pragmas.pop('journal_mode', None)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
@@ -0,0 +1,100 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+from .models import db, ChatHistory
+
+# Columns a client may select; context can be large, so it is opt-in
+HISTORY_FIELDS = ('id', 'document_id', 'question', 'answer', 'context', 'created_at')
+DEFAULT_FIELDS = ('id', 'document_id', 'question', 'answer', 'created_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def chat_history_page(before=None, since=None, document_id=None, fields=None, limit=DEFAULT_PAGE_SIZE):
+    """One keyset-paginated page of chat history.
+
+    Rows are ordered by (created_at, id), which the
+    ix_chat_history_created_at_id index serves directly, so every page
+    costs the same however deep it is. ``since`` pages by id alone:
+    created_at is stamped before a row waits for the write lock, so rows
+    from the write-behind queue or other workers can commit after a newer
+    timestamp, while ids are assigned in commit order.
+
+    Args:
+        before (str): Cursor; return rows older than it, newest first
+        since (str): Cursor; return rows committed after it, in commit
+            order, so a client can fetch only what was added since its
+            last request
+        document_id (int): Only rows recorded against this document
+        fields (list): Columns to return (see HISTORY_FIELDS)
+        limit (int): Page size, capped at MAX_PAGE_SIZE
+    Returns:
+        dict: items, next_cursor (older rows remain when set), latest_cursor
+            (the last row committed, to pass as ``since``) and has_more
+    """
+    fields = list(dict.fromkeys(fields or DEFAULT_FIELDS))
+    unknown = set(fields) - set(HISTORY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    if before and since:
+        raise ValueError("Use either before or since, not both")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    # id and created_at are always read, to build the cursors
+    columns = list(dict.fromkeys(['id', 'created_at'] + fields))
+    query = db.session.query(*(getattr(ChatHistory, name) for name in columns))
+    if document_id is not None:
+        query = query.filter(ChatHistory.document_id == document_id)
+    key = tuple_(ChatHistory.created_at, ChatHistory.id)
+    if since:
+        query = query.filter(ChatHistory.id > decode_cursor(since)[1]).order_by(ChatHistory.id.asc())
+    else:
+        if before:
+            query = query.filter(key < decode_cursor(before))
+        query = query.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        values = dict(zip(columns, row))
+        if values.get('created_at') is not None:
+            values['created_at'] = values['created_at'].isoformat()
+        items.append({name: values[name] for name in fields})
+
+    cursors = [encode_cursor(row[1], row[0]) for row in rows]
+    if since:
+        latest_cursor = cursors[-1] if cursors else since
+        next_cursor = None
+    else:
+        latest_cursor = None
+        if not before:
+            # The highest id, which need not be the newest created_at
+            latest = db.session.query(ChatHistory.created_at, ChatHistory.id)
+            if document_id is not None:
+                latest = latest.filter(ChatHistory.document_id == document_id)
+            latest = latest.order_by(ChatHistory.id.desc()).first()
+            latest_cursor = encode_cursor(*latest) if latest is not None else None
+        next_cursor = cursors[-1] if has_more else None
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'latest_cursor': latest_cursor,
+        'has_more': has_more,
+    }
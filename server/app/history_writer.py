@@ -0,0 +1,137 @@
+import atexit
+import os
+import threading
+from concurrent.futures import Future
+from sqlalchemy import insert
+from .models import db, ChatHistory
+from .metrics import HISTORY_QUEUE_DEPTH, HISTORY_BATCH_ROWS
+
+
+def insert_rows(rows):
+    """Insert ChatHistory rows with one statement and commit them.
+
+    Returns:
+        list: The new ids, in the order of ``rows``
+    """
+    statement = insert(ChatHistory).returning(ChatHistory.id, sort_by_parameter_order=True)
+    ids = [row_id for row_id, in db.session.execute(statement, rows)]
+    db.session.commit()
+    return ids
+
+
+class HistoryWriter:
+    """Write-behind queue for chat history rows.
+
+    /ask queues its row and returns instead of committing it. One thread
+    drains the queue, inserting everything that queued up meanwhile (up
+    to ``batch_size`` rows) in one statement and one commit, so under
+    load many answers share a transaction rather than each taking the
+    SQLite write lock in turn. The queue holds at most ``max_queue`` rows;
+    beyond that, or when write-behind is disabled, the caller writes its
+    row itself. flush() waits for everything queued, so a reader can see
+    its own writes.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.max_queue = 1024
+        self.batch_size = 256
+        self._cond = threading.Condition()
+        self._queue = []        # (row, Future), oldest first
+        self._writing = 0       # rows taken off the queue and not yet committed
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('HISTORY_WRITE_BEHIND', True)
+        self.max_queue = app.config.get('HISTORY_QUEUE_SIZE', 1024)
+        self.batch_size = app.config.get('HISTORY_BATCH_SIZE', 256)
+        atexit.register(self.flush)
+        app.extensions['history_writer'] = self
+
+    def _ensure_thread(self):
+        # A forked worker inherits the state but not the thread
+        if self._thread is None or self._pid != os.getpid():
+            self._queue, self._writing = [], 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, question, answer, context, document_id):
+        """Record one answered question.
+
+        Returns:
+            Future: Resolves to the new row's id once it is committed
+        """
+        row = {'document_id': document_id, 'question': question, 'answer': answer, 'context': context}
+        future = Future()
+        if self.enabled and self.app is not None:
+            with self._cond:
+                self._ensure_thread()
+                if len(self._queue) < self.max_queue:
+                    self._queue.append((row, future))
+                    HISTORY_QUEUE_DEPTH.set(len(self._queue))
+                    self._cond.notify_all()
+                    return future
+        # Queue full or disabled: write synchronously, which also slows the caller down
+        HISTORY_BATCH_ROWS.observe(1)
+        future.set_result(insert_rows([row])[0])
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until every queued row is committed.
+
+        Returns:
+            bool: False if ``timeout`` seconds passed first
+        """
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            return self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = self._queue[:self.batch_size]
+            del self._queue[:self.batch_size]
+            self._writing = len(batch)
+            HISTORY_QUEUE_DEPTH.set(len(self._queue))
+            return batch
+
+    def _write(self, batch):
+        rows = [row for row, _ in batch]
+        error = None
+        with self.app.app_context():
+            try:
+                ids = insert_rows(rows)
+            except Exception as e:
+                db.session.rollback()
+                error = e
+        if error is None:
+            HISTORY_BATCH_ROWS.observe(len(rows))
+            for (_, future), row_id in zip(batch, ids):
+                future.set_result(row_id)
+        elif len(batch) == 1:
+            print(f"Error saving chat history: {str(error)}")
+            batch[0][1].set_exception(error)
+        else:
+            # Retry row by row, so one bad row does not lose the others
+            for item in batch:
+                self._write([item])
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._writing = 0
+                    self._cond.notify_all()
+
+
+# Initialize history writer as a singleton
+history_writer = HistoryWriter()
@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+from contextlib import nullcontext
+import numpy as np
+
+# Bump when the snapshot layout changes; older snapshots are then rebuilt
+SNAPSHOT_VERSION = 3
+# Arrays stored per generation, one .npy file each; 'scales' only for int8
+ARRAYS = ('matrix', 'ids', 'doc_ids', 'keys', 'scales')
+CURRENT = 'CURRENT'
+# Odd 64-bit multiplier spreading chunk ids over the key space
+_ID_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_keys(ids, content_hashes=None):
+    """64-bit key of each (chunk id, content hash) pair.
+
+    SQLite can hand a deleted chunk's id to a new chunk, so the ids alone
+    do not identify the rows; a chunk's text never changes under its id.
+
+    Args:
+        ids (list): DocumentChunk ids
+        content_hashes (list): Their hex content hashes; None where unknown
+    Returns:
+        np.ndarray: uint64 keys
+    """
+    ids = np.asarray(ids, dtype=np.int64).astype(np.uint64)
+    if content_hashes is None:
+        content_hashes = [None] * len(ids)
+    prefixes = ''.join((content_hash or '')[:16].ljust(16, '0') for content_hash in content_hashes)
+    hashes = np.frombuffer(bytes.fromhex(prefixes), dtype='>u8').astype(np.uint64)
+    return hashes ^ (ids * _ID_MIX)
+
+
+def fingerprint(keys):
+    """Identity of a set of rows: their count and the sum of their keys, modulo 2**64."""
+    keys = np.asarray(keys, dtype=np.uint64)
+    return [int(keys.shape[0]), int(keys.sum(dtype=np.uint64))]
+
+
+def extend_fingerprint(current, keys):
+    """fingerprint of a fingerprinted set of rows plus the rows with ``keys``."""
+    count, key_sum = fingerprint(keys)
+    return [current[0] + count, (current[1] + key_sum) % 2 ** 64]
+
+
+class IndexSnapshot:
+    """Generations of the vector index arrays in one directory.
+
+    Each generation is a ``gen-<n>`` directory of .npy files, preallocated
+    to a capacity so rows can be appended in place. The CURRENT file names
+    the live directory, its row count and a generation number bumped on
+    every change; it is replaced atomically, so a reader sees either the
+    old or the new state. Processes that memory-map the arrays share one
+    copy in the page cache and remap when CURRENT changes.
+    """
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+        self._lock = None
+        if shared:
+            from filelock import FileLock
+            self._lock = FileLock(f"{path}.lock", thread_local=False)
+
+    def lock(self):
+        """Inter-process lock serialising writers (a no-op unless shared)."""
+        return self._lock if self._lock is not None else nullcontext()
+
+    @property
+    def current_path(self):
+        return os.path.join(self.path, CURRENT)
+
+    def stamp(self):
+        """Cheap change marker for CURRENT: inode and modification time."""
+        try:
+            stat = os.stat(self.current_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def read(self):
+        """Metadata of the live generation, or None if there is none."""
+        try:
+            with open(self.current_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _publish(self, meta):
+        tmp_path = f"{self.current_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.current_path)
+
+    def map(self, meta, mode):
+        """Memory-map a generation's arrays at full capacity.
+
+        Rows past ``meta['size']`` are unused until appended, so a reader
+        keeps its mapping while a writer appends in place.
+
+        Args:
+            meta (dict): From read()
+            mode (str): np.load mmap_mode; 'r' shares pages read-only, 'c'
+                copies pages on write
+        Returns:
+            dict: Array name -> mapped array
+        """
+        directory = os.path.join(self.path, meta['directory'])
+        arrays = {}
+        for name in ARRAYS:
+            file_path = os.path.join(directory, f"{name}.npy")
+            if name == 'scales' and not os.path.exists(file_path):
+                continue
+            arrays[name] = np.load(file_path, mmap_mode=mode)
+        if arrays['matrix'].shape[1:] != (meta['dim'],) or \
+                any(array.shape[0] != meta['capacity'] for array in arrays.values()):
+            raise ValueError("snapshot arrays do not match their metadata")
+        return arrays
+
+    def write(self, arrays, size, capacity, meta):
+        """Write a new generation from in-memory arrays and make it live.
+
+        Args:
+            arrays (dict): Array name -> rows, or a list of row blocks written
+                one after another (None entries are skipped)
+            size (int): Rows of each array to write
+            capacity (int): Rows to preallocate, for later appends
+            meta (dict): Version, dtype, dim and fingerprint of the rows
+        Returns:
+            dict: The published metadata
+        """
+        current = self.read() or {}
+        generation = current.get('generation', 0) + 1
+        name = f"gen-{generation:08d}"
+        directory = os.path.join(self.path, name)
+        os.makedirs(self.path, exist_ok=True)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        try:
+            for key, blocks in arrays.items():
+                if blocks is None:
+                    continue
+                blocks = blocks if isinstance(blocks, list) else [blocks]
+                out = np.lib.format.open_memmap(os.path.join(directory, f"{key}.npy"), mode='w+',
+                                                dtype=blocks[0].dtype, shape=(capacity,) + blocks[0].shape[1:])
+                start = 0
+                for block in blocks:
+                    count = min(len(block), size - start)
+                    out[start:start + count] = block[:count]
+                    start += count
+                out.flush()
+                del out
+            meta = dict(meta, directory=name, generation=generation, size=size, capacity=capacity)
+            self._publish(meta)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        # Processes still mapping an old generation keep its pages until they remap
+        for entry in os.listdir(self.path):
+            if entry.startswith('gen-') and entry != name:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+        return meta
+
+    def append(self, meta, arrays, fingerprint):
+        """Append rows to the live generation in place and publish them.
+
+        The caller holds lock() and has checked the rows fit the capacity.
+
+        Returns:
+            dict: The published metadata
+        """
+        start = meta['size']
+        count = len(arrays['ids'])
+        directory = os.path.join(self.path, meta['directory'])
+        for key, rows in arrays.items():
+            if rows is None:
+                continue
+            out = np.load(os.path.join(directory, f"{key}.npy"), mmap_mode='r+')
+            out[start:start + count] = rows
+            out.flush()
+            del out
+        meta = dict(meta, generation=meta['generation'] + 1, size=start + count, fingerprint=fingerprint)
+        self._publish(meta)
+        return meta
+
+
+def new_meta(dtype, dim, keys):
+    return {'version': SNAPSHOT_VERSION, 'dtype': dtype, 'dim': dim, 'fingerprint': fingerprint(keys)}
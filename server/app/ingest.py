@@ -0,0 +1,220 @@
+import hashlib
+import time
+from itertools import islice
+from flask import current_app
+from sqlalchemy import insert, update
+from .models import db, Document, DocumentChunk
+from .vector_codec import encode_embedding
+from .llm import llm_service
+from .chunking import iter_chunks, token_length
+from .retrieval import index_chunks, unindex_chunks
+from .vector_index import vector_index
+from .answer_cache import answer_cache
+from .metrics import INGEST_CHUNKS, record_stage, timed
+
+# Chunks embedded per round trip when the caller does not batch commits
+EMBED_WINDOW = 64
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def merge_embed_stats(total, stats):
+    """Accumulate one embed_texts_with_stats() result into a running total."""
+    for key in ("texts", "characters", "cache_hits", "batches", "failed"):
+        total[key] = total.get(key, 0) + stats[key]
+    total["seconds"] = round(total.get("seconds", 0) + stats["seconds"], 3)
+    total["texts_per_second"] = round(total["texts"] / total["seconds"], 2) if total["seconds"] > 0 else None
+    return total
+
+
+def _stored_chunks(document_id):
+    """Map content hash -> ids of a document's stored chunks, in chunk order."""
+    stored = {}
+    if document_id is not None:
+        rows = db.session.query(DocumentChunk.id, DocumentChunk.content_hash) \
+            .filter_by(document_id=document_id).order_by(DocumentChunk.chunk_index)
+        for chunk_id, chunk_hash in rows:
+            stored.setdefault(chunk_hash, []).append(chunk_id)
+    return stored
+
+
+def chunk_stream(text):
+    """Chunks of ``text`` as configured by CHUNK_SIZE, CHUNK_OVERLAP and
+    CHUNK_TOKENIZER (sizes count tokens of that tokenizer when set)."""
+    config = current_app.config
+    tokenizer = config.get('CHUNK_TOKENIZER')
+    return iter_chunks(text, config.get('CHUNK_SIZE', 512), config.get('CHUNK_OVERLAP', 0),
+                       length=token_length(tokenizer) if tokenizer else None)
+
+
+def _delete_chunks(chunk_ids):
+    if chunk_ids:
+        DocumentChunk.query.filter(DocumentChunk.id.in_(chunk_ids)).delete(synchronize_session=False)
+
+
+def ingest_document(url, text, batch_size=None, on_progress=None):
+    """Chunk, embed and store a document, then add its chunks to the vector index.
+
+    Chunks are embedded a window at a time while the chunker is still
+    producing them, so large documents never sit fully split in memory.
+
+    Re-ingesting a URL updates its latest Document in place. Chunks are
+    matched by content hash: unchanged ones keep their rows and vectors,
+    only new or changed ones are embedded, and stale ones are removed from
+    the database and the index. An identical text is skipped outright.
+
+    Args:
+        url (str): Source URL of the document
+        text (str): Document text
+        batch_size (int): Commit chunks in batches of this size so partial
+            progress survives a failure; None commits everything at once,
+            still embedding EMBED_WINDOW chunks at a time
+        on_progress (callable): Called as on_progress(stage, **details)
+            after each stage and committed batch
+    Returns:
+        tuple: (Document, embedding throughput stats)
+    """
+    report = on_progress or (lambda stage, **details: None)
+    storage_dtype = current_app.config.get('EMBEDDING_DTYPE', 'float32')
+    stats = {}
+
+    document = Document.query.filter_by(url=url).order_by(Document.id.desc()).first()
+    document_id = document.id if document is not None else None
+    # Older copies of the URL from before re-ingestion was incremental; their
+    # rows stay for the chat history pointing at them, their chunks go
+    superseded = [chunk_id for chunk_id, in db.session.query(DocumentChunk.id)
+                  .join(Document).filter(Document.url == url, Document.id != document_id)]
+
+    document_hash = content_hash(text)
+    if document is not None and document.content_hash == document_hash:
+        if superseded:
+            _delete_chunks(superseded)
+            db.session.commit()
+            unindex_chunks(superseded)
+        chunks_total = vector_index.document_size(document_id)
+        stats['seconds'] = 0
+        report('chunked', chunks_total=chunks_total, seconds=0)
+        report('committed', document_id=document_id, chunks_embedded=chunks_total,
+               embed_stats=stats, commit_seconds=0)
+        return document, dict(stats, unchanged=True, chunks_reused=chunks_total,
+                              chunks_embedded=0, chunks_deleted=len(superseded))
+
+    stored = _stored_chunks(document_id)
+    chunks = chunk_stream(text)
+    window = batch_size or EMBED_WINDOW
+    chunks_total = reused = embedded = 0
+    first = True
+    pending = ([], [], [], [])  # chunk ids, embeddings, texts and hashes waiting to be indexed
+
+    def commit():
+        commit_start = time.time()
+        db.session.commit()
+        index_chunks(pending[0], pending[1], document_id, pending[2], pending[3])
+        for waiting in pending:
+            waiting.clear()
+        answer_cache.invalidate([document_id])
+        commit_seconds = time.time() - commit_start
+        record_stage('ingest', 'commit', commit_seconds)
+        return commit_seconds
+
+    # Chunks are embedded a window at a time as the chunker produces them
+    while True:
+        start_time = time.time()
+        batch = list(islice(chunks, window))
+        if not batch and not first:
+            break
+        chunks_total += len(batch)
+        chunk_seconds = time.time() - start_time
+        record_stage('ingest', 'chunk', chunk_seconds)
+        report('chunked', chunks_total=chunks_total, seconds=chunk_seconds)
+
+        moved, fresh = [], []
+        for chunk in batch:
+            chunk_hash = content_hash(chunk.text)
+            matches = stored.get(chunk_hash)
+            if matches:
+                # Unchanged chunks keep their rows and vectors, only their position moves
+                moved.append({'id': matches.pop(0), 'chunk_index': chunk.index})
+            else:
+                fresh.append((chunk, chunk_hash))
+
+        texts = [chunk.text for chunk, _ in fresh]
+        if first:
+            # The first window carries the full document so it is embedded alongside its chunks
+            with timed('ingest', 'embed'):
+                embeddings, batch_stats = llm_service.embed_texts_with_stats([text] + texts)
+            merge_embed_stats(stats, batch_stats)
+            if embeddings[0] is None:
+                raise ValueError("Failed to generate embedding for the main document")
+            blob, dim, dtype, scale = encode_embedding(embeddings[0], storage_dtype)
+            if document is None:
+                document = Document(url=url)
+                db.session.add(document)
+            document.content = text
+            document.embedding = blob
+            document.embedding_dim = dim
+            document.embedding_dtype = dtype
+            document.embedding_scale = scale
+            db.session.flush()
+            document_id = document.id
+            embeddings = embeddings[1:]
+            first = False
+        elif texts:
+            with timed('ingest', 'embed'):
+                embeddings, batch_stats = llm_service.embed_texts_with_stats(texts)
+            merge_embed_stats(stats, batch_stats)
+        else:
+            embeddings = []
+
+        if moved:
+            db.session.execute(update(DocumentChunk), moved)
+        rows = []
+        for (chunk, chunk_hash), embedding in zip(fresh, embeddings):
+            if embedding is None:
+                raise ValueError(f"Failed to generate embedding for chunk {chunk.index}")
+            blob, dim, dtype, scale = encode_embedding(embedding, storage_dtype)
+            rows.append({
+                'document_id': document_id,
+                'content': chunk.text,
+                'content_hash': chunk_hash,
+                'embedding': blob,
+                'embedding_dim': dim,
+                'embedding_dtype': dtype,
+                'embedding_scale': scale,
+                'chunk_index': chunk.index
+            })
+        chunk_ids = []
+        if rows:
+            # One multi-row INSERT per window instead of an ORM object per chunk;
+            # RETURNING hands back the ids for indexing
+            statement = insert(DocumentChunk).returning(DocumentChunk.id, sort_by_parameter_order=True)
+            chunk_ids = [chunk_id for chunk_id, in db.session.execute(statement, rows)]
+        pending[0].extend(chunk_ids)
+        pending[1].extend(embeddings)
+        pending[2].extend(texts)
+        pending[3].extend(chunk_hash for _, chunk_hash in fresh)
+        reused += len(moved)
+        embedded += len(chunk_ids)
+
+        if batch_size:
+            commit_seconds = commit()
+            report('committed', document_id=document_id, chunks_embedded=reused + embedded,
+                   embed_stats=stats, commit_seconds=commit_seconds)
+
+    # Whatever was not matched is stale. The document is only marked current
+    # now, so an interrupted run is redone instead of skipped as unchanged
+    stale = [chunk_id for ids in stored.values() for chunk_id in ids] + superseded
+    _delete_chunks(stale)
+    document.content_hash = document_hash
+    commit_seconds = commit()
+    unindex_chunks(stale)
+    report('committed', document_id=document_id, chunks_embedded=reused + embedded,
+           embed_stats=stats, commit_seconds=commit_seconds)
+
+    stats.update(chunks_reused=reused, chunks_embedded=embedded, chunks_deleted=len(stale))
+    INGEST_CHUNKS.inc(embedded, result='embedded')
+    INGEST_CHUNKS.inc(reused, result='reused')
+    INGEST_CHUNKS.inc(len(stale), result='deleted')
+    return document, stats
@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import CRAWL_PAGES, timed
+
+
+class IngestJob:
+    """State of one background URL ingestion."""
+
+    def __init__(self, url):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.state = 'queued'
+        self.document_id = None
+        self.chunks_total = None
+        self.chunks_embedded = 0
+        self.error = None
+        self.timings = {}
+        self.embedding_stats = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def add_timing(self, stage, seconds):
+        self.timings[stage] = round(self.timings.get(stage, 0) + seconds, 3)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'state': self.state,
+            'document_id': self.document_id,
+            'chunks_total': self.chunks_total,
+            'chunks_embedded': self.chunks_embedded,
+            'error': self.error,
+            'timings': self.timings,
+            'embedding_stats': self.embedding_stats,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class CrawlJob:
+    """State of one bulk crawl: every URL's outcome as pages stream into ingestion."""
+
+    def __init__(self, urls):
+        self.id = uuid.uuid4().hex
+        self.urls = urls
+        self.state = 'queued'
+        # url -> {'state': 'ingested'|'unchanged'|'not_modified'|'failed', ...}
+        self.pages = {}
+        self.error = None
+        self.timings = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def add_timing(self, stage, seconds):
+        self.timings[stage] = round(self.timings.get(stage, 0) + seconds, 3)
+
+    def to_dict(self):
+        counts = {}
+        for page in list(self.pages.values()):
+            counts[page['state']] = counts.get(page['state'], 0) + 1
+        return {
+            'id': self.id,
+            'kind': 'crawl',
+            'state': self.state,
+            'urls_total': len(self.urls),
+            'urls_done': len(self.pages),
+            'counts': counts,
+            'pages': dict(self.pages),
+            'error': self.error,
+            'timings': self.timings,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class MaintenanceJob:
+    """State of one retention and compaction run (see maintenance.run_maintenance)."""
+
+    def __init__(self, options):
+        self.id = uuid.uuid4().hex
+        self.options = options
+        self.state = 'queued'
+        self.report = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': 'maintenance',
+            'state': self.state,
+            'options': self.options,
+            'report': self.report,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs URL ingestion on a worker pool: fetch, chunk, embed, commit.
+
+    Chunks are committed in batches, so a job that fails midway keeps the
+    chunks it already stored and reports how far it got.
+    """
+
+    def __init__(self, max_workers=2, commit_batch_size=32, max_finished_jobs=1000):
+        self.max_workers = max_workers
+        self.commit_batch_size = commit_batch_size
+        self.max_finished_jobs = max_finished_jobs
+        self.app = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('INGEST_WORKERS', self.max_workers)
+        self.commit_batch_size = app.config.get('INGEST_COMMIT_BATCH_SIZE', self.commit_batch_size)
+        app.extensions['ingest_jobs'] = self
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest')
+            return self._executor
+
+    def submit(self, url, text=None):
+        """Queue a URL for ingestion and return its job immediately.
+
+        When ``text`` is given the fetch stage is skipped.
+        """
+        job = IngestJob(url)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._get_executor().submit(self._run, job, text)
+        return job
+
+    def submit_crawl(self, urls):
+        """Queue a bulk crawl of ``urls`` and return its job immediately."""
+        job = CrawlJob(list(dict.fromkeys(urls)))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._get_executor().submit(self._run_crawl, job)
+        return job
+
+    def submit_maintenance(self, **options):
+        """Queue a maintenance run with run_maintenance ``options`` and return its job immediately."""
+        job = MaintenanceJob(options)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._get_executor().submit(self._run_maintenance, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [j.id for j in self._jobs.values() if j.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, text=None):
+        from .ingest import ingest_document
+        from .models import db
+
+        with self.app.app_context():
+            try:
+                if text is None:
+                    job.state = 'fetching'
+                    start_time = time.time()
+                    text = fetch_url(job.url)
+                    job.add_timing('fetch', time.time() - start_time)
+
+                def on_progress(stage, **details):
+                    if stage == 'chunked':
+                        job.chunks_total = details['chunks_total']
+                        job.add_timing('chunk', details['seconds'])
+                        job.state = 'embedding'
+                    elif stage == 'committed':
+                        job.document_id = details['document_id']
+                        job.chunks_embedded = details['chunks_embedded']
+                        job.embedding_stats = dict(details['embed_stats'])
+                        job.timings['embed'] = job.embedding_stats['seconds']
+                        job.add_timing('commit', details['commit_seconds'])
+
+                job.state = 'chunking'
+                document, stats = ingest_document(job.url, text, batch_size=self.commit_batch_size,
+                                                  on_progress=on_progress)
+                job.document_id = document.id
+                job.embedding_stats = stats
+                job.state = 'done'
+            except Exception as e:
+                db.session.rollback()
+                job.error = str(e)
+                job.state = 'failed'
+                print(f"Ingest job {job.id} for {job.url} failed: {str(e)}")
+            finally:
+                job.finished_at = time.time()
+
+    def _run_crawl(self, job):
+        from .ingest import ingest_document
+        from .models import db
+
+        with self.app.app_context():
+            try:
+                crawler = get_crawler(self.app)
+                job.state = 'crawling'
+                start_time = time.time()
+                for page in crawler.crawl(job.urls):
+                    if page.not_modified:
+                        job.pages[page.url] = {'state': 'not_modified', 'status': page.status}
+                    elif page.text is None:
+                        job.pages[page.url] = {'state': 'failed', 'status': page.status, 'error': page.error}
+                    else:
+                        try:
+                            ingest_start = time.time()
+                            document, stats = ingest_document(page.url, page.text,
+                                                              batch_size=self.commit_batch_size)
+                            job.add_timing('ingest', time.time() - ingest_start)
+                            # Only now is the page safe to skip on a 304
+                            crawler.cache.put(page.url, page.etag, page.last_modified)
+                            job.pages[page.url] = {
+                                'state': 'unchanged' if stats.get('unchanged') else 'ingested',
+                                'status': page.status,
+                                'document_id': document.id,
+                                'chunks_embedded': stats.get('chunks_embedded'),
+                            }
+                        except Exception as e:
+                            db.session.rollback()
+                            job.pages[page.url] = {'state': 'failed', 'status': page.status, 'error': str(e)}
+                    CRAWL_PAGES.inc(result=job.pages[page.url]['state'])
+                job.timings['total'] = round(time.time() - start_time, 3)
+                job.state = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.state = 'failed'
+                print(f"Crawl job {job.id} failed: {str(e)}")
+            finally:
+                job.finished_at = time.time()
+
+    def _run_maintenance(self, job):
+        from .maintenance import run_maintenance
+        from .models import db
+
+        with self.app.app_context():
+            try:
+                job.state = 'running'
+                job.report = run_maintenance(**job.options)
+                job.state = 'done'
+            except Exception as e:
+                db.session.rollback()
+                job.error = str(e)
+                job.state = 'failed'
+                print(f"Maintenance job {job.id} failed: {str(e)}")
+            finally:
+                job.finished_at = time.time()
+
+
+
+def get_crawler(app):
+    """The shared WebScraper for bulk crawls, built from the app config on first use.
+
+    Page validators go to CRAWL_CACHE_PATH, by default crawl_cache.db beside the database.
+    """
+    from web_scraper import WebScraper
+    from .database import data_directory
+
+    global _crawler
+    if _crawler is None:
+        config = app.config
+        cache_path = config.get('CRAWL_CACHE_PATH')
+        if cache_path is None:
+            cache_path = os.path.join(data_directory(app), 'crawl_cache.db')
+        _crawler = WebScraper(
+            timeout=config.get('CRAWL_TIMEOUT', 30),
+            max_connections=config.get('CRAWL_MAX_CONNECTIONS', 20),
+            per_host_concurrency=config.get('CRAWL_PER_HOST_CONCURRENCY', 2),
+            per_host_rate=config.get('CRAWL_PER_HOST_RATE', 2.0),
+            cache_path=cache_path,
+        )
+    return _crawler
+
+
+def fetch_url(url):
+    """Fetch stage: load a page's text through the shared WebScraper."""
+    from web_scraper import WebScraper
+
+    global _scraper
+    if _scraper is None:
+        _scraper = WebScraper()
+    with timed('ingest', 'scrape'):
+        return _scraper.fetch(url)
+
+
+_scraper = None
+_crawler = None
+
+# Initialize job manager as a singleton
+job_manager = JobManager()
@@ -0,0 +1,257 @@
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+import numpy as np
+from .metrics import STARTUP_SECONDS
+
+TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or such
+that the their then there these they this to was were will with which who what
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens without common English stopwords."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """Process-resident inverted index over chunk text, scored with BM25.
+
+    Every chunk gets a dense row; each term keeps a postings list of
+    (row, term frequency) in compact typed arrays that are appended as
+    chunks are ingested and scored in place with numpy, so a query only
+    touches the postings of its own terms. Removed chunks are tombstoned
+    and their postings compacted once they exceed 10% of the rows.
+
+    At startup the index is built in a background thread, so the app can
+    serve vector questions immediately; BM25 searches wait until it is ready.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, initial_capacity=1024):
+        self._lock = threading.RLock()
+        self.k1 = k1
+        self.b = b
+        self._initial_capacity = initial_capacity
+        self.clear()
+        self.loaded = False
+        self._ready = threading.Event()
+        self._ready.set()
+
+    def init_app(self, app):
+        """Build the index from the database once at startup, in the background
+        unless LEXICAL_INDEX_BACKGROUND is False; LEXICAL_INDEX_LOAD = False skips it."""
+        app.extensions['lexical_index'] = self
+        self.k1 = app.config.get('BM25_K1', self.k1)
+        self.b = app.config.get('BM25_B', self.b)
+
+        def load():
+            start_time = time.perf_counter()
+            with app.app_context():
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    # Tables may not exist yet (before `flask db upgrade`)
+                    print(f"Lexical index not loaded: {str(e)}")
+                finally:
+                    self._ready.set()
+            STARTUP_SECONDS.set(round(time.perf_counter() - start_time, 3), phase='lexical_index')
+
+        if not app.config.get('LEXICAL_INDEX_LOAD', True):
+            return
+        self._ready.clear()
+        if app.config.get('LEXICAL_INDEX_BACKGROUND', True):
+            threading.Thread(target=load, name='lexical-index-load', daemon=True).start()
+        else:
+            load()
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._row_of = {}
+            self._row_ids = np.empty(0, dtype=np.int64)
+            self._row_docs = np.empty(0, dtype=np.int64)
+            self._row_lengths = np.empty(0, dtype=np.float32)
+            self._alive = np.zeros(0, dtype=bool)
+            self._rows = 0
+            self._dead = 0
+            self._total_length = 0
+
+    def _reserve(self, rows):
+        """Grow the row arrays geometrically so appends stay amortised O(1)."""
+        needed = self._rows + rows
+        capacity = self._row_ids.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity * 2, needed)
+        for name, dtype in (('_row_ids', np.int64), ('_row_docs', np.int64),
+                            ('_row_lengths', np.float32), ('_alive', bool)):
+            grown = np.zeros(new_capacity, dtype=dtype)
+            grown[:self._rows] = getattr(self, name)[:self._rows]
+            setattr(self, name, grown)
+
+    def add(self, ids, texts, document_ids=None):
+        """Index the text of the given chunk ids; re-adding an id replaces it.
+
+        Args:
+            ids (list): DocumentChunk ids
+            texts (list): Matching chunk contents
+            document_ids (list or int): Owning document of each chunk, or one id for all
+        Returns:
+            int: Number of chunks added
+        """
+        ids = list(ids)
+        if document_ids is None or np.isscalar(document_ids):
+            document_ids = [-1 if document_ids is None else document_ids] * len(ids)
+        counts = [Counter(tokenize(text or '')) for text in texts]
+        with self._lock:
+            self.remove([chunk_id for chunk_id in ids if chunk_id in self._row_of])
+            self._reserve(len(ids))
+            for chunk_id, document_id, terms in zip(ids, document_ids, counts):
+                row = self._rows
+                self._rows += 1
+                length = sum(terms.values())
+                self._row_of[chunk_id] = row
+                self._row_ids[row] = chunk_id
+                self._row_docs[row] = document_id
+                self._row_lengths[row] = length
+                self._alive[row] = True
+                self._total_length += length
+                for term, tf in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('i'), array('H'))
+                    postings[0].append(row)
+                    postings[1].append(min(tf, 0xFFFF))
+            self.loaded = True
+            return len(ids)
+
+    def remove(self, ids):
+        """Tombstone the given chunk ids."""
+        removed = 0
+        with self._lock:
+            for chunk_id in ids:
+                row = self._row_of.pop(chunk_id, None)
+                if row is None:
+                    continue
+                self._alive[row] = False
+                self._total_length -= int(self._row_lengths[row])
+                removed += 1
+            self._dead += removed
+            if self._dead > 0.1 * max(self._rows, 1):
+                self._compact()
+            return removed
+
+    def _compact(self):
+        """Drop tombstoned rows from every postings list."""
+        for term, (rows, tfs) in list(self._postings.items()):
+            if not rows:
+                continue
+            row_array = np.frombuffer(rows, dtype=np.int32)
+            keep = self._alive[row_array]
+            if keep.all():
+                continue
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (array('i', row_array[keep].tobytes()),
+                                    array('H', np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()))
+        self._dead = 0
+
+    def rebuild(self, batch_size=5000):
+        """Re-index every chunk's text from the database.
+
+        Chunks are read in keyset pages, each fetched in full, so a
+        background rebuild does not hold a read lock on SQLite that would
+        block the app's writes for the whole build.
+        """
+        from .models import db, DocumentChunk
+
+        with self._lock:
+            self.clear()
+            last_id = 0
+            while True:
+                rows = db.session.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content) \
+                    .filter(DocumentChunk.id > last_id) \
+                    .order_by(DocumentChunk.id) \
+                    .limit(batch_size) \
+                    .all()
+                db.session.rollback()
+                if not rows:
+                    break
+                ids, document_ids, texts = zip(*rows)
+                self.add(list(ids), list(texts), list(document_ids))
+                last_id = ids[-1]
+            self.loaded = True
+            print(f"Lexical index loaded with {len(self)} chunks and {len(self._postings)} terms")
+            return len(self)
+
+    def _score(self, terms, document_ids=None):
+        """BM25 scores as (rows, scores) over chunks matching any of ``terms``."""
+        live = len(self._row_of)
+        avg_length = self._total_length / live if live else 0
+        doc_filter = np.asarray(document_ids, dtype=np.int64) if document_ids is not None else None
+        row_parts, score_parts = [], []
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings or not postings[0]:
+                continue
+            rows = np.frombuffer(postings[0], dtype=np.int32)
+            keep = self._alive[rows]
+            df = int(keep.sum())
+            if not df:
+                continue
+            if doc_filter is not None:
+                keep &= np.isin(self._row_docs[rows], doc_filter)
+            rows = rows[keep]
+            tfs = np.frombuffer(postings[1], dtype=np.uint16)[keep].astype(np.float32)
+            idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._row_lengths[rows] / (avg_length or 1))
+            row_parts.append(rows)
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if not row_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(score_parts))
+
+    def _top_k(self, rows, scores, k):
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._row_ids[rows[i]]), float(scores[i])) for i in top]
+
+    def search(self, query, k=3, document_ids=None, per_document=False):
+        """Return the top-k (chunk_id, score) pairs by BM25.
+
+        Args:
+            query (str): Question text
+            k (int): Number of results (per document when ``per_document``)
+            document_ids (list): Only search these documents' chunks
+            per_document (bool): Take the top-k of every document and merge
+        """
+        terms = set(tokenize(query))
+        self._ready.wait()
+        with self._lock:
+            if not self._row_of or not terms:
+                return []
+            if per_document and document_ids is not None:
+                hits = []
+                for document_id in dict.fromkeys(document_ids):
+                    hits.extend(self._top_k(*self._score(terms, [document_id]), k))
+                return sorted(hits, key=lambda hit: hit[1], reverse=True)
+            return self._top_k(*self._score(terms, document_ids), k)
+
+
+# Initialize lexical index as a singleton
+lexical_index = LexicalIndex()
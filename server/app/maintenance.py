@@ -0,0 +1,275 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, or_, tuple_
+from .models import db, Document, DocumentChunk, ChatHistory
+from .retrieval import unindex_chunks
+from .answer_cache import answer_cache
+from .history_writer import history_writer
+from .metrics import MAINTENANCE_ROWS_DELETED, record_stage
+
+# Free pages returned to the filesystem per incremental_vacuum step
+VACUUM_PAGES_PER_STEP = 256
+
+# One maintenance run per process at a time
+_running = threading.Lock()
+
+
+class MaintenanceRunning(RuntimeError):
+    pass
+
+
+def _pause(seconds):
+    # Between batches: each batch is its own short transaction, and the
+    # pause lets requests waiting for the write lock take it
+    if seconds:
+        time.sleep(seconds)
+
+
+def _delete_ids(model, ids, batch_size, pause):
+    """Delete rows by primary key, committing every ``batch_size`` rows."""
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        db.session.query(model).filter(model.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+        MAINTENANCE_ROWS_DELETED.inc(len(batch), table=model.__tablename__)
+        _pause(pause)
+    return len(ids)
+
+
+def purge_chat_history(max_age_days=None, max_rows=None, batch_size=500, pause=0.05):
+    """Delete chat history older than ``max_age_days`` or beyond the newest ``max_rows``.
+
+    Rows are deleted oldest first, ``batch_size`` at a time, walking the
+    (created_at, id) index.
+
+    Returns:
+        int: Rows deleted
+    """
+    if max_age_days is None and max_rows is None:
+        return 0
+    # Rows still queued behind /ask count towards max_rows
+    history_writer.flush(timeout=5)
+    conditions = []
+    if max_age_days is not None:
+        conditions.append(ChatHistory.created_at < datetime.utcnow() - timedelta(days=max_age_days))
+    if max_rows is not None:
+        boundary = db.session.query(ChatHistory.created_at, ChatHistory.id) \
+            .order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()) \
+            .offset(max_rows).first()
+        if boundary is not None:
+            conditions.append(tuple_(ChatHistory.created_at, ChatHistory.id) <= tuple(boundary))
+    if not conditions:
+        return 0
+
+    deleted = 0
+    while True:
+        ids = [row_id for row_id, in db.session.query(ChatHistory.id).filter(or_(*conditions))
+               .order_by(ChatHistory.created_at, ChatHistory.id).limit(batch_size)]
+        if not ids:
+            db.session.rollback()
+            return deleted
+        deleted += _delete_ids(ChatHistory, ids, batch_size, pause)
+
+
+def remove_superseded_documents(batch_size=500, pause=0.05):
+    """Delete older Document rows of a URL, their chunks, and chunks left without a document.
+
+    Ingestion only ever uses the newest Document of a URL; older copies
+    date from before re-ingestion updated documents in place. Their chat
+    history moves to the newest copy. Chunks leave the vector and BM25
+    indexes before their rows are deleted, so retrieval never returns an
+    id that is gone.
+
+    Returns:
+        dict: documents_deleted, chunks_deleted and history_moved
+    """
+    latest = {url: document_id for url, document_id in
+              db.session.query(Document.url, func.max(Document.id)).group_by(Document.url)}
+    superseded = [(document_id, latest[url]) for document_id, url in
+                  db.session.query(Document.id, Document.url).filter(Document.id.notin_(latest.values()))]
+    superseded_ids = [document_id for document_id, _ in superseded]
+
+    chunks = db.session.query(DocumentChunk.id, DocumentChunk.document_id).filter(
+        or_(DocumentChunk.document_id.in_(superseded_ids),
+            DocumentChunk.document_id.notin_(db.session.query(Document.id)))).all()
+    db.session.rollback()
+    chunk_ids = [chunk_id for chunk_id, _ in chunks]
+    if chunk_ids:
+        unindex_chunks(chunk_ids)
+    _delete_ids(DocumentChunk, chunk_ids, batch_size, pause)
+
+    history_moved = 0
+    for document_id, latest_id in superseded:
+        history_moved += db.session.query(ChatHistory).filter(ChatHistory.document_id == document_id) \
+            .update({ChatHistory.document_id: latest_id}, synchronize_session=False)
+        db.session.commit()
+    _delete_ids(Document, superseded_ids, batch_size, pause)
+    if chunks:
+        answer_cache.invalidate({document_id for _, document_id in chunks})
+    return {'documents_deleted': len(superseded_ids), 'chunks_deleted': len(chunk_ids),
+            'history_moved': history_moved}
+
+
+def purge_all(batch_size=500, pause=0.05):
+    """Delete every chunk, document and chat history row, in batches.
+
+    Returns:
+        dict: Rows deleted per table
+    """
+    history_writer.flush(timeout=5)
+    chunk_ids = [chunk_id for chunk_id, in db.session.query(DocumentChunk.id)]
+    db.session.rollback()
+    if chunk_ids:
+        unindex_chunks(chunk_ids)
+    deleted = {'chunks_deleted': _delete_ids(DocumentChunk, chunk_ids, batch_size, pause)}
+    # Chat history points at documents, so it goes first
+    for key, model in (('history_deleted', ChatHistory), ('documents_deleted', Document)):
+        ids = [row_id for row_id, in db.session.query(model.id)]
+        db.session.rollback()
+        deleted[key] = _delete_ids(model, ids, batch_size, pause)
+    answer_cache.invalidate()
+    return deleted
+
+
+def database_space():
+    """Size of the SQLite database and of its free pages, in bytes; None for other databases."""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    with db.engine.connect() as connection:
+        page_size = connection.exec_driver_sql('PRAGMA page_size').scalar()
+        page_count = connection.exec_driver_sql('PRAGMA page_count').scalar()
+        freelist = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+    return {'database_bytes': page_size * page_count, 'free_bytes': page_size * freelist}
+
+
+def incremental_vacuum(pages_per_step=VACUUM_PAGES_PER_STEP, pause=0.05, convert=False):
+    """Return free SQLite pages to the filesystem, a step at a time, then ANALYZE.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL, which databases
+    created by this app have (see SQLITE_PRAGMAS). An older database
+    keeps its free pages for reuse unless ``convert`` is set: that runs
+    one full VACUUM, which blocks writers for its whole duration.
+
+    Returns:
+        dict: auto_vacuum mode, pages freed and seconds per phase
+    """
+    report = {'vacuum_seconds': 0.0, 'analyze_seconds': 0.0, 'pages_freed': 0}
+    if db.engine.dialect.name != 'sqlite':
+        report['auto_vacuum'] = None
+        return report
+    # VACUUM and the pragmas below cannot run inside a transaction, so they
+    # go straight to the sqlite3 connection in autocommit mode
+    connection = db.engine.raw_connection()
+    sqlite_connection = connection.driver_connection
+    isolation_level = sqlite_connection.isolation_level
+    sqlite_connection.isolation_level = None
+    try:
+        def pragma(statement):
+            return sqlite_connection.execute(statement).fetchall()
+
+        start = time.perf_counter()
+        mode = pragma('PRAGMA auto_vacuum')[0][0]
+        if mode != 2 and convert:
+            pragma('PRAGMA auto_vacuum=INCREMENTAL')
+            pragma('VACUUM')
+            mode = pragma('PRAGMA auto_vacuum')[0][0]
+        if mode == 2:
+            free = pragma('PRAGMA freelist_count')[0][0]
+            while free:
+                # execute() would step the statement once, freeing a single page;
+                # executescript() runs it to completion
+                sqlite_connection.executescript(f'PRAGMA incremental_vacuum({int(pages_per_step)})')
+                remaining = pragma('PRAGMA freelist_count')[0][0]
+                if remaining >= free:
+                    break
+                report['pages_freed'] += free - remaining
+                free = remaining
+                _pause(pause)
+        # Shrink the WAL file too, now that its pages are in the database
+        pragma('PRAGMA wal_checkpoint(TRUNCATE)')
+        report['vacuum_seconds'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        pragma('ANALYZE')
+        report['analyze_seconds'] = round(time.perf_counter() - start, 3)
+    finally:
+        sqlite_connection.isolation_level = isolation_level
+        connection.close()
+    report['auto_vacuum'] = {0: 'none', 1: 'full', 2: 'incremental'}.get(mode, mode)
+    return report
+
+
+def run_maintenance(history_max_age_days=None, history_max_rows=None, superseded=True, vacuum=True,
+                    convert=False, everything=False, batch_size=None, pause_ms=None):
+    """Retention and compaction in one pass: purge, delete superseded documents, vacuum.
+
+    Safe to run while the app serves traffic: deletes are committed in
+    batches of MAINTENANCE_BATCH_SIZE rows, MAINTENANCE_PAUSE_MS apart.
+
+    Args:
+        history_max_age_days (float): Delete chat history older than this
+            (default HISTORY_MAX_AGE_DAYS; None keeps it)
+        history_max_rows (int): Keep only the newest rows (default
+            HISTORY_MAX_ROWS; None keeps them all)
+        superseded (bool): Delete superseded documents and orphaned chunks
+        vacuum (bool): Incremental VACUUM and ANALYZE afterwards
+        convert (bool): Switch an older database to incremental
+            auto_vacuum with one full VACUUM
+        everything (bool): Delete all documents, chunks and chat history
+        batch_size (int): Overrides MAINTENANCE_BATCH_SIZE
+        pause_ms (float): Overrides MAINTENANCE_PAUSE_MS
+    Returns:
+        dict: Rows deleted, bytes reclaimed and seconds per phase
+    Raises:
+        MaintenanceRunning: Another run is in progress in this process
+    """
+    config = current_app.config
+    if history_max_age_days is None:
+        history_max_age_days = config.get('HISTORY_MAX_AGE_DAYS')
+    if history_max_rows is None:
+        history_max_rows = config.get('HISTORY_MAX_ROWS')
+    batch_size = batch_size or config.get('MAINTENANCE_BATCH_SIZE', 500)
+    pause = (config.get('MAINTENANCE_PAUSE_MS', 50) if pause_ms is None else pause_ms) / 1000
+
+    if not _running.acquire(blocking=False):
+        raise MaintenanceRunning("Maintenance is already running")
+    try:
+        start_time = time.perf_counter()
+        before = database_space()
+        report = {'timings': {}}
+
+        def phase(name, fn, *args, **kwargs):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            record_stage('maintenance', name, seconds)
+            report['timings'][name] = round(seconds, 3)
+            return result
+
+        if everything:
+            report.update(phase('purge', purge_all, batch_size, pause))
+        else:
+            report['history_deleted'] = phase('history', purge_chat_history, history_max_age_days,
+                                              history_max_rows, batch_size, pause)
+            if superseded:
+                report.update(phase('documents', remove_superseded_documents, batch_size, pause))
+        if vacuum:
+            vacuumed = incremental_vacuum(pause=pause, convert=convert)
+            for name in ('vacuum', 'analyze'):
+                record_stage('maintenance', name, vacuumed[f'{name}_seconds'])
+                report['timings'][name] = vacuumed[f'{name}_seconds']
+            report['auto_vacuum'] = vacuumed['auto_vacuum']
+            report['pages_freed'] = vacuumed['pages_freed']
+
+        after = database_space()
+        if before is not None:
+            report['bytes_before'] = before['database_bytes']
+            report['bytes_after'] = after['database_bytes']
+            report['bytes_reclaimed'] = before['database_bytes'] - after['database_bytes']
+            report['free_bytes'] = after['free_bytes']
+        report['seconds'] = round(time.perf_counter() - start_time, 3)
+        return report
+    finally:
+        _running.release()
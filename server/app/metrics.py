@@ -0,0 +1,216 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, has_app_context
+
+# Reference point for startup timings: when the app package was first imported
+PROCESS_START = time.perf_counter()
+
+# Seconds; spans cache hits and index scoring up to slow generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, [('le', bound)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, labelnames=()):
+        metric = Gauge(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Initialize metrics registry as a singleton
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'rag_stage_duration_seconds', 'Time spent in each stage of the ask, ingest and maintenance pipelines',
+    ('pipeline', 'stage'))
+ASK_REQUESTS = metrics.counter(
+    'rag_ask_requests_total', 'Questions answered, by outcome', ('outcome',))
+INGEST_CHUNKS = metrics.counter(
+    'rag_ingest_chunks_total', 'Chunks processed by ingestion, by result', ('result',))
+CONTEXT_TOKENS = metrics.histogram(
+    'rag_context_tokens', 'Tokens of retrieved context put in each /ask prompt', (),
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192))
+HISTORY_QUEUE_DEPTH = metrics.gauge(
+    'rag_history_queue_depth', 'Chat history rows waiting to be written behind /ask')
+HISTORY_BATCH_ROWS = metrics.histogram(
+    'rag_history_batch_rows', 'Chat history rows written per commit', (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+SESSIONS = metrics.gauge(
+    'rag_sessions', 'Conversation sessions held in memory')
+SESSION_BYTES = metrics.gauge(
+    'rag_session_bytes', 'Bytes of Ollama token contexts and turns held by conversation sessions')
+SESSION_TURNS = metrics.counter(
+    'rag_session_turns_total', 'Session questions, by prompt: continued from the stored context or full',
+    ('prompt',))
+MAINTENANCE_ROWS_DELETED = metrics.counter(
+    'rag_maintenance_rows_deleted_total', 'Rows deleted by retention and compaction runs, by table', ('table',))
+CRAWL_PAGES = metrics.counter(
+    'rag_crawl_pages_total', 'Pages handled by bulk crawls, by result', ('result',))
+EMBED_BATCH_TEXTS = metrics.histogram(
+    'rag_embed_batch_texts', 'Texts per coalesced embedding call to Ollama', (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+EMBED_COALESCED = metrics.counter(
+    'rag_embed_coalesced_total', 'Embedding requests answered by an identical request already in flight')
+ADMISSION_IN_FLIGHT = metrics.gauge(
+    'rag_admission_in_flight', 'Calls to Ollama holding an admission slot', ('backend',))
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    'rag_admission_queue_depth', 'Calls waiting for an admission slot', ('backend',))
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    'rag_admission_wait_seconds', 'Time spent waiting for an admission slot', ('backend',))
+ADMISSION_REJECTED = metrics.counter(
+    'rag_admission_rejected_total', 'Calls turned away with 503, by reason', ('backend', 'reason'))
+CIRCUIT_STATE = metrics.gauge(
+    'ollama_circuit_state', 'Ollama circuit breaker: 0 closed, 1 half-open, 2 open')
+STARTUP_SECONDS = metrics.gauge(
+    'rag_startup_seconds', 'Time spent in each startup phase; first_ask is import to first answered /ask',
+    ('phase',))
+UPSTREAM_SECONDS = metrics.histogram(
+    'ollama_request_duration_seconds', 'Latency of each HTTP call to Ollama, until response headers',
+    ('endpoint',))
+UPSTREAM_REQUESTS = metrics.counter(
+    'ollama_requests_total', 'HTTP calls to Ollama, by status code', ('endpoint', 'status'))
+UPSTREAM_ERRORS = metrics.counter(
+    'ollama_errors_total', 'Failed HTTP calls to Ollama, by reason', ('endpoint', 'reason'))
+
+
+def record_stage(pipeline, stage, seconds):
+    """Observe a stage duration and add it to the current request's breakdown."""
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=stage)
+    if has_app_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(pipeline, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, stage, time.perf_counter() - start)
+
+
+def mark_first_ask():
+    """Record the time from startup to the first answered /ask, once per process."""
+    global _first_ask_recorded
+    if not _first_ask_recorded:
+        _first_ask_recorded = True
+        STARTUP_SECONDS.set(round(time.perf_counter() - PROCESS_START, 3), phase='first_ask')
+
+
+_first_ask_recorded = False
+
+
+def stage_timings():
+    """Per-stage milliseconds recorded so far in this request."""
+    timings = g.get('stage_timings', {}) if has_app_context() else {}
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
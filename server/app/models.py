@@ -1,14 +1,20 @@
 from datetime import datetime
 from . import db
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, PickleType
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Float, Index
 from sqlalchemy.orm import relationship
 
 class Document(db.Model):
     __tablename__ = 'document'
     id = Column(Integer, primary_key=True)
-    url = Column(String(500), nullable=False)
+    url = Column(String(500), nullable=False, index=True)
     content = Column(Text, nullable=False)
-    embedding = Column(PickleType)
+    # sha256 of content; an unchanged re-scrape is skipped
+    content_hash = Column(String(64))
+    # Raw vector bytes; see vector_codec for the dtype/scale encoding
+    embedding = Column(LargeBinary)
+    embedding_dim = Column(Integer)
+    embedding_dtype = Column(String(8))
+    embedding_scale = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -22,11 +28,21 @@ class ChatHistory(db.Model):
     created_at = Column(DateTime, default=datetime.utcnow)
     document = relationship('Document', backref='chat_history')
 
+    # Keyset pagination walks (created_at, id), optionally within one document
+    __table_args__ = (
+        Index('ix_chat_history_created_at_id', 'created_at', 'id'),
+        Index('ix_chat_history_document_id_created_at_id', 'document_id', 'created_at', 'id'),
+    )
+
 class DocumentChunk(db.Model):
     __tablename__ = 'document_chunk'
     id = Column(Integer, primary_key=True)
-    document_id = Column(Integer, ForeignKey('document.id'), nullable=False)
+    document_id = Column(Integer, ForeignKey('document.id'), nullable=False, index=True)
     content = Column(Text, nullable=False)
-    embedding = Column(PickleType)
+    content_hash = Column(String(64))
+    embedding = Column(LargeBinary)
+    embedding_dim = Column(Integer)
+    embedding_dtype = Column(String(8))
+    embedding_scale = Column(Float)
     chunk_index = Column(Integer)
     document = relationship('Document', backref='chunks')
\ No newline at end of file
@@ -0,0 +1,166 @@
+from sqlalchemy.orm import load_only
+from sqlalchemy import func
+from .models import db, Document, DocumentChunk
+from .vector_index import vector_index
+from .lexical_index import lexical_index
+from .answer_cache import answer_cache
+from .metrics import timed
+
+RETRIEVAL_MODES = ('vector', 'bm25', 'hybrid')
+# Reciprocal-rank fusion constant; dampens the weight of the very top ranks
+RRF_K = 60
+# Each ranker contributes this many candidates per requested chunk to the fusion
+HYBRID_CANDIDATES = 4
+# Chunk texts fetched per query when catching up with other workers' ingestion
+SYNC_BATCH_SIZE = 500
+
+
+def resolve_document_ids(data):
+    """Document scope requested by an /ask payload.
+
+    Accepts ``document_id``/``document_ids`` and ``url``/``urls`` (the
+    latest document stored for each URL).
+
+    Returns:
+        list: Document ids, or None when the question is not scoped
+    """
+    document_ids = []
+    for key in ('document_id', 'document_ids'):
+        value = data.get(key)
+        if value is not None:
+            document_ids.extend(value if isinstance(value, list) else [value])
+
+    urls = []
+    for key in ('url', 'urls'):
+        value = data.get(key)
+        if value is not None:
+            urls.extend(value if isinstance(value, list) else [value])
+    if urls:
+        latest = db.session.query(func.max(Document.id)) \
+            .filter(Document.url.in_(urls)) \
+            .group_by(Document.url) \
+            .all()
+        if len(latest) < len(set(urls)):
+            raise LookupError("No document has been ingested for one or more of the given URLs")
+        document_ids.extend(doc_id for doc_id, in latest)
+
+    if not document_ids and not urls:
+        return None
+    return sorted({int(d) for d in document_ids})
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Fuse several best-first (chunk_id, score) lists by reciprocal rank.
+
+    Returns:
+        list: The top-k (chunk_id, fused score) pairs, best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)[:k]
+
+
+def _hybrid_search(question, question_embedding, top_k, document_ids):
+    candidates = top_k * HYBRID_CANDIDATES
+    return reciprocal_rank_fusion([
+        vector_index.search(question_embedding, candidates, document_ids=document_ids),
+        lexical_index.search(question, candidates, document_ids=document_ids),
+    ], top_k)
+
+
+def sync_indexes():
+    """Catch up with chunks other worker processes ingested (VECTOR_INDEX_SHARED).
+
+    The shared vector index follows their snapshot generations; this
+    worker's BM25 index and answer cache are updated to match. An index
+    whose startup load failed is loaded again here, rather than left to
+    serve (and, when shared, publish) a partial copy.
+    """
+    if vector_index.retry_load():
+        # Whatever kept the vector index from loading most likely stopped the BM25 index too
+        lexical_index.rebuild()
+        answer_cache.invalidate()
+    vector_index.refresh()
+    added, document_ids, removed = vector_index.take_peer_changes()
+    if removed:
+        lexical_index.remove(removed)
+    for start in range(0, len(added), SYNC_BATCH_SIZE):
+        rows = db.session.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content) \
+            .filter(DocumentChunk.id.in_(added[start:start + SYNC_BATCH_SIZE])) \
+            .all()
+        if rows:
+            ids, chunk_document_ids, texts = zip(*rows)
+            lexical_index.add(list(ids), list(texts), list(chunk_document_ids))
+    if removed:
+        # Deleted chunks no longer say which documents they came from
+        answer_cache.invalidate()
+    elif added:
+        answer_cache.invalidate(set(document_ids))
+
+
+def find_relevant_chunks(question_embedding, top_k=3, document_ids=None, question=None, retrieval='vector'):
+    """Return the DocumentChunk rows most relevant to the question, best first.
+
+    Scoring happens in the resident indexes; only the winning chunks are
+    fetched from the database, without their embedding column. With
+    several ``document_ids`` the top-k of each document is merged, so a
+    comparison sees every document.
+
+    Args:
+        question_embedding: Question embedding, for vector similarity
+        top_k (int): Number of chunks (per document when several are given)
+        document_ids (list): Only search these documents
+        question (str): Question text, for BM25
+        retrieval (str): 'vector', 'bm25' (exact terms) or 'hybrid'
+            (both, fused by reciprocal rank)
+    """
+    sync_indexes()
+    per_document = document_ids is not None and len(document_ids) > 1
+    with timed('ask', 'score'):
+        if retrieval == 'vector':
+            hits = vector_index.search(question_embedding, top_k, document_ids=document_ids,
+                                       per_document=per_document)
+        elif retrieval == 'bm25':
+            hits = lexical_index.search(question, top_k, document_ids=document_ids, per_document=per_document)
+        elif retrieval == 'hybrid':
+            scopes = [[document_id] for document_id in document_ids] if per_document else [document_ids]
+            hits = []
+            for scope in scopes:
+                hits.extend(_hybrid_search(question, question_embedding, top_k, scope))
+            hits.sort(key=lambda hit: hit[1], reverse=True)
+        else:
+            raise ValueError(f"retrieval must be one of {RETRIEVAL_MODES}")
+    if not hits:
+        return []
+
+    ids = [chunk_id for chunk_id, _ in hits]
+    with timed('ask', 'load'):
+        rows = DocumentChunk.query \
+            .options(load_only(DocumentChunk.id, DocumentChunk.document_id,
+                               DocumentChunk.content, DocumentChunk.chunk_index)) \
+            .filter(DocumentChunk.id.in_(ids)) \
+            .all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+
+def index_chunks(chunk_ids, embeddings, document_id, contents, content_hashes=None):
+    """Add freshly committed chunks to the vector and lexical indexes.
+
+    Args:
+        chunk_ids (list): DocumentChunk ids
+        embeddings (list): Their float32 embeddings, before storage encoding
+        document_id (int): Document the chunks belong to
+        contents (list): Their text
+        content_hashes (list): Their stored content hashes
+    """
+    lexical_index.add(chunk_ids, contents, document_id)
+    return vector_index.add(chunk_ids, embeddings, document_id, content_hashes)
+
+
+def unindex_chunks(chunk_ids):
+    """Drop deleted chunks from the vector and lexical indexes."""
+    lexical_index.remove(chunk_ids)
+    return vector_index.remove(chunk_ids)
@@ -0,0 +1,166 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from .metrics import SESSIONS, SESSION_BYTES, SESSION_TURNS
+
+
+class Session:
+    """One conversation: Ollama's token context after the last answer, and what it has seen.
+
+    ``model_context`` is the ``context`` array /api/generate returned for
+    the previous turn; sending it back lets the model continue from there
+    without re-reading the earlier prompts. ``chunk_ids`` are the chunks
+    already in that context, so follow-ups only add new evidence.
+    ``turns`` keeps the last few questions and answers for the full-prompt
+    fallback when the context cannot be reused.
+    """
+
+    def __init__(self, session_id, scope=None):
+        self.id = session_id
+        self.scope = scope
+        self.model = None
+        self.model_context = None
+        self.chunk_ids = set()
+        self.turns = []
+        self.turn_count = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    @property
+    def nbytes(self):
+        size = 0 if self.model_context is None else self.model_context.nbytes
+        size += 8 * len(self.chunk_ids)
+        return size + sum(len(question) + len(answer) for question, answer in self.turns)
+
+
+class SessionStore:
+    """Bounded LRU of conversation sessions, local to this process.
+
+    Sessions expire ``ttl`` seconds after their last turn. The least
+    recently used are evicted beyond ``max_entries`` sessions or
+    ``max_bytes`` of stored token contexts and turns. A session whose
+    context outgrows ``max_context_tokens`` keeps its turns but drops the
+    context, so its next question is asked with a full prompt again.
+    """
+
+    def __init__(self, max_entries=1000, ttl=1800, max_bytes=64 * 1024 * 1024, max_context_tokens=4096,
+                 history_turns=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_context_tokens = max_context_tokens
+        self.history_turns = history_turns
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self.reused = 0
+        self.fallbacks = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('SESSION_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('SESSION_TTL', self.ttl)
+        self.max_bytes = app.config.get('SESSION_MAX_BYTES', self.max_bytes)
+        self.max_context_tokens = app.config.get('SESSION_MAX_CONTEXT_TOKENS', self.max_context_tokens)
+        self.history_turns = app.config.get('SESSION_HISTORY_TURNS', self.history_turns)
+        with self._lock:
+            self._sessions.clear()
+            self._set_size(0)
+        app.extensions['sessions'] = self
+
+    def _set_size(self, nbytes):
+        self._bytes = nbytes
+        SESSIONS.set(len(self._sessions))
+        SESSION_BYTES.set(nbytes)
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._set_size(self._bytes - session.nbytes)
+
+    def get(self, session_id):
+        """The live session with this id, or None if it is unknown or expired."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.last_used > self.ttl:
+                self._remove(session_id)
+                self.expirations += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def create(self, session_id=None, scope=None):
+        """A new, empty session; it is stored once its first turn completes."""
+        return Session(session_id or uuid.uuid4().hex, scope)
+
+    def reusable_context(self, session, model):
+        """The token context to continue ``session`` from, or None for a full prompt."""
+        if session.model_context is not None and session.model == model:
+            self.reused += 1
+            SESSION_TURNS.inc(prompt='continued')
+            return session.model_context.tolist()
+        if session.turn_count:
+            self.fallbacks += 1
+        SESSION_TURNS.inc(prompt='full')
+        return None
+
+    def record_turn(self, session, question, answer, model, model_context, chunk_ids):
+        """Store a completed turn and the context Ollama returned for it.
+
+        ``chunk_ids`` are every chunk the returned context contains.
+
+        Turns of one session are meant to be sequential; if two overlap,
+        the one that finishes last is what the next question continues.
+        """
+        if self.max_entries <= 0 or self.max_bytes <= 0:
+            return
+        with self._lock:
+            self._remove(session.id)
+            if model_context and len(model_context) <= self.max_context_tokens:
+                session.model_context = np.asarray(model_context, dtype=np.int32)
+                session.chunk_ids = set(chunk_ids)
+            else:
+                # Too long to resend, or not returned: start over with a full prompt
+                session.model_context = None
+                session.chunk_ids = set()
+            session.model = model
+            session.turns = (session.turns + [(question, answer)])[-self.history_turns:] \
+                if self.history_turns > 0 else []
+            session.turn_count += 1
+            session.last_used = time.time()
+
+            self._sessions[session.id] = session
+            size = self._bytes + session.nbytes
+            while self._sessions and (len(self._sessions) > self.max_entries or size > self.max_bytes):
+                _, oldest = self._sessions.popitem(last=False)
+                size -= oldest.nbytes
+                self.evictions += 1
+            self._set_size(size)
+
+    def drop(self, session_id):
+        with self._lock:
+            existed = session_id in self._sessions
+            self._remove(session_id)
+            return existed
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'reused': self.reused,
+            'fallbacks': self.fallbacks,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+# Initialize session store as a singleton
+session_store = SessionStore()
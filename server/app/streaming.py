@@ -0,0 +1,96 @@
+import json
+import time
+from flask import Response, request, stream_with_context
+from .models import db
+from .llm import llm_service
+from .metrics import ASK_REQUESTS, record_stage, stage_timings
+from .admission import Overloaded
+
+
+def wants_stream(data):
+    """True when the client asked for Server-Sent Events instead of JSON."""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_answer(question, context, on_complete, answer=None, timings=False, conversation=None, history=(),
+                  session_id=None):
+    """Stream an answer as SSE: the retrieved context first, then tokens.
+
+    ``on_complete(answer, model_context)`` runs once generation finishes,
+    with Ollama's token context (None for a ready answer), and returns the
+    saved ChatHistory id, so an aborted stream leaves no half-written
+    answer behind. A ready ``answer`` (e.g. from the answer cache) is sent
+    as a single token. With ``timings`` the ``done`` event carries the
+    per-stage breakdown. ``conversation`` and ``history`` are passed to
+    the generation; a ``session_id`` is reported in the ``context`` and
+    ``done`` events.
+
+    Generation is admitted before the response starts, so a saturated
+    backend raises Overloaded here and the caller can still answer 503.
+    """
+    stream, stream_error = None, None
+    start_time = time.perf_counter()
+    if answer is None:
+        try:
+            stream = llm_service.generate_response_stream(question, context, conversation=conversation,
+                                                          history=history)
+        except Overloaded:
+            raise
+        except Exception as e:
+            stream_error = e
+
+    def generate():
+        yield sse_event('context', {'context': context, 'session_id': session_id} if session_id else
+                        {'context': context})
+
+        if answer is not None:
+            tokens = [answer]
+            yield sse_event('token', {'token': answer})
+        else:
+            tokens = []
+            try:
+                if stream_error is not None:
+                    raise stream_error
+                for token in stream:
+                    if not tokens:
+                        record_stage('ask', 'first_token', time.perf_counter() - start_time)
+                    tokens.append(token)
+                    yield sse_event('token', {'token': token})
+            except Exception as e:
+                ASK_REQUESTS.inc(outcome='error')
+                yield sse_event('error', {'error': f"Error generating response: {str(e)}"})
+                return
+            finally:
+                if stream is not None:
+                    stream.close()
+                record_stage('ask', 'generate', time.perf_counter() - start_time)
+            ASK_REQUESTS.inc(outcome='answered')
+
+        full_answer = ''.join(tokens).strip()
+        try:
+            chat_id = on_complete(full_answer, stream.context if stream is not None else None)
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'error': str(e)})
+            return
+
+        done = {'id': chat_id, 'answer': full_answer}
+        if session_id:
+            done['session_id'] = session_id
+        if timings:
+            done['timings'] = stage_timings()
+        yield sse_event('done', done)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if stream is not None:
+        # Frees the generation slot even if the client leaves before the body starts
+        response.call_on_close(stream.close)
+    return response
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Supported on-disk / in-memory representations of an embedding
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+
+def quantize(vectors, dtype):
+    """Convert float32 rows to the storage dtype.
+
+    int8 uses symmetric per-row scalar quantization: each row is divided
+    by ``max(|x|) / 127`` and that scale is returned alongside, so
+    ``row ~= q * scale``.
+
+    Returns:
+        tuple: (quantized rows, per-row float32 scales or None)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'float32':
+        return vectors, None
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype == 'int8':
+        single = vectors.ndim == 1
+        rows = vectors.reshape(1, -1) if single else vectors
+        scales = np.abs(rows).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(rows / scales[:, None]), -127, 127).astype(np.int8)
+        if single:
+            return quantized[0], np.float32(scales[0])
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+
+def encode_embedding(vector, dtype='float32'):
+    """Serialize one embedding for a LargeBinary column.
+
+    Returns:
+        tuple: (bytes, dim, dtype, scale) matching the embedding_* columns
+    """
+    quantized, scale = quantize(vector, dtype)
+    return quantized.tobytes(), int(quantized.shape[0]), dtype, None if scale is None else float(scale)
+
+
+def decode_embedding(blob, dtype=None, scale=None):
+    """Decode a stored embedding back to float32.
+
+    Rows written before dtype metadata existed are raw float32 bytes.
+    """
+    if blob is None:
+        return None
+    if not isinstance(blob, (bytes, bytearray, memoryview)):
+        return np.asarray(blob, dtype=np.float32)
+    dtype = dtype or 'float32'
+    vector = np.frombuffer(blob, dtype=np.dtype(dtype))
+    if dtype == 'int8':
+        return vector.astype(np.float32) * np.float32(scale if scale is not None else 1.0)
+    return vector.astype(np.float32, copy=False)
+
+
+def score_block(rows, query, scales=None):
+    """Dot products of a block of stored rows with a float32 query.
+
+    Works on the stored dtype directly; only this block is upcast, so the
+    temporary float32 copy stays bounded by the block size.
+    """
+    if rows.dtype == np.float32:
+        scores = rows @ query
+    else:
+        scores = rows.astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales
+    return scores
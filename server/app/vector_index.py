@@ -0,0 +1,786 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import nullcontext
+import numpy as np
+from .database import data_directory
+from .vector_codec import STORAGE_DTYPES, quantize, decode_embedding, score_block
+from .index_snapshot import SNAPSHOT_VERSION, IndexSnapshot, row_keys, fingerprint, extend_fingerprint, new_meta
+from .metrics import STARTUP_SECONDS
+
+# Rows scored per block in exact search; bounds the float32 upcast of quantized storage
+SEARCH_BLOCK_ROWS = 65536
+# Seconds between attempts to load an index whose startup load failed
+LOAD_RETRY_SECONDS = 5.0
+
+
+def database_fingerprint():
+    """fingerprint of the (id, content hash) pairs of the chunks that have an embedding."""
+    from sqlalchemy import func
+    from .models import db, DocumentChunk
+
+    rows = db.session.query(DocumentChunk.id, func.substr(DocumentChunk.content_hash, 1, 16)) \
+        .filter(DocumentChunk.embedding.isnot(None)).all()
+    return fingerprint(row_keys([row[0] for row in rows], [row[1] for row in rows]))
+
+
+def to_vector(embedding):
+    """Decode a stored embedding (raw bytes, list or ndarray) into a float32 vector."""
+    if embedding is None:
+        return None
+    if isinstance(embedding, (bytes, bytearray, memoryview)):
+        return np.frombuffer(embedding, dtype=np.float32)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class VectorIndex:
+    """Process-resident matrix of chunk embeddings.
+
+    Rows live in one contiguous matrix with a parallel array of
+    DocumentChunk ids, so a query is a single matmul followed by an
+    argpartition top-k instead of a scan over ORM rows. The matrix is kept
+    in EMBEDDING_DTYPE (float32, float16 or int8 with per-row scales) and
+    scored in that representation.
+
+    Rows are also partitioned by document, so a query scoped to some
+    documents only scores those documents' rows.
+
+    When an ANN backend is configured (VECTOR_INDEX_BACKEND = 'hnsw' or
+    'ivf') searches go through it instead, and the exact matrix remains
+    the fallback and the ground truth for recall evaluation.
+
+    The arrays are also saved as a snapshot (.npy files plus metadata) and
+    memory-mapped at the next start when its rows still match the database,
+    so startup does not decode every embedding from SQLite.
+
+    With VECTOR_INDEX_SHARED every worker process maps the snapshot
+    read-only instead of holding its own copy. Ingestion appends rows to
+    the snapshot in place, under an inter-process lock, and bumps its
+    generation; refresh() makes the other workers follow.
+    """
+
+    def __init__(self, initial_capacity=1024, save_delay=5.0, storage_dtype='float32'):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self.storage_dtype = storage_dtype
+        self._ids = np.empty(0, dtype=np.int64)
+        self._doc_ids = np.empty(0, dtype=np.int64)
+        # row_keys of each row: what the snapshot fingerprint is computed from
+        self._keys = np.empty(0, dtype=np.uint64)
+        # Ids are appended in increasing order unless re-ingestion interleaves them
+        self._ids_sorted = True
+        self._partitions = {}
+        self._matrix = None
+        self._scales = None
+        self._size = 0
+        self.dim = None
+        self.loaded = False
+        self._bulk_loading = False
+        # Monotonic time of the next load attempt while the startup load has not succeeded
+        self._retry_load_at = None
+        self.backend = None
+        self.persist_path = None
+        self.save_delay = save_delay
+        self._save_timer = None
+        self.snapshot_path = None
+        self.snapshot = None
+        self.shared = False
+        # Generation metadata and CURRENT stamp of the mapped snapshot
+        self._snapshot_meta = None
+        self._snapshot_stamp = None
+        # Rows other workers added or removed, until take_peer_changes()
+        self._peer_added = []
+        self._peer_removed = []
+        # Bumped on every change; the snapshot is rewritten only when it lags
+        self._changes = 0
+        self._snapshot_changes = None
+
+    def init_app(self, app):
+        """Load the index from the database once at startup, unless VECTOR_INDEX_LOAD is False."""
+        from .ann_index import make_backend
+
+        app.extensions['vector_index'] = self
+        self.storage_dtype = app.config.get('EMBEDDING_DTYPE', self.storage_dtype)
+        if self.storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(f"EMBEDDING_DTYPE must be one of {STORAGE_DTYPES}")
+        self.backend = make_backend(app.config)
+        register_commands(app)
+        start_time = time.perf_counter()
+        with app.app_context():
+            if self.backend is not None:
+                self.persist_path = app.config.get('VECTOR_INDEX_PATH') or default_index_path(app, self.backend.kind)
+            self.snapshot_path = app.config.get('VECTOR_SNAPSHOT_PATH')
+            if self.snapshot_path is None:
+                self.snapshot_path = default_snapshot_path(app)
+            self.shared = bool(app.config.get('VECTOR_INDEX_SHARED', False))
+            if self.shared and not self.snapshot_path:
+                raise ValueError("VECTOR_INDEX_SHARED needs a VECTOR_SNAPSHOT_PATH")
+            self.snapshot = IndexSnapshot(self.snapshot_path, shared=self.shared) if self.snapshot_path else None
+            if self.backend is not None or self.snapshot_path:
+                atexit.register(self.save)
+            # Unloaded, a shared index still maps the snapshot on its first add or remove
+            if app.config.get('VECTOR_INDEX_LOAD', True):
+                try:
+                    self._load()
+                except Exception as e:
+                    # Tables may not exist yet (before `flask db upgrade`), or SQLite was busy
+                    print(f"Vector index not loaded: {str(e)}")
+                    self._retry_load_at = time.monotonic() + LOAD_RETRY_SECONDS
+        STARTUP_SECONDS.set(round(time.perf_counter() - start_time, 3), phase='vector_index')
+
+    def _load(self):
+        # Of several workers starting at once, the first rebuilds and the rest map its snapshot
+        with self._snapshot_lock():
+            if not self.load_snapshot():
+                self.rebuild(build_backend=False)
+                self.save_snapshot()
+        self._load_backend()
+        self._retry_load_at = None
+
+    def retry_load(self, force=False):
+        """Load the index again if the startup load failed.
+
+        Tried at most every LOAD_RETRY_SECONDS unless ``force``; needs an
+        app context.
+
+        Returns:
+            bool: True when the index was loaded by this call
+        """
+        if self._retry_load_at is None or (not force and time.monotonic() < self._retry_load_at):
+            return False
+        with self._lock:
+            if self._retry_load_at is None:
+                return False
+            try:
+                self._load()
+            except Exception as e:
+                print(f"Vector index not loaded: {str(e)}")
+                self._retry_load_at = time.monotonic() + LOAD_RETRY_SECONDS
+                return False
+        return True
+
+    def _meta(self):
+        return {
+            'count': self._size,
+            'max_id': int(self._ids[:self._size].max()) if self._size else 0,
+            'fingerprint': fingerprint(self._keys[:self._size]),
+            'dim': self.dim,
+        }
+
+    def _load_backend(self):
+        """Reuse the ANN index on disk if it matches the database, else rebuild it."""
+        if self.backend is None:
+            return
+        with self._lock:
+            try:
+                meta = self.backend.load(self.persist_path) if self.persist_path else None
+            except Exception as e:
+                print(f"Could not read ANN index {self.persist_path}: {str(e)}")
+                meta = None
+            expected = self._meta()
+            if meta is not None and all(meta.get(k) == v for k, v in expected.items()):
+                print(f"ANN index loaded from {self.persist_path}")
+                return
+            self._build_backend()
+            self._save_backend()
+
+    def _vectors(self, rows):
+        """Dequantized float32 copies of the given matrix rows."""
+        vectors = self._matrix[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _build_backend(self):
+        start_time = time.time()
+        self.backend.build(self._ids[:self._size], self._vectors(slice(0, self._size)) if self._size else np.empty((0, 0)))
+        if self.backend.ready:
+            print(f"Built {self.backend.kind} ANN index over {self._size} chunks in {time.time() - start_time:.2f} seconds")
+
+    def save(self):
+        """Write the snapshot and ANN index next to the database so restarts skip the build."""
+        with self._lock:
+            self._save_timer = None
+            self.save_snapshot()
+            self._save_backend()
+
+    def _save_backend(self):
+        if self.backend is None or not self.persist_path:
+            return
+        try:
+            self.backend.save(self.persist_path, self._meta())
+        except Exception as e:
+            print(f"Could not save ANN index: {str(e)}")
+
+    def _snapshot_lock(self):
+        return self.snapshot.lock() if self.snapshot is not None else nullcontext()
+
+    def _arrays(self):
+        return {'matrix': self._matrix, 'ids': self._ids, 'doc_ids': self._doc_ids, 'keys': self._keys,
+                'scales': self._scales}
+
+    def save_snapshot(self):
+        """Write the index arrays and id map as a new snapshot generation, if they changed.
+
+        The generation is written beside the live one and then made live,
+        so a crash mid-write never leaves a mixed snapshot. In shared mode
+        it gets room to grow and replaces the private arrays in memory.
+        """
+        with self._lock:
+            if self.snapshot is None or self.dim is None or self._snapshot_changes == self._changes:
+                return
+            size = self._size
+            capacity = max(self._initial_capacity, size * 2) if self.shared else size
+            try:
+                with self.snapshot.lock():
+                    meta = self.snapshot.write(self._arrays(), size, capacity,
+                                               new_meta(self.storage_dtype, self.dim, self._keys[:size]))
+                self._snapshot_changes = self._changes
+                if self.shared:
+                    self._install(meta, self.snapshot.stamp())
+            except Exception as e:
+                print(f"Could not save vector index snapshot: {str(e)}")
+
+    def _install(self, meta, stamp):
+        """Map a snapshot generation as the index: read-only when shared, else copy-on-write."""
+        arrays = self.snapshot.map(meta, 'r' if self.shared else 'c')
+        self._matrix = arrays['matrix']
+        self._ids = arrays['ids']
+        self._doc_ids = arrays['doc_ids']
+        self._keys = arrays['keys']
+        self._scales = arrays.get('scales')
+        self._size = meta['size']
+        self.dim = meta['dim']
+        ids = self._ids[:self._size]
+        self._ids_sorted = bool(np.all(ids[1:] > ids[:-1]))
+        self._rebuild_partitions()
+        self.loaded = True
+        self._snapshot_meta = meta
+        self._snapshot_stamp = stamp
+
+    def load_snapshot(self):
+        """Memory-map the snapshot if it matches the database.
+
+        The snapshot's rows are checked against the chunks in the database
+        (count and sum of keys over chunk id and content hash), so any
+        ingest or delete since it was written falls back to a rebuild, even
+        one that reused a deleted chunk's id. Matrix pages are read on demand
+        and, unless shared, copied only when written.
+
+        Returns:
+            bool: True when the index was restored from the snapshot
+        """
+        if self.snapshot is None:
+            return False
+        stamp = self.snapshot.stamp()
+        meta = self.snapshot.read()
+        if meta is None:
+            return False
+        if meta.get('version') != SNAPSHOT_VERSION or meta.get('dtype') != self.storage_dtype:
+            print("Vector index snapshot is from another version or dtype; rebuilding")
+            return False
+        if meta.get('fingerprint') != database_fingerprint():
+            print("Vector index snapshot does not match the database; rebuilding")
+            return False
+        with self._lock:
+            try:
+                self.clear()
+                self._install(meta, stamp)
+                if fingerprint(self._keys[:self._size]) != meta['fingerprint']:
+                    raise ValueError("snapshot rows do not match their fingerprint")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not read vector index snapshot: {str(e)}")
+                self.clear()
+                return False
+            self._snapshot_changes = self._changes
+        print(f"Vector index restored from snapshot with {self._size} chunks")
+        return True
+
+    def _schedule_save(self):
+        # Coalesce bursts of ingest commits into one write
+        if self._save_timer is not None:
+            return
+        if (self.backend is None or not self.persist_path) and not self.snapshot_path:
+            return
+        self._save_timer = threading.Timer(self.save_delay, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, rows):
+        """Grow the backing buffers geometrically so appends stay amortised O(1)."""
+        needed = self._size + rows
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity * 2, needed)
+        matrix = np.empty((new_capacity, self.dim), dtype=np.dtype(self.storage_dtype))
+        ids = np.empty(new_capacity, dtype=np.int64)
+        doc_ids = np.empty(new_capacity, dtype=np.int64)
+        keys = np.empty(new_capacity, dtype=np.uint64)
+        scales = np.empty(new_capacity, dtype=np.float32) if self.storage_dtype == 'int8' else None
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+            doc_ids[:self._size] = self._doc_ids[:self._size]
+            keys[:self._size] = self._keys[:self._size]
+            if scales is not None:
+                scales[:self._size] = self._scales[:self._size]
+        self._matrix = matrix
+        self._ids = ids
+        self._doc_ids = doc_ids
+        self._keys = keys
+        self._scales = scales
+
+    def _rebuild_partitions(self):
+        doc_ids = self._doc_ids[:self._size]
+        order = np.argsort(doc_ids, kind='stable')
+        unique, starts = np.unique(doc_ids[order], return_index=True)
+        self._partitions = {
+            int(doc_id): rows for doc_id, rows in zip(unique, np.split(order, starts[1:]))
+        }
+
+    def add(self, ids, embeddings, document_ids=None, content_hashes=None):
+        """Append embeddings for the given chunk ids.
+
+        Args:
+            ids (list): DocumentChunk ids
+            embeddings (list): Matching float embeddings (raw float32 bytes, lists or arrays)
+            document_ids (list or int): Owning document of each chunk, or one id for all
+            content_hashes (list): Their content hashes, for the snapshot fingerprint
+        Returns:
+            int: Number of rows added
+        """
+        ids = list(ids)
+        vectors = [to_vector(e) for e in embeddings]
+        if document_ids is None or np.isscalar(document_ids):
+            document_ids = [-1 if document_ids is None else document_ids] * len(ids)
+        keys = row_keys(ids, content_hashes)
+        with self._lock:
+            publish = self.shared and not self._bulk_loading
+            if publish:
+                # Never publish a generation built on an index that failed to load
+                self.retry_load(force=True)
+                self._follow(self.snapshot.stamp(), report=True)
+            keep_ids, keep_docs, keep_keys, keep_vectors = [], [], [], []
+            for chunk_id, document_id, key, vector in zip(ids, document_ids, keys, vectors):
+                if vector is None or vector.ndim != 1 or not vector.size:
+                    continue
+                if self.dim is None:
+                    self.dim = vector.shape[0]
+                if vector.shape[0] != self.dim:
+                    print(f"Skipping chunk {chunk_id}: dimension {vector.shape[0]} != {self.dim}")
+                    continue
+                keep_ids.append(chunk_id)
+                keep_docs.append(document_id)
+                keep_keys.append(key)
+                keep_vectors.append(vector)
+
+            if not keep_ids:
+                return 0
+
+            vectors = np.stack(keep_vectors)
+            rows, scales = quantize(vectors, self.storage_dtype)
+            if publish:
+                return self._append_shared(np.asarray(keep_ids, dtype=np.int64),
+                                           np.asarray(keep_docs, dtype=np.int64),
+                                           np.asarray(keep_keys, dtype=np.uint64), rows, scales)
+
+            self._reserve(len(keep_ids))
+            end = self._size + len(keep_ids)
+            self._matrix[self._size:end] = rows
+            if scales is not None:
+                self._scales[self._size:end] = scales
+            self._ids[self._size:end] = keep_ids
+            self._doc_ids[self._size:end] = keep_docs
+            self._keys[self._size:end] = keep_keys
+            self._extend(end)
+
+            if not self._bulk_loading:
+                if self.backend is not None and not self.backend.add(keep_ids, vectors):
+                    # IVF needs enough vectors to train before it can take adds
+                    if self._size >= self.backend.min_train_size():
+                        self._build_backend()
+                self._schedule_save()
+            return len(keep_ids)
+
+    def remove(self, ids):
+        """Drop the rows belonging to the given chunk ids."""
+        ids = list(ids)
+        with self._lock:
+            if self.shared:
+                return self._remove_shared(np.asarray(ids, dtype=np.int64))
+            if not self._size:
+                return 0
+            keep = ~np.isin(self._ids[:self._size], np.asarray(ids, dtype=np.int64))
+            removed = self._size - int(keep.sum())
+            if removed:
+                kept = int(keep.sum())
+                self._matrix[:kept] = self._matrix[:self._size][keep]
+                self._ids[:kept] = self._ids[:self._size][keep]
+                self._doc_ids[:kept] = self._doc_ids[:self._size][keep]
+                self._keys[:kept] = self._keys[:self._size][keep]
+                if self._scales is not None:
+                    self._scales[:kept] = self._scales[:self._size][keep]
+                self._size = kept
+                self._rebuild_partitions()
+                self._changes += 1
+                if self.backend is not None:
+                    self.backend.remove(ids)
+                    if self.backend.needs_compaction():
+                        self._build_backend()
+                self._schedule_save()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._ids = np.empty(0, dtype=np.int64)
+            self._doc_ids = np.empty(0, dtype=np.int64)
+            self._keys = np.empty(0, dtype=np.uint64)
+            self._partitions = {}
+            self._matrix = None
+            self._scales = None
+            self._size = 0
+            self._ids_sorted = True
+            self.dim = None
+            self._snapshot_meta = None
+            self._snapshot_stamp = None
+            self._changes += 1
+
+    def _extend(self, end):
+        """Take the rows written past the current size, up to ``end``, into the index."""
+        start = self._size
+        ids = self._ids[start:end]
+        if self._ids_sorted and end > start:
+            self._ids_sorted = bool(np.all(ids[1:] > ids[:-1])) and (not start or ids[0] > self._ids[start - 1])
+        doc_ids = self._doc_ids[start:end]
+        new_rows = np.arange(start, end)
+        for document_id in np.unique(doc_ids):
+            rows = new_rows[doc_ids == document_id]
+            existing = self._partitions.get(int(document_id))
+            self._partitions[int(document_id)] = rows if existing is None else np.concatenate([existing, rows])
+        self._size = end
+        self.loaded = True
+        self._changes += 1
+
+    def _find(self, ids):
+        """Row of each chunk id, and whether the id is in the index at all."""
+        stored = self._ids[:self._size]
+        if self._ids_sorted:
+            rows = np.minimum(np.searchsorted(stored, ids), self._size - 1)
+        else:
+            order = np.argsort(stored, kind='stable')
+            rows = order[np.minimum(np.searchsorted(stored[order], ids), self._size - 1)]
+        return rows, stored[rows] == ids
+
+    def refresh(self):
+        """Follow the snapshot generations other workers publish (shared mode only).
+
+        Costs one stat of the CURRENT file when nothing changed. Appended
+        rows are picked up in the existing mapping; a rewritten generation
+        is remapped.
+
+        Returns:
+            bool: True when the index moved to a newer generation
+        """
+        if not self.shared:
+            return False
+        stamp = self.snapshot.stamp()
+        if stamp == self._snapshot_stamp:
+            return False
+        with self._lock:
+            return self._follow(stamp, report=True)
+
+    def take_peer_changes(self):
+        """Chunks other workers added and removed since the last call.
+
+        Returns:
+            tuple: (added chunk ids, their document ids, removed chunk ids)
+        """
+        with self._lock:
+            added, removed = self._peer_added, self._peer_removed
+            self._peer_added, self._peer_removed = [], []
+        return ([int(i) for ids, _ in added for i in ids],
+                [int(d) for _, doc_ids in added for d in doc_ids],
+                [int(i) for ids in removed for i in ids])
+
+    def _follow(self, stamp, report):
+        """Catch up with the generation CURRENT names; ``report`` keeps the rows
+        that changed for take_peer_changes()."""
+        if stamp is None or stamp == self._snapshot_stamp:
+            return False
+        meta = self.snapshot.read()
+        current = self._snapshot_meta
+        if meta is None or (current is not None and meta['generation'] == current['generation']):
+            self._snapshot_stamp = stamp
+            return False
+        if current is not None and meta['directory'] == current['directory'] and meta['size'] >= self._size:
+            # Rows were appended in place; the mapping already covers them
+            start = self._size
+            self._extend(meta['size'])
+            self._snapshot_meta = meta
+            self._snapshot_stamp = stamp
+            added_rows = np.arange(start, self._size)
+            removed = np.empty(0, dtype=np.int64)
+        else:
+            old_ids = np.array(self._ids[:self._size])
+            self._install(meta, stamp)
+            self._changes += 1
+            added_rows = np.nonzero(~np.isin(self._ids[:self._size], old_ids))[0]
+            removed = np.setdiff1d(old_ids, self._ids[:self._size])
+        self._snapshot_changes = self._changes
+        if report:
+            if added_rows.size:
+                self._peer_added.append((np.array(self._ids[added_rows]), np.array(self._doc_ids[added_rows])))
+            if removed.size:
+                self._peer_removed.append(removed)
+        if self.backend is not None:
+            if removed.size:
+                self.backend.remove(removed.tolist())
+            if added_rows.size and not self.backend.add(self._ids[added_rows].tolist(), self._vectors(added_rows)):
+                if self._size >= self.backend.min_train_size():
+                    self._build_backend()
+            elif self.backend.needs_compaction():
+                self._build_backend()
+        return True
+
+    def _append_shared(self, ids, doc_ids, keys, rows, scales):
+        """Publish new rows to the shared snapshot, then map them like any worker."""
+        with self.snapshot.lock():
+            self._follow(self.snapshot.stamp(), report=True)
+            if self._size:
+                # A worker that rebuilt from the database after our commit already has them
+                fresh = ~self._find(ids)[1]
+                ids, doc_ids, keys, rows = ids[fresh], doc_ids[fresh], keys[fresh], rows[fresh]
+                scales = scales[fresh] if scales is not None else None
+            if not ids.size:
+                return 0
+            arrays = {'matrix': rows, 'ids': ids, 'doc_ids': doc_ids, 'keys': keys, 'scales': scales}
+            meta = self._snapshot_meta
+            if meta is not None and meta['size'] + ids.size <= meta['capacity']:
+                self.snapshot.append(meta, arrays, extend_fingerprint(meta['fingerprint'], keys))
+            else:
+                # Out of room: copy into a new generation with space to grow
+                size = self._size + ids.size
+                existing = self._arrays()
+                blocks = {key: None if block is None else [existing[key][:self._size], block] if self._size else block
+                          for key, block in arrays.items()}
+                self.snapshot.write(blocks, size, max(self._initial_capacity, size * 2),
+                                    new_meta(self.storage_dtype, self.dim,
+                                             np.concatenate([self._keys[:self._size], keys])))
+            self._follow(self.snapshot.stamp(), report=False)
+        return int(ids.size)
+
+    def _remove_shared(self, ids):
+        """Publish a compacted generation without the given chunk ids."""
+        with self.snapshot.lock():
+            self._follow(self.snapshot.stamp(), report=True)
+            if not self._size:
+                return 0
+            keep = ~np.isin(self._ids[:self._size], ids)
+            kept = int(keep.sum())
+            removed = self._size - kept
+            if removed:
+                arrays = {key: None if array is None else array[:self._size][keep]
+                          for key, array in self._arrays().items()}
+                self.snapshot.write(arrays, kept, max(self._initial_capacity, kept * 2),
+                                    new_meta(self.storage_dtype, self.dim, arrays['keys']))
+                self._follow(self.snapshot.stamp(), report=False)
+            return removed
+
+    def rebuild(self, batch_size=5000, build_backend=True):
+        """Reload every chunk embedding from the database.
+
+        Only the id, content hash and embedding columns are selected, so
+        chunk text is never hydrated.
+        """
+        # Shared: other workers' appends wait until the rebuilt generation is live
+        with self._lock, self._snapshot_lock():
+            self.clear()
+            self._bulk_loading = True
+            try:
+                self._load_rows(batch_size)
+            except BaseException:
+                # Leave an empty index rather than a partial one
+                self.clear()
+                raise
+            finally:
+                self._bulk_loading = False
+            self.loaded = True
+            print(f"Vector index loaded with {self._size} chunks")
+            if self.shared:
+                self.save_snapshot()
+            if self.backend is not None and build_backend:
+                self._build_backend()
+                self._schedule_save()
+            return self._size
+
+    def _load_rows(self, batch_size):
+        from .models import db, DocumentChunk
+
+        query = db.session.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content_hash,
+                                 DocumentChunk.embedding, DocumentChunk.embedding_dtype,
+                                 DocumentChunk.embedding_scale) \
+            .order_by(DocumentChunk.id) \
+            .yield_per(batch_size)
+        ids, document_ids, hashes, embeddings = [], [], [], []
+        for chunk_id, document_id, chunk_hash, embedding, dtype, scale in query:
+            ids.append(chunk_id)
+            document_ids.append(document_id)
+            hashes.append(chunk_hash)
+            embeddings.append(decode_embedding(embedding, dtype, scale))
+            if len(ids) >= batch_size:
+                self.add(ids, embeddings, document_ids, hashes)
+                ids, document_ids, hashes, embeddings = [], [], [], []
+        if ids:
+            self.add(ids, embeddings, document_ids, hashes)
+
+    def _score_rows(self, query, rows=None):
+        """Score a slice (``rows`` None) or a gathered set of matrix rows."""
+        if rows is not None:
+            scales = self._scales[rows] if self._scales is not None else None
+            return score_block(self._matrix[rows], query, scales)
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, self._size)
+            block_scales = self._scales[start:end] if self._scales is not None else None
+            scores[start:end] = score_block(self._matrix[start:end], query, block_scales)
+        return scores
+
+    def _top_k(self, scores, k, rows=None):
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return [(int(self._ids[p]), float(s)) for p, s in zip(positions, scores[top])]
+
+    def search(self, query, k=3, exact=False, document_ids=None, per_document=False):
+        """Return the top-k (chunk_id, score) pairs by dot-product similarity.
+
+        Args:
+            query: Question embedding
+            k (int): Number of results (per document when ``per_document``)
+            exact (bool): Skip the ANN backend even if one is configured
+            document_ids (list): Only search these documents' partitions
+            per_document (bool): Take the top-k of every partition and merge,
+                so each document is represented (for comparisons)
+        """
+        query = to_vector(query)
+        with self._lock:
+            if not self._size or query is None or query.shape[0] != self.dim:
+                return []
+            if document_ids is not None:
+                return self._search_partitions(query, k, document_ids, per_document)
+            if not exact and self.backend is not None and self.backend.ready:
+                ids, scores = self.backend.search(query, k)
+                return [(int(i), float(s)) for i, s in zip(ids, scores)]
+            return self._top_k(self._score_rows(query), k)
+
+    def _search_partitions(self, query, k, document_ids, per_document):
+        """Exact search over the given documents only: O(chunks in those documents)."""
+        partitions = [self._partitions[d] for d in dict.fromkeys(document_ids) if d in self._partitions]
+        if not partitions:
+            return []
+        if per_document:
+            hits = []
+            for rows in partitions:
+                hits.extend(self._top_k(self._score_rows(query, rows), k, rows))
+            return sorted(hits, key=lambda hit: hit[1], reverse=True)
+        rows = np.concatenate(partitions) if len(partitions) > 1 else partitions[0]
+        return self._top_k(self._score_rows(query, rows), k, rows)
+
+    def vectors(self, ids):
+        """Float32 embeddings of the given chunk ids, read from the index.
+
+        Returns:
+            tuple: (ids found, in the given order; their embeddings as a matrix)
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            if not self._size or not ids.size:
+                return [], np.empty((0, self.dim or 0), dtype=np.float32)
+            rows, found = self._find(ids)
+            rows = rows[found]
+            return [int(i) for i in self._ids[rows]], self._vectors(rows)
+
+    def document_size(self, document_id):
+        """Number of indexed chunks belonging to a document."""
+        with self._lock:
+            rows = self._partitions.get(document_id)
+            return 0 if rows is None else len(rows)
+
+def default_index_path(app, kind):
+    """Place the ANN index file alongside the SQLite database when there is one."""
+    return os.path.join(data_directory(app), f"vector_index.{kind}.faiss")
+
+
+def default_snapshot_path(app):
+    """Snapshot directory alongside the SQLite database, named after it."""
+    from .models import db
+
+    database = db.engine.url.database
+    name = os.path.splitext(os.path.basename(database))[0] if database else 'memory'
+    return os.path.join(data_directory(app), f"{name}.vector_index.snapshot")
+
+
+def evaluate_recall(index, k=10, queries=100, seed=0):
+    """Compare ANN results with exact search using stored vectors as queries.
+
+    Returns:
+        dict: recall@k plus mean exact and ANN latencies in milliseconds
+    """
+    with index._lock:
+        if not index._size:
+            return {'queries': 0}
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(index._size, size=min(queries, index._size), replace=False)
+        sample = index._vectors(rows)
+
+    recalls, exact_ms, ann_ms = [], [], []
+    for query in sample:
+        start = time.perf_counter()
+        truth = {i for i, _ in index.search(query, k, exact=True)}
+        exact_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        found = {i for i, _ in index.search(query, k)}
+        ann_ms.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(truth & found) / max(len(truth), 1))
+
+    return {
+        'backend': index.backend.kind if index.backend is not None else 'exact',
+        'chunks': len(index),
+        'queries': len(sample),
+        'k': k,
+        'recall': round(float(np.mean(recalls)), 4),
+        'exact_ms': round(float(np.mean(exact_ms)), 3),
+        'ann_ms': round(float(np.mean(ann_ms)), 3),
+    }
+
+
+def register_commands(app):
+    import click
+
+    @app.cli.command('index-eval')
+    @click.option('--k', default=10, help='Neighbours per query')
+    @click.option('--queries', default=100, help='Number of sampled queries')
+    def index_eval(k, queries):
+        """Measure ANN recall and latency against exact search."""
+        click.echo(evaluate_recall(vector_index, k=k, queries=queries))
+
+    @app.cli.command('index-rebuild')
+    def index_rebuild():
+        """Rebuild the vector index (and ANN index) from the database."""
+        vector_index.rebuild()
+        vector_index.save()
+
+
+# Initialize vector index as a singleton
+vector_index = VectorIndex()
@@ -0,0 +1,36 @@
+import threading
+import time
+from .metrics import STARTUP_SECONDS
+
+
+def _warm_up(app):
+    start_time = time.perf_counter()
+    try:
+        # langchain takes seconds to import; /api/scrape would otherwise pay for it
+        from web_scraper import web_base_loader
+        web_base_loader()
+    except Exception as e:
+        print(f"Warm-up could not load the web scraper: {str(e)}")
+
+    tokenizer = app.config.get('CHUNK_TOKENIZER')
+    if tokenizer:
+        try:
+            from .chunking import token_length
+            token_length(tokenizer)
+        except Exception as e:
+            print(f"Warm-up could not load tokenizer {tokenizer}: {str(e)}")
+    STARTUP_SECONDS.set(round(time.perf_counter() - start_time, 3), phase='warmup')
+
+
+def start_warmup(app):
+    """Load heavy, rarely needed modules in a background thread.
+
+    The app starts serving without them; the first request that needs one
+    finds it already imported, or imports it itself if warm-up has not got
+    there yet. Disable with WARMUP = False.
+    """
+    if not app.config.get('WARMUP', True):
+        return None
+    thread = threading.Thread(target=_warm_up, args=(app,), name='warmup', daemon=True)
+    thread.start()
+    return thread
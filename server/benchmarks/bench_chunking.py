@@ -0,0 +1,118 @@
+"""Micro-benchmark: streaming chunker vs the previous LLMService.chunk_text.
+
+Run from the server directory:
+
+    python benchmarks/bench_chunking.py --sizes 1 4 16
+
+Each size is a synthetic policy document of that many megabytes. Reports
+best wall time, throughput, peak Python memory (tracemalloc) and chunk counts.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chunking import iter_chunks  # noqa: E402
+from benchmarks.corpus import policy_document  # noqa: E402
+
+
+def legacy_chunk_text(text, chunk_size=512):
+    """LLMService.chunk_text as it was before the streaming chunker."""
+    paragraphs = text.split('\n\n')
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for paragraph in paragraphs:
+        sentences = [s.strip() for s in paragraph.split('.') if s.strip()]
+        for sentence in sentences:
+            sentence = sentence.strip() + '.'
+            sentence_length = len(sentence)
+            if sentence_length > chunk_size:
+                words = sentence.split()
+                temp_chunk = []
+                temp_length = 0
+                for word in words:
+                    word_length = len(word) + 1
+                    if temp_length + word_length > chunk_size:
+                        chunks.append(' '.join(temp_chunk))
+                        temp_chunk = [word]
+                        temp_length = word_length
+                    else:
+                        temp_chunk.append(word)
+                        temp_length += word_length
+                if temp_chunk:
+                    chunks.append(' '.join(temp_chunk))
+                continue
+            if current_length + sentence_length > chunk_size and current_chunk:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = [sentence]
+                current_length = sentence_length
+            else:
+                current_chunk.append(sentence)
+                current_length += sentence_length
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def stream_pieces(text, piece_size=64 * 1024):
+    """Feed the text in pieces, like reading a file or a response body."""
+    for start in range(0, len(text), piece_size):
+        yield text[start:start + piece_size]
+
+
+def measure(name, run, megabytes, repeat=3):
+    # Timed runs without tracemalloc, whose hooks would skew the comparison
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = run()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'chunker': name,
+        'megabytes': megabytes,
+        'chunks': chunks,
+        'seconds': round(elapsed, 4),
+        'mb_per_second': round(megabytes / elapsed, 2) if elapsed > 0 else None,
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='Document sizes in MB')
+    parser.add_argument('--chunk-size', type=int, default=512)
+    parser.add_argument('--overlap', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per chunker (best is kept)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for megabytes in args.sizes:
+        text = policy_document(megabytes)
+        results.append(measure('legacy chunk_text', lambda: len(
+            legacy_chunk_text(text, args.chunk_size)), megabytes, args.repeat))
+        results.append(measure('iter_chunks', lambda: sum(
+            1 for _ in iter_chunks(text, args.chunk_size, args.overlap)), megabytes, args.repeat))
+        results.append(measure('iter_chunks (streamed input)', lambda: sum(
+            1 for _ in iter_chunks(stream_pieces(text), args.chunk_size, args.overlap)), megabytes, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'chunker':<30} {'MB':>6} {'chunks':>8} {'seconds':>9} {'MB/s':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['chunker']:<30} {r['megabytes']:>6} {r['chunks']:>8} {r['seconds']:>9} "
+              f"{r['mb_per_second']:>8} {r['peak_mb']:>8}")
+
+
+if __name__ == '__main__':
+    main()
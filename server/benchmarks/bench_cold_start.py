@@ -0,0 +1,98 @@
+"""Benchmark: cold start to the first answered /ask, with and without the index snapshot.
+
+Builds one SQLite database of --chunks synthetic chunks, then starts the
+app in a fresh Python process three times:
+
+- rebuild: snapshot disabled, so the vector index is rebuilt from SQLite
+- snapshot_write: first boot with the snapshot on, which rebuilds and writes it
+- snapshot_restore: next boot, which memory-maps the snapshot
+
+Each boot reports the seconds from process spawn to app import, to
+create_app returning and to the first answered /ask, plus the app's own
+rag_startup_seconds phases. Run from the server directory:
+
+    python benchmarks/bench_cold_start.py --chunks 100000 --dim 384
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def child():
+    """One boot: import, create the app and ask until the first answer arrives."""
+    spawned_at = float(os.environ['BENCH_SPAWNED_AT'])
+    result = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import create_app
+        result['import_seconds'] = round(time.time() - spawned_at, 3)
+        app = create_app()
+        result['create_app_seconds'] = round(time.time() - spawned_at, 3)
+        client = app.test_client()
+        response = client.post('/ask', json={'question': 'What does the policy say about refunds?'})
+        if response.status_code != 200:
+            raise RuntimeError(f"/ask failed: {response.get_json()}")
+        result['first_ask_seconds'] = round(time.time() - spawned_at, 3)
+        phases = {}
+        for line in client.get('/metrics').get_data(as_text=True).splitlines():
+            if line.startswith('rag_startup_seconds{'):
+                phase = line.split('phase="', 1)[1].split('"', 1)[0]
+                phases[phase] = float(line.rsplit(' ', 1)[1])
+        result['startup_phases'] = phases
+    print(json.dumps(result))
+
+
+def boot(env):
+    env = dict(env, BENCH_SPAWNED_AT=repr(time.time()))
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], cwd=SERVER_DIR, env=env,
+                            check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    from benchmarks.bench_e2e import bulk_fill
+    from benchmarks.stub_ollama import StubOllama
+
+    with StubOllama(dim=args.dim) as stub, tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, 'cold_start.db')
+        snapshot = os.path.join(workdir, 'cold_start.snapshot')
+        env = dict(os.environ, OLLAMA_HOST=stub.url, FLASK_EMBEDDING_CACHE_PATH='',
+                   FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{database}",
+                   FLASK_EMBEDDING_DTYPE=args.dtype, FLASK_ANSWER_CACHE_SIZE='0')
+
+        os.environ.update(env, FLASK_VECTOR_SNAPSHOT_PATH='')
+        with contextlib.redirect_stdout(sys.stderr):
+            from app import create_app
+            from app.models import db
+            app = create_app()
+            with app.app_context():
+                db.create_all()
+                fill_seconds = bulk_fill(args.chunks, args.dim, args.dtype, seed=0)
+        print(f"Filled {args.chunks} chunks in {fill_seconds}s", file=sys.stderr)
+
+        results = {}
+        for name, snapshot_path in (('rebuild', ''), ('snapshot_write', snapshot), ('snapshot_restore', snapshot)):
+            results[name] = boot(dict(env, FLASK_VECTOR_SNAPSHOT_PATH=snapshot_path))
+            print(f"{name}: {results[name]}", file=sys.stderr)
+
+    print(json.dumps({'chunks': args.chunks, 'dim': args.dim, 'dtype': args.dtype, 'boots': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark and check: bulk crawls through /api/crawl against local sites.
+
+Starts a stub Ollama and two stub sites (benchmarks/stub_site.py), which
+count as two hosts, then crawls every page twice:
+
+- first crawl: every page is downloaded and ingested
+- second crawl, after one page per site changed: unchanged pages are
+  answered 304 to the cached ETag and skipped, changed pages re-ingested
+
+For each crawl it reports seconds, job outcome counts and, per host, the
+requests and statuses served, the most requests in flight, the spacing
+and sustained rate of request starts and the TCP connections opened. It
+exits with status 1 if a check fails: the per-host concurrency and rate
+limits held, connections were reused from the shared session, and the
+second crawl skipped exactly the unchanged pages. Run from the server directory:
+
+    python benchmarks/bench_crawl.py --pages 20 --per-host-concurrency 2 --per-host-rate 20
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_ollama import StubOllama  # noqa: E402
+from benchmarks.stub_site import StubSite, page_html  # noqa: E402
+
+
+def crawl(client, sites):
+    for site in sites:
+        site.reset_stats()
+    start = time.perf_counter()
+    response = client.post('/api/crawl', json={'urls': [url for site in sites for url in site.urls()]})
+    if response.status_code != 202:
+        raise RuntimeError(f"/api/crawl failed: {response.get_json()}")
+    while True:
+        job = client.get(response.get_json()['status_url']).get_json()
+        if job['state'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    return {
+        'seconds': round(time.perf_counter() - start, 3),
+        'state': job['state'],
+        'counts': job['counts'],
+        'hosts': [site.stats() for site in sites],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20, help='Pages per site')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Stub site delay per request')
+    parser.add_argument('--per-host-concurrency', type=int, default=2)
+    parser.add_argument('--per-host-rate', type=float, default=20.0, help='Request starts per second per host')
+    args = parser.parse_args()
+
+    with StubOllama(dim=64) as stub, \
+            StubSite(args.pages, args.latency_ms / 1000) as first, \
+            StubSite(args.pages, args.latency_ms / 1000) as second, \
+            tempfile.TemporaryDirectory() as workdir, \
+            contextlib.redirect_stdout(sys.stderr):
+        sites = [first, second]
+        # Set before the app modules create their singletons
+        os.environ.update(OLLAMA_HOST=stub.url, FLASK_EMBEDDING_CACHE_PATH='', FLASK_VECTOR_SNAPSHOT_PATH='',
+                          FLASK_WARMUP='false', FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{workdir}/crawl.db",
+                          FLASK_CRAWL_PER_HOST_CONCURRENCY=str(args.per_host_concurrency),
+                          FLASK_CRAWL_PER_HOST_RATE=str(args.per_host_rate))
+        from main import app
+        from app.models import db
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+
+        results = {'first': crawl(client, sites)}
+        for site in sites:
+            site.set_page('/page/0', page_html(0, revision=1))
+        results['second'] = crawl(client, sites)
+
+    pages = 2 * args.pages
+    hosts = [host for run in results.values() for host in run['hosts']]
+    checks = {
+        'first_crawl_ingested_all': results['first']['counts'] == {'ingested': pages},
+        'second_crawl_skipped_unchanged': results['second']['counts'] == {'not_modified': pages - 2,
+                                                                          'ingested': 2},
+        'second_crawl_downloaded_changed_only': all(host['statuses'] == {304: args.pages - 1, 200: 1}
+                                                    for host in results['second']['hosts']),
+        'per_host_concurrency': all(host['max_in_flight'] <= args.per_host_concurrency for host in hosts),
+        # Sustained, since single gaps seen by the server jitter around the client's spacing
+        'per_host_rate': all(host['start_rate'] is None or host['start_rate'] <= 1.05 * args.per_host_rate
+                             for host in hosts),
+        'connections_reused': all(host['connections'] <= args.per_host_concurrency for host in hosts),
+    }
+    print(json.dumps({'config': vars(args), 'results': results, 'checks': checks}, indent=2))
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""End-to-end benchmark: ingestion throughput, /ask and retrieval latency per corpus size.
+
+Starts a stub Ollama server, so no model is needed. Run from the server
+directory:
+
+    python benchmarks/bench_e2e.py --sizes 1000 10000 100000 --output results.json
+
+For every size a fresh SQLite database is built: up to --ingest-chunks
+chunks go through the real ingestion path (chunk, embed over HTTP,
+store, index) to measure throughput, and the rest of the corpus is
+bulk-inserted with synthetic vectors. Results are JSON, to diff runs.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from benchmarks.corpus import synthetic_chunks, questions  # noqa: E402
+from benchmarks.stub_ollama import StubOllama  # noqa: E402
+
+CHUNKS_PER_DOCUMENT = 100
+FILL_BATCH_SIZE = 10000
+
+
+def latency_summary(samples):
+    """p50/p95/p99/mean in milliseconds from samples in seconds."""
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    }
+
+
+def rss_mb():
+    """Current resident set size, falling back to the peak where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if platform.system() != 'Darwin' else 1024 * 1024), 1)
+
+
+def ingest(client, count, seed):
+    """Push ``count`` chunks of text through /process_document."""
+    texts = list(synthetic_chunks(count, seed=seed))
+    chunks = 0
+    start = time.perf_counter()
+    for i in range(0, len(texts), CHUNKS_PER_DOCUMENT):
+        response = client.post('/process_document', json={
+            'url': f"https://bench.example/ingested/{i // CHUNKS_PER_DOCUMENT}",
+            'content': '\n\n'.join(texts[i:i + CHUNKS_PER_DOCUMENT]),
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"Ingestion failed: {response.get_json()}")
+        stats = response.get_json()['embedding_stats']
+        chunks += stats['chunks_embedded'] + stats['chunks_reused']
+    elapsed = time.perf_counter() - start
+    return {
+        'chunks': chunks,
+        'seconds': round(elapsed, 3),
+        'chunks_per_second': round(chunks / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def bulk_fill(count, dim, storage_dtype, seed):
+    """Insert ``count`` chunks with random unit vectors straight into the database."""
+    from sqlalchemy import func, insert
+    from app.models import db, Document, DocumentChunk
+    from app.ingest import content_hash
+    from app.vector_codec import encode_embedding
+
+    rng = np.random.default_rng(seed)
+    next_document = (db.session.query(func.max(Document.id)).scalar() or 0) + 1
+    texts = synthetic_chunks(count, seed=seed)
+    start = time.perf_counter()
+    for offset in range(0, count, FILL_BATCH_SIZE):
+        size = min(FILL_BATCH_SIZE, count - offset)
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        documents, chunks = [], []
+        for i, vector in enumerate(vectors):
+            text = next(texts)
+            position = offset + i
+            document_id = next_document + position // CHUNKS_PER_DOCUMENT
+            if position % CHUNKS_PER_DOCUMENT == 0:
+                documents.append({'id': document_id, 'url': f"https://bench.example/filled/{document_id}",
+                                  'content': text})
+            blob, vector_dim, dtype, scale = encode_embedding(vector, storage_dtype)
+            chunks.append({'document_id': document_id, 'content': text, 'content_hash': content_hash(text),
+                           'embedding': blob, 'embedding_dim': vector_dim, 'embedding_dtype': dtype,
+                           'embedding_scale': scale, 'chunk_index': position % CHUNKS_PER_DOCUMENT})
+        if documents:
+            db.session.execute(insert(Document), documents)
+        db.session.execute(insert(DocumentChunk), chunks)
+        db.session.commit()
+    return round(time.perf_counter() - start, 3)
+
+
+def run_size(size, args, workdir):
+    database = os.path.join(workdir, f"bench_{size}.db")
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database}"
+    os.environ['FLASK_ANSWER_CACHE_SIZE'] = '0'
+    os.environ['FLASK_EMBEDDING_DTYPE'] = args.dtype
+    # Each size starts from a fresh index; nothing is kept for the next run
+    os.environ['FLASK_VECTOR_SNAPSHOT_PATH'] = ''
+
+    from app import create_app
+    from app.models import db
+    from app.llm import llm_service
+    from app.retrieval import find_relevant_chunks
+    from app.vector_index import vector_index
+    from app.lexical_index import lexical_index
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    vector_index.clear()
+    lexical_index.clear()
+    client = app.test_client()
+    result = {'chunks': size, 'rss_mb_start': rss_mb()}
+
+    result['ingestion'] = ingest(client, min(size, args.ingest_chunks), seed=size)
+    # The chunker may split ingested texts further; fill up to the exact size
+    remaining = max(size - result['ingestion']['chunks'], 0)
+
+    with app.app_context():
+        result['bulk_fill_seconds'] = bulk_fill(remaining, args.dim, args.dtype, seed=size + 1)
+        start = time.perf_counter()
+        vector_index.rebuild()
+        result['vector_index_load_seconds'] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        lexical_index.rebuild()
+        result['lexical_index_load_seconds'] = round(time.perf_counter() - start, 3)
+
+        asked = questions(args.queries, seed=size)
+        embeddings = [llm_service.get_embedding(question) for question in asked]
+        result['retrieval'] = {}
+        for mode in args.retrieval:
+            samples = []
+            for question, embedding in zip(asked, embeddings):
+                start = time.perf_counter()
+                find_relevant_chunks(embedding, top_k=3, question=question, retrieval=mode)
+                samples.append(time.perf_counter() - start)
+            result['retrieval'][mode] = latency_summary(samples)
+
+    samples = []
+    for question in questions(args.queries, seed=size + 2):
+        start = time.perf_counter()
+        response = client.post('/ask', json={'question': question})
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/ask failed: {response.get_json()}")
+    result['ask'] = latency_summary(samples)
+
+    result['memory'] = {
+        'rss_mb': rss_mb(),
+        'vector_index_mb': round(vector_index._matrix.nbytes / 1024 / 1024, 1) if vector_index._matrix is not None else 0,
+        'lexical_terms': len(lexical_index._postings),
+        'database_mb': round(os.path.getsize(database) / 1024 / 1024, 1),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end RAG benchmark against a stub Ollama')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Corpus sizes in chunks (up to 1000000)')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimension served by the stub')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    parser.add_argument('--generate-latency-ms', type=float, default=0.0)
+    parser.add_argument('--ingest-chunks', type=int, default=2000,
+                        help='Chunks per size that go through the real ingestion path')
+    parser.add_argument('--queries', type=int, default=200, help='Questions per latency measurement')
+    parser.add_argument('--retrieval', nargs='+', default=['vector', 'bm25', 'hybrid'])
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    with StubOllama(dim=args.dim, embed_latency=args.embed_latency_ms / 1000,
+                    generate_latency=args.generate_latency_ms / 1000) as stub, \
+            tempfile.TemporaryDirectory() as workdir, \
+            contextlib.redirect_stdout(sys.stderr):
+        # The app logs with print(), so stdout is kept for the JSON report alone.
+        # These must be set before the app modules create their singletons
+        os.environ['OLLAMA_HOST'] = stub.url
+        os.environ['FLASK_EMBEDDING_CACHE_PATH'] = ''
+        results = []
+        for size in args.sizes:
+            print(f"Benchmarking {size} chunks...", file=sys.stderr)
+            results.append(run_size(size, args, workdir))
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark: question-embedding throughput under concurrent /ask load.
+
+Many threads each embed distinct questions, as concurrent /ask requests
+do, against a stub Ollama that processes one embedding call at a time.
+Compares one upstream call per question with the coalescing batcher.
+Run from the server directory:
+
+    python benchmarks/bench_embed_concurrency.py --threads 1 8 32 --embed-latency-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_cache import EmbeddingCache  # noqa: E402
+from app.llm import LLMService  # noqa: E402
+from benchmarks.corpus import questions  # noqa: E402
+from benchmarks.stub_ollama import StubOllama  # noqa: E402
+
+
+def run(embed, texts, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(embed, texts))
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': round(elapsed, 3),
+        'qps': round(len(texts) / elapsed, 1),
+        'failed': sum(1 for r in results if r is None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500, help='Questions embedded per run')
+    parser.add_argument('--embed-latency-ms', type=float, default=5.0, help='Stub cost of one embedding call')
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = []
+    with StubOllama(dim=384, embed_latency=args.embed_latency_ms / 1000, serial=True) as stub:
+        for threads in args.threads:
+            row = {'threads': threads}
+            for mode in ('direct', 'batched'):
+                # Fresh questions and an in-memory cache, so every lookup goes upstream
+                llm = LLMService(api_base=stub.url, embedding_cache=EmbeddingCache(),
+                                 embed_max_batch_size=args.max_batch_size,
+                                 embed_max_wait=args.max_wait_ms / 1000)
+                texts = [f"{q} ({mode} {threads} {i})" for i, q in enumerate(questions(args.requests))]
+                calls = stub.embed_calls
+                embed = llm._fetch_embedding if mode == 'direct' else llm.get_embedding
+                row[mode] = run(embed, texts, threads)
+                row[mode]['upstream_calls'] = stub.embed_calls - calls
+            results.append(row)
+            print(json.dumps(row), file=sys.stderr)
+
+    print(json.dumps({'embed_latency_ms': args.embed_latency_ms, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
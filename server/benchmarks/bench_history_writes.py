@@ -0,0 +1,127 @@
+"""Benchmark: chat history writes from concurrent /ask requests, and chunk inserts.
+
+Threads each record chat history rows, as concurrent /ask requests do,
+against a fresh SQLite database per mode:
+
+- baseline: rollback journal with synchronous=FULL, one commit per row
+  (SQLite's defaults, as before WAL tuning)
+- wal: the tuned pragmas (WAL, synchronous=NORMAL), one commit per row
+- write_behind: the tuned pragmas with the write-behind queue, which
+  commits rows in groups
+
+Reports rows per second (until every row is committed) and the p50/p95
+time a request spends recording its row. Also times inserting --chunks
+chunk rows as ORM objects against the bulk INSERT ... RETURNING used by
+ingestion. Run from the server directory:
+
+    python benchmarks/bench_history_writes.py --threads 1 8 32 --rows 2000
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import questions  # noqa: E402
+
+MODES = {
+    'baseline': ({'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': None,
+                  'cache_size': None, 'temp_store': None}, False),
+    'wal': ({}, False),
+    'write_behind': ({}, True),
+}
+
+
+def make_app(database, pragmas, write_behind):
+    os.environ.update(FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{database}", FLASK_VECTOR_SNAPSHOT_PATH='',
+                      FLASK_WARMUP='false', FLASK_EMBEDDING_CACHE_PATH='', FLASK_SQLITE_PRAGMAS=json.dumps(pragmas),
+                      FLASK_HISTORY_WRITE_BEHIND=json.dumps(write_behind))
+    from app import create_app
+    from app.models import db, Document
+    with contextlib.redirect_stdout(sys.stderr):
+        app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Document(id=1, url='https://bench.example/history', content='history'))
+        db.session.commit()
+    return app
+
+
+def history_writes(app, threads, rows):
+    from app.history_writer import history_writer
+
+    asked = questions(rows, seed=threads)
+
+    def record(question):
+        start = time.perf_counter()
+        with app.app_context():
+            history_writer.submit(question, 'An answer. ' * 20, 'Some context. ' * 100, 1)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = np.array(list(executor.map(record, asked))) * 1000
+    history_writer.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        'rows_per_second': round(rows / elapsed, 1),
+        'record_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'record_ms_p95': round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def chunk_inserts(app, count, dim):
+    from sqlalchemy import insert
+    from app.models import db, DocumentChunk
+
+    blob = np.zeros(dim, dtype=np.float32).tobytes()
+    rows = [{'document_id': 1, 'content': f"Chunk {i} of the bench document.", 'content_hash': f"{i:064x}",
+             'embedding': blob, 'embedding_dim': dim, 'embedding_dtype': 'float32', 'embedding_scale': None,
+             'chunk_index': i} for i in range(count)]
+    results = {}
+    with app.app_context():
+        start = time.perf_counter()
+        chunks = [DocumentChunk(**row) for row in rows]
+        db.session.add_all(chunks)
+        db.session.commit()
+        results['orm_seconds'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        statement = insert(DocumentChunk).returning(DocumentChunk.id, sort_by_parameter_order=True)
+        db.session.execute(statement, rows).all()
+        db.session.commit()
+        results['bulk_seconds'] = round(time.perf_counter() - start, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--rows', type=int, default=2000, help='Chat history rows per run')
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=384)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode, (pragmas, write_behind) in MODES.items():
+            for threads in args.threads:
+                app = make_app(os.path.join(workdir, f"{mode}-{threads}.db"), pragmas, write_behind)
+                row = dict(mode=mode, threads=threads, **history_writes(app, threads, args.rows))
+                results.append(row)
+                print(json.dumps(row), file=sys.stderr)
+        chunks = chunk_inserts(make_app(os.path.join(workdir, 'chunks.db'), {}, False), args.chunks, args.dim)
+
+    print(json.dumps({'rows': args.rows, 'history': results,
+                      'chunk_insert': dict(chunks=args.chunks, **chunks)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
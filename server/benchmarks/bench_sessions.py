@@ -0,0 +1,96 @@
+"""Benchmark: time to first token on follow-up questions, with and without sessions.
+
+Starts a stub Ollama that charges --prompt-latency-ms per 1000 prompt
+characters before the first token, as prompt evaluation does, and asks
+--conversations conversations of --turns streamed questions each:
+
+- stateless: every question is a new /ask with the full prompt
+- session: the first question starts a session and the follow-ups
+  continue it, sending Ollama's token context with only the new question
+  and chunks not yet in it
+
+Reports time to the first streamed token for the opening questions and
+for the follow-ups. Run from the server directory:
+
+    python benchmarks/bench_sessions.py --conversations 20 --turns 5 --prompt-latency-ms 200
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_e2e import ingest, latency_summary  # noqa: E402
+from benchmarks.corpus import questions  # noqa: E402
+from benchmarks.stub_ollama import StubOllama  # noqa: E402
+
+
+def first_token(client, body):
+    """Seconds until the first token event of a streamed /ask, and the session id."""
+    start = time.perf_counter()
+    response = client.post('/ask', json=dict(body, stream=True))
+    if response.status_code != 200:
+        raise RuntimeError(f"/ask failed: {response.get_json()}")
+    elapsed, session_id = None, None
+    for event in response.response:
+        event = event.decode() if isinstance(event, bytes) else event
+        if elapsed is None and event.startswith('event: token'):
+            elapsed = time.perf_counter() - start
+        if event.startswith('event: done'):
+            session_id = json.loads(event.split('data: ', 1)[1]).get('session_id')
+    response.close()
+    return elapsed, session_id
+
+
+def conversations(client, mode, count, turns, seed):
+    opening, follow_up = [], []
+    for conversation in range(count):
+        session_id = None
+        for turn, question in enumerate(questions(turns, seed=seed + conversation)):
+            body = {'question': question}
+            if mode == 'session':
+                body.update({'session_id': session_id} if session_id else {'session': True})
+            elapsed, session_id = first_token(client, body)
+            (follow_up if turn else opening).append(elapsed)
+    return {'opening': latency_summary(opening), 'follow_up': latency_summary(follow_up)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=5, help='Questions per conversation')
+    parser.add_argument('--chunks', type=int, default=500, help='Chunks ingested before asking')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--prompt-latency-ms', type=float, default=200.0,
+                        help='Stub prompt evaluation time per 1000 characters')
+    args = parser.parse_args()
+
+    with StubOllama(dim=args.dim, prompt_latency=args.prompt_latency_ms / 1000) as stub, \
+            tempfile.TemporaryDirectory() as workdir, \
+            contextlib.redirect_stdout(sys.stderr):
+        # Set before the app modules create their singletons
+        os.environ.update(OLLAMA_HOST=stub.url, FLASK_EMBEDDING_CACHE_PATH='', FLASK_VECTOR_SNAPSHOT_PATH='',
+                          FLASK_WARMUP='false', FLASK_ANSWER_CACHE_SIZE='0',
+                          FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'sessions.db')}")
+        from app import create_app
+        from app.models import db
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        ingest(client, args.chunks, seed=0)
+        results = {mode: conversations(client, mode, args.conversations, args.turns, seed=1000)
+                   for mode in ('stateless', 'session')}
+        with app.app_context():
+            from app.sessions import session_store
+            results['sessions'] = session_store.stats()
+
+    print(json.dumps({'config': vars(args), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark: memory and /ask throughput of gunicorn workers, private vs shared vector index.
+
+Builds one SQLite database of --chunks synthetic chunks, then serves it
+with gunicorn (gunicorn.conf.py) at each --workers count in two modes:
+
+- private: snapshot disabled, so every worker rebuilds the index from
+  SQLite into its own memory
+- shared: VECTOR_INDEX_SHARED, every worker maps the same snapshot
+
+Reports the workers' total proportional set size (shared pages split
+between the processes that map them), the seconds until every worker has
+its index, and /ask throughput from --clients concurrent clients. Run
+from the server directory (Linux, for /proc):
+
+    python benchmarks/bench_workers.py --chunks 100000 --workers 1 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from benchmarks.bench_e2e import bulk_fill  # noqa: E402
+from benchmarks.corpus import questions  # noqa: E402
+from benchmarks.stub_ollama import StubOllama  # noqa: E402
+
+PORT = 18321
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        return int(re.search(r'^Pss:\s+(\d+) kB', f.read(), re.M).group(1)) / 1024
+
+
+def serve(env, workers, log_path):
+    """Start gunicorn and wait until every worker has loaded its vector index."""
+    env = dict(env, WEB_CONCURRENCY=str(workers), GUNICORN_BIND=f"127.0.0.1:{PORT}", PYTHONUNBUFFERED='1')
+    start = time.perf_counter()
+    log = open(log_path, 'w')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                              cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    while True:
+        with open(log_path) as f:
+            if len(re.findall(r'^Vector index (loaded|restored)', f.read(), re.M)) >= workers:
+                break
+        if server.poll() is not None or time.perf_counter() - start > 600:
+            raise RuntimeError(f"gunicorn did not start; see {log_path}")
+        time.sleep(0.1)
+    return server, round(time.perf_counter() - start, 3)
+
+
+def load(clients, requests_count, seed):
+    def ask(question):
+        response = requests.post(f"http://127.0.0.1:{PORT}/ask", json={'question': question}, timeout=120)
+        if response.status_code != 200:
+            raise RuntimeError(f"/ask failed: {response.text}")
+
+    asked = questions(requests_count, seed=seed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(ask, asked))
+    return round(requests_count / (time.perf_counter() - start), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    args = parser.parse_args()
+
+    results = []
+    with StubOllama(dim=args.dim) as stub, tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, 'workers.db')
+        env = dict(os.environ, OLLAMA_HOST=stub.url, FLASK_EMBEDDING_CACHE_PATH='', FLASK_WARMUP='false',
+                   FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{database}", FLASK_ANSWER_CACHE_SIZE='0')
+        os.environ.update(env, FLASK_VECTOR_SNAPSHOT_PATH='')
+        with contextlib.redirect_stdout(sys.stderr):
+            from app import create_app
+            from app.models import db
+            app = create_app()
+            with app.app_context():
+                db.create_all()
+                bulk_fill(args.chunks, args.dim, 'float32', seed=0)
+
+        for workers in args.workers:
+            for mode in ('private', 'shared'):
+                mode_env = dict(env, FLASK_VECTOR_SNAPSHOT_PATH='', FLASK_VECTOR_INDEX_SHARED='false') \
+                    if mode == 'private' else \
+                    dict(env, FLASK_VECTOR_SNAPSHOT_PATH=os.path.join(workdir, 'snapshot'))
+                server, ready_seconds = serve(mode_env, workers, os.path.join(workdir, f"{mode}-{workers}.log"))
+                try:
+                    qps = load(args.clients, args.requests, seed=workers)
+                    children = subprocess.run(['pgrep', '-P', str(server.pid)], capture_output=True,
+                                              text=True).stdout.split()
+                    row = {
+                        'workers': workers,
+                        'mode': mode,
+                        'ready_seconds': ready_seconds,
+                        'ask_qps': qps,
+                        'pss_mb_total': round(sum(pss_mb(pid) for pid in children), 1),
+                    }
+                finally:
+                    server.terminate()
+                    server.wait()
+                results.append(row)
+                print(json.dumps(row), file=sys.stderr)
+
+    print(json.dumps({'chunks': args.chunks, 'dim': args.dim, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Synthetic terms-and-conditions text for the benchmarks."""
+import random
+
+CLAUSES = [
+    "The Company may share personal data with service providers acting on its behalf",
+    "Any dispute arising under this Agreement shall be resolved by binding arbitration",
+    "You waive any right to participate in a class action or class-wide arbitration",
+    "Data subjects in the European Union have rights under the GDPR, including erasure",
+    "We retain account records for as long as necessary to comply with legal obligations",
+    "This policy may be amended at any time by posting the revised version on the site",
+    "Cookies and similar technologies are used to remember preferences and measure usage",
+    "Liability is limited to the fees paid in the twelve months preceding the claim",
+    "Either party may terminate this Agreement with thirty days written notice",
+    "Payments are non-refundable except where required by applicable consumer law",
+    "The licence granted is personal, non-transferable and revocable at any time",
+    "Notices shall be sent to the email address associated with your account",
+]
+
+TOPICS = ["privacy", "payments", "termination", "liability", "arbitration", "cookies",
+          "data retention", "governing law", "intellectual property", "warranties"]
+
+QUESTIONS = [
+    "Is there a class action waiver?",
+    "How long is my data retained?",
+    "Can I get a refund?",
+    "How do I terminate the agreement?",
+    "What rights do I have under the GDPR?",
+    "Is arbitration binding?",
+    "What is the limit of liability?",
+    "Are cookies used to track me?",
+]
+
+
+def paragraph(rng, section):
+    """One clause paragraph; the section number keeps paragraphs distinct."""
+    sentences = [rng.choice(CLAUSES) + rng.choice(['.', ';', ', and']) for _ in range(rng.randint(2, 8))]
+    return f"({section}.{rng.randint(1, 99)}) " + ' '.join(sentences)
+
+
+def policy_document(megabytes, seed=0):
+    """A legal-policy-like text of roughly ``megabytes`` MB: sections of clause paragraphs."""
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size, section = [], 0, 1
+    while size < target:
+        heading = f"Section {section}. {rng.choice(TOPICS).title()}\n\n"
+        part = heading + '\n\n'.join(paragraph(rng, section) for _ in range(rng.randint(2, 6))) + '\n\n'
+        parts.append(part)
+        size += len(part)
+        section += 1
+    return ''.join(parts)
+
+
+def synthetic_chunks(count, seed=0):
+    """Yield ``count`` distinct chunk-sized clause paragraphs."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield f"Section {i}. {rng.choice(TOPICS).title()}. " + paragraph(rng, i)
+
+
+def questions(count, seed=0):
+    """Distinct benchmark questions, so the answer cache never short-circuits them."""
+    rng = random.Random(seed)
+    return [f"{rng.choice(QUESTIONS)} (clause {i}, {rng.choice(TOPICS)})" for i in range(count)]
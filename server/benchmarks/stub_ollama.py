@@ -0,0 +1,153 @@
+"""Local stand-in for the Ollama API, for benchmarks and offline development.
+
+Implements /api/embeddings, /api/embed and /api/generate (plain and
+streamed) with configurable latency and vector dimension. With ``serial``
+embedding calls are processed one at a time, as by a single local model
+runner, so per-call latency is paid once per batch. Embeddings are
+deterministic unit vectors seeded from the text, so repeated texts embed
+identically. ``prompt_latency`` is charged per 1000 characters of prompt
+before the first token, as prompt evaluation is; /api/generate returns a
+token context that grows by the prompt and answer, and a request that
+sends it back only pays for its own prompt.
+
+    python benchmarks/stub_ollama.py --port 11434 --dim 768 --embed-latency-ms 5
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+class StubOllama:
+    def __init__(self, dim=768, embed_latency=0.0, generate_latency=0.0, answer_tokens=32,
+                 host='127.0.0.1', port=0, serial=False, prompt_latency=0.0):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.serial = serial
+        self.embed_calls = 0
+        self._embed_lock = threading.Lock()
+        self.generate_latency = generate_latency
+        self.answer_tokens = answer_tokens
+        self.prompt_latency = prompt_latency
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _embed_call(self, texts):
+        if self.serial:
+            with self._embed_lock:
+                self.embed_calls += 1
+                time.sleep(self.embed_latency)
+        else:
+            self.embed_calls += 1
+            time.sleep(self.embed_latency)
+        return [self.embed(text) for text in texts]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; don't let Nagle hold the body back
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload):
+                line = json.dumps(payload).encode() + b'\n'
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if self.path == '/api/embeddings':
+                    return self._send_json({'embedding': stub._embed_call([body['prompt']])[0]})
+                if self.path == '/api/embed':
+                    inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+                    return self._send_json({'embeddings': stub._embed_call(inputs)})
+                if self.path == '/api/generate':
+                    tokens = [f" token{i}" for i in range(stub.answer_tokens)]
+                    # Roughly four characters per token
+                    context = list(body.get('context') or []) + [1] * (len(body['prompt']) // 4 + len(tokens))
+                    time.sleep(stub.prompt_latency * len(body['prompt']) / 1000)
+                    if not body.get('stream'):
+                        time.sleep(stub.generate_latency)
+                        return self._send_json({'response': ''.join(tokens).strip(), 'done': True,
+                                                'context': context})
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-ndjson')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(stub.generate_latency / max(len(tokens), 1))
+                        self._send_chunk({'response': token, 'done': False})
+                    self._send_chunk({'response': '', 'done': True, 'context': context})
+                    self.wfile.write(b'0\r\n\r\n')
+                    return
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Ollama API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--dim', type=int, default=768, help='Embedding dimension')
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0, help='Delay per embedding request')
+    parser.add_argument('--generate-latency-ms', type=float, default=0.0, help='Delay per generated answer')
+    parser.add_argument('--prompt-latency-ms', type=float, default=0.0,
+                        help='Delay per 1000 prompt characters, before the first token')
+    parser.add_argument('--answer-tokens', type=int, default=32)
+    parser.add_argument('--serial', action='store_true', help='Process embedding calls one at a time')
+    args = parser.parse_args()
+
+    stub = StubOllama(args.dim, args.embed_latency_ms / 1000, args.generate_latency_ms / 1000,
+                      args.answer_tokens, args.host, args.port, args.serial, args.prompt_latency_ms / 1000)
+    print(f"Stub Ollama listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Local web site for crawl benchmarks and offline development.
+
+Serves HTML pages with an ETag and Last-Modified, answers a matching
+If-None-Match or If-Modified-Since with 304, and records what the crawler
+did: requests and their status, the spacing and rate of request starts,
+the most requests in flight at once and the TCP connections opened.
+``latency`` is spent on every request, so per-host concurrency limits
+show up in the counts.
+
+    python benchmarks/stub_site.py --port 8081 --pages 20 --latency-ms 50
+"""
+import argparse
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def page_html(index, revision=0):
+    return (f"<html><head><title>Terms {index}</title></head><body>"
+            f"<h1>Terms and conditions, page {index}</h1>"
+            f"<p>Revision {revision}. Refunds are issued within {14 + index} days of a request. "
+            f"Subscriptions renew monthly unless cancelled before the renewal date.</p></body></html>")
+
+
+class StubSite:
+    def __init__(self, pages=10, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self._pages = {}
+        self._lock = threading.Lock()
+        for index in range(pages):
+            self.set_page(f"/page/{index}", page_html(index))
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self):
+        return [self.url + path for path in sorted(self._pages)]
+
+    def set_page(self, path, html):
+        """Serve ``html`` at ``path`` with fresh validators."""
+        body = html.encode()
+        with self._lock:
+            self._pages[path] = (body, f'"{hashlib.sha1(body).hexdigest()}"', formatdate(usegmt=True))
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = []          # (path, status, start time)
+            self.connections = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def stats(self):
+        """Counts since the last reset_stats()."""
+        with self._lock:
+            starts = sorted(start for _, _, start in self.requests)
+            statuses = {}
+            for _, status, _ in self.requests:
+                statuses[status] = statuses.get(status, 0) + 1
+            return {
+                'requests': len(self.requests),
+                'statuses': statuses,
+                'connections': self.connections,
+                'max_in_flight': self.max_in_flight,
+                'min_start_interval': round(min((b - a for a, b in zip(starts, starts[1:])), default=0.0), 4),
+                # Sustained request starts per second, from first to last
+                'start_rate': round((len(starts) - 1) / (starts[-1] - starts[0]), 2) if len(starts) > 1 else None,
+            }
+
+    def _not_modified(self, headers, etag, last_modified):
+        if headers.get('If-None-Match') is not None:
+            return etag in [tag.strip() for tag in headers['If-None-Match'].split(',')]
+        since = headers.get('If-Modified-Since')
+        if since:
+            try:
+                return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # One handler per TCP connection; keep-alive requests reuse it
+                with site._lock:
+                    site.connections += 1
+
+            def do_GET(self):
+                start = time.perf_counter()
+                with site._lock:
+                    site.in_flight += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                    page = site._pages.get(self.path)
+                try:
+                    time.sleep(site.latency)
+                    if page is None:
+                        status = 404
+                        self.send_response(404)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    body, etag, last_modified = page
+                    status = 304 if site._not_modified(self.headers, etag, last_modified) else 200
+                    self.send_response(status)
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                    if status == 304:
+                        self.end_headers()
+                        return
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with site._lock:
+                        site.in_flight -= 1
+                        site.requests.append((self.path, status, start))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub web site with ETag/Last-Modified validators')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay per request')
+    args = parser.parse_args()
+
+    site = StubSite(args.pages, args.latency_ms / 1000, args.host, args.port)
+    print(f"Stub site listening on {site.url}, pages /page/0 to /page/{args.pages - 1}")
+    try:
+        site._server.serve_forever()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
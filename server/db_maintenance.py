@@ -0,0 +1,73 @@
+"""Retention and compaction for the RAG database.
+
+Purges chat history by age or count, deletes superseded documents with
+their chunks and index entries, then frees pages with incremental VACUUM
+and runs ANALYZE. Rows are deleted in small batches, each its own
+transaction, so requests are never locked out for long. Prints a JSON
+report of rows deleted, bytes reclaimed and time spent.
+
+History purges and compaction are safe next to a live server. Deleting
+chunks is too only with FLASK_VECTOR_INDEX_SHARED=true, where the removals
+go to the shared snapshot that every worker follows. A non-shared server
+keeps its own indexes and answer cache, which this process cannot reach,
+so without shared mode chunks are only deleted with --offline, once every
+server is stopped; they rebuild their indexes when they start. Otherwise
+use POST /api/maintenance on the running server.
+
+    python db_maintenance.py --history-max-age-days 90 --history-max-rows 100000
+    python db_maintenance.py --everything --offline   # what dbcleaup.py used to do
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history-max-age-days', type=float, help='Delete chat history older than this')
+    parser.add_argument('--history-max-rows', type=int, help='Keep only the newest chat history rows')
+    parser.add_argument('--keep-superseded', action='store_true',
+                        help='Keep older documents of a re-ingested URL and orphaned chunks')
+    parser.add_argument('--no-vacuum', action='store_true', help='Skip incremental VACUUM and ANALYZE')
+    parser.add_argument('--convert', action='store_true',
+                        help='Switch an older database to incremental auto_vacuum (one full, blocking VACUUM)')
+    parser.add_argument('--everything', action='store_true', help='Delete all documents, chunks and chat history')
+    parser.add_argument('--offline', action='store_true',
+                        help='No server is running: allow deleting chunks without a shared vector index')
+    parser.add_argument('--batch-size', type=int, help='Rows per delete transaction (MAINTENANCE_BATCH_SIZE)')
+    parser.add_argument('--pause-ms', type=float, help='Pause between batches (MAINTENANCE_PAUSE_MS)')
+    args = parser.parse_args()
+
+    # Set before the app modules create their singletons: maintenance never searches, so
+    # skip the index builds and warm-up; a shared index still follows the snapshot to publish removals
+    os.environ.update(FLASK_VECTOR_INDEX_LOAD='false', FLASK_LEXICAL_INDEX_LOAD='false',
+                      FLASK_VECTOR_INDEX_BACKEND='exact', FLASK_WARMUP='false')
+    from app import create_app
+    from app.maintenance import run_maintenance
+
+    # stdout carries only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        app = create_app()
+        deletes_chunks = args.everything or not args.keep_superseded
+        if deletes_chunks and not app.config.get('VECTOR_INDEX_SHARED', False) and not args.offline:
+            parser.error("deleting chunks would leave them in a running server's index; set "
+                         "FLASK_VECTOR_INDEX_SHARED=true, pass --offline with every server stopped, "
+                         "--keep-superseded, or use POST /api/maintenance")
+        with app.app_context():
+            report = run_maintenance(
+                history_max_age_days=args.history_max_age_days,
+                history_max_rows=args.history_max_rows,
+                superseded=not args.keep_superseded,
+                vacuum=not args.no_vacuum,
+                convert=args.convert,
+                everything=args.everything,
+                batch_size=args.batch_size,
+                pause_ms=args.pause_ms,
+            )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Multi-process serving: gunicorn -c gunicorn.conf.py main:app
+
+Workers share one memory-mapped vector index (VECTOR_INDEX_SHARED), so
+adding workers does not multiply the embedding matrix in memory.
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('FLASK_VECTOR_INDEX_SHARED', 'true')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Generation can take a couple of minutes on CPU-only Ollama
+timeout = 180
+# Each worker creates the app itself: the index, job and batcher threads
+# started by create_app would not survive a fork from a preloaded master
+preload_app = False
@@ -0,0 +1,105 @@
+"""Compact embedding storage
+
+Replaces the pickled embedding columns with raw LargeBinary vectors plus
+dim/dtype/scale metadata. Existing rows are converted in batches and
+quantized to the app's EMBEDDING_DTYPE (e.g. FLASK_EMBEDDING_DTYPE=int8;
+default float32).
+
+Revision ID: 3c9e1f7a2b40
+Revises: fa96afbd8bda
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+import pickle
+from alembic import op
+from flask import current_app
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f7a2b40'
+down_revision = 'fa96afbd8bda'
+branch_labels = None
+depends_on = None
+
+TABLES = ('document', 'document_chunk')
+BATCH_SIZE = 500
+
+
+def _quantize(vector, dtype):
+    if dtype == 'float16':
+        return vector.astype(np.float16).tobytes(), None
+    if dtype == 'int8':
+        scale = float(np.abs(vector).max() / 127.0) or 1.0
+        return np.clip(np.rint(vector / scale), -127, 127).astype(np.int8).tobytes(), scale
+    return vector.astype(np.float32).tobytes(), None
+
+
+def _unpickle_vector(value):
+    # The routes stored ndarray.tobytes() into a PickleType column
+    obj = pickle.loads(value)
+    if isinstance(obj, (bytes, bytearray)):
+        return np.frombuffer(obj, dtype=np.float32)
+    return np.asarray(obj, dtype=np.float32)
+
+
+def _convert_rows(conn, table, convert, columns='embedding'):
+    """Rewrite every embedding of ``table`` in keyset-paginated batches."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(f"SELECT id, {columns} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        updates = [convert(*row) for row in rows if row[1] is not None]
+        if updates:
+            conn.execute(
+                sa.text(f"UPDATE {table} SET embedding = :embedding, embedding_dim = :dim, "
+                        f"embedding_dtype = :dtype, embedding_scale = :scale WHERE id = :id"),
+                updates
+            )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    dtype = current_app.config.get('EMBEDDING_DTYPE', 'float32')
+    if dtype not in ('float32', 'float16', 'int8'):
+        raise ValueError(f"Unsupported EMBEDDING_DTYPE: {dtype}")
+
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('embedding_dim', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('embedding_dtype', sa.String(length=8), nullable=True))
+            batch_op.add_column(sa.Column('embedding_scale', sa.Float(), nullable=True))
+
+    def convert(row_id, value):
+        vector = _unpickle_vector(value)
+        blob, scale = _quantize(vector, dtype)
+        return {'id': row_id, 'embedding': blob, 'dim': int(vector.shape[0]), 'dtype': dtype, 'scale': scale}
+
+    conn = op.get_bind()
+    for table in TABLES:
+        _convert_rows(conn, table, convert)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('embedding', existing_type=sa.PickleType(), type_=sa.LargeBinary())
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    def convert(row_id, value, dtype, scale):
+        vector = np.frombuffer(value, dtype=np.dtype(dtype or 'float32')).astype(np.float32)
+        if dtype == 'int8':
+            vector = vector * np.float32(scale or 1.0)
+        return {'id': row_id, 'embedding': pickle.dumps(vector.tobytes()), 'dim': None, 'dtype': None, 'scale': None}
+
+    for table in TABLES:
+        _convert_rows(conn, table, convert, columns='embedding, embedding_dtype, embedding_scale')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('embedding', existing_type=sa.LargeBinary(), type_=sa.PickleType())
+            batch_op.drop_column('embedding_scale')
+            batch_op.drop_column('embedding_dtype')
+            batch_op.drop_column('embedding_dim')
@@ -1,18 +1,13 @@
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.llms import LlamaCpp
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from transformers import AutoTokenizer
+from app.chunking import iter_chunks
 # Global variables to store the QA chain and vector store
 qa_chain = None
 vector_store = None
 
 def create_vector_store(text):
-    # Initialize tokenizer for token-aware text splitting
-    tokenizer = AutoTokenizer.from_pretrained("all-MiniLM-L6-v2")
-    
+    # langchain, transformers and llama.cpp are slow to import; load them on first use
+    from langchain.embeddings import HuggingFaceEmbeddings
+    from langchain.vectorstores import FAISS
+
     # Preprocess text more efficiently
     import re
     text = re.sub(r'[\r\n\t]+', ' ', text)  # Replace newlines and tabs with spaces
@@ -20,14 +15,8 @@ def create_vector_store(text):
     text = re.sub(r'[^\w\s.,!?-]', '', text)  # Remove special characters
     text = text.strip()
     
-    # Use RecursiveCharacterTextSplitter for better token handling
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=512,
-        chunk_overlap=50,
-        length_function=len,
-        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-    )
-    chunks = text_splitter.split_text(text)
+    # 512-character chunks with 50 characters of overlap, broken at natural boundaries
+    chunks = [chunk.text for chunk in iter_chunks(text, chunk_size=512, overlap=50)]
     
     # Create embeddings using a lightweight model
     embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
@@ -41,6 +30,10 @@ def create_vector_store(text):
     return vector_store
 
 def setup_qa_chain(vector_store):
+    from langchain.llms import LlamaCpp
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.memory import ConversationBufferMemory
+
     # Initialize the LLaMA model with optimized parameters
     llm = LlamaCpp(
         model_path="models/llama-2-7b-chat.gguf",
@@ -1,59 +1,253 @@
-from langchain.document_loaders import UnstructuredURLLoader, WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Optional
+from typing import Iterator, List, NamedTuple, Optional
+from urllib.parse import urlparse
 import asyncio
+import queue
+import sqlite3
+import threading
 import aiohttp
 import time
+from bs4 import BeautifulSoup
+from app.chunking import iter_chunks
+
+
+class CrawlResult(NamedTuple):
+    url: str
+    status: Optional[int]          # HTTP status, None when the request failed
+    text: Optional[str]            # Page text; None when not modified or failed
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+class ResponseCache:
+    """ETag/Last-Modified validators of crawled pages, kept in SQLite.
+
+    A URL's validators are sent back as If-None-Match/If-Modified-Since on
+    the next crawl, so a page the server reports unchanged (304) is neither
+    downloaded nor re-ingested. Without a path nothing is remembered.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS crawl_cache ("
+                " url TEXT PRIMARY KEY,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def validators(self, url):
+        """Conditional request headers for ``url``, empty when it was never cached."""
+        if self._conn is None:
+            return {}
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM crawl_cache WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def put(self, url, etag=None, last_modified=None):
+        """Remember a page's validators; call once its content has been stored."""
+        if self._conn is None or not (etag or last_modified):
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawl_cache (url, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, etag, last_modified, time.time())
+            )
+            self._conn.commit()
+
+
+class HostLimiter:
+    """Per-host concurrency cap and minimum spacing between request starts."""
+
+    def __init__(self, concurrency=2, requests_per_second=2.0):
+        self.concurrency = concurrency
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._semaphores = {}
+        self._locks = {}
+        self._next_start = {}
+
+    async def acquire(self, host):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        await semaphore.acquire()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_start.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start[host] = loop.time() + self.interval
+
+    def release(self, host):
+        self._semaphores[host].release()
+
+
+def web_base_loader():
+    """The langchain WebBaseLoader class. langchain is slow to import, so it is
+    loaded on first use (or by the app's background warm-up)."""
+    from langchain.document_loaders import WebBaseLoader
+    return WebBaseLoader
+
+
+def extract_text(html):
+    """Visible text of an HTML page, as WebBaseLoader extracts it."""
+    return BeautifulSoup(html, "html.parser").get_text()
+
 
 class WebScraper:
-    def __init__(self, max_workers: int = 5, timeout: int = 30):
+    def __init__(self, max_workers: int = 5, timeout: int = 30, chunk_size: int = 512, chunk_overlap: int = 50,
+                 max_connections: int = 20, per_host_concurrency: int = 2, per_host_rate: float = 2.0,
+                 cache_path: Optional[str] = None, max_pending: int = 8,
+                 user_agent: str = "rag-crawler/1.0"):
         self.max_workers = max_workers
         self.timeout = timeout
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=512,
-            chunk_overlap=50,
-            length_function=len,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-        )
-    
-    async def _fetch_url_content(self, url: str) -> Optional[str]:
-        """Asynchronously fetch content from a single URL."""
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_connections = max_connections
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rate = per_host_rate
+        self.max_pending = max_pending
+        self.user_agent = user_agent
+        self.cache = ResponseCache(cache_path)
+
+    def fetch(self, url: str) -> str:
+        """Fetch the text of a single URL; the fetch stage of the ingestion pipeline."""
+        loader = web_base_loader()(url, requests_kwargs={"timeout": self.timeout})
+        documents = loader.load()
+        return documents[0].page_content if documents else ""
+
+    async def _fetch_page(self, session: aiohttp.ClientSession, limiter: HostLimiter, url: str,
+                          conditional: bool) -> CrawlResult:
+        """GET one URL within its host's limits."""
+        host = urlparse(url).netloc
+        headers = self.cache.validators(url) if conditional else {}
+        await limiter.acquire(host)
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return CrawlResult(url, 304, None)
+                if response.status >= 400:
+                    return CrawlResult(url, response.status, None, error=f"HTTP {response.status}")
+                html = await response.text(errors="replace")
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return CrawlResult(url, None, None, error=str(e) or type(e).__name__)
+        finally:
+            limiter.release(host)
+        # Parsing is CPU bound; keep it off the event loop
+        text = await asyncio.to_thread(extract_text, html)
+        return CrawlResult(url, response.status, text, etag, last_modified)
+
+    async def _crawl(self, urls: List[str], conditional: bool, results: "queue.Queue", stop: threading.Event):
+        limiter = HostLimiter(self.per_host_concurrency, self.per_host_rate)
+        # Pages fetched but not yet taken by the consumer count against this
+        # window, so a slow consumer holds back the crawl instead of buffering
+        window = asyncio.Semaphore(self.max_connections + self.max_pending)
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host_concurrency,
+                                         ttl_dns_cache=300)
+
+        async def fetch_and_hand_off(session, url):
+            async with window:
+                if stop.is_set():
+                    return
+                result = await self._fetch_page(session, limiter, url, conditional)
+                await asyncio.to_thread(results.put, result)
+
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                         headers={'User-Agent': self.user_agent}) as session:
+            await asyncio.gather(*(fetch_and_hand_off(session, url) for url in urls))
+
+    def crawl(self, urls: List[str], conditional: bool = True) -> Iterator[CrawlResult]:
+        """Fetch many URLs politely and yield each page as soon as it arrives.
+
+        All requests share one session and its connection pool. Each host
+        gets at most ``per_host_concurrency`` requests in flight, started
+        at most ``per_host_rate`` times a second. Pages are sent with the
+        cached ETag/Last-Modified, and a 304 is yielded without text.
+        Callers should store a page's validators with ``cache.put`` once
+        they have ingested it.
+
+        Only about ``max_pending`` fetched pages wait for the caller, so
+        ingesting slowly holds back the crawl instead of buffering pages.
+
+        Args:
+            urls (list): URLs to fetch; duplicates are fetched once
+            conditional (bool): Send cached validators; False always downloads
+        Yields:
+            CrawlResult: In completion order, not input order
+        """
+        urls = list(dict.fromkeys(urls))
+        results = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()
+        done = object()
+
+        def run():
+            try:
+                asyncio.run(self._crawl(urls, conditional, results, stop))
+            except Exception as e:
+                print(f"Crawl failed: {str(e)}")
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=run, name='crawler', daemon=True)
+        thread.start()
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                loader = WebBaseLoader(url, client=session)
-                documents = await loader.aload()
-                return documents[0].page_content if documents else None
-        except Exception as e:
-            print(f"Error fetching {url}: {str(e)}")
-            return None
+            while True:
+                result = results.get()
+                if result is done:
+                    break
+                yield result
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
     async def scrape_urls(self, urls: List[str]) -> List[str]:
         """Scrape multiple URLs concurrently and return their content."""
-        tasks = [self._fetch_url_content(url) for url in urls]
-        results = await asyncio.gather(*tasks)
-        return [r for r in results if r is not None]
+        return await asyncio.to_thread(
+            lambda: [r.text for r in self.crawl(urls, conditional=False) if r.text is not None]
+        )
 
     def process_content(self, content: str) -> List[str]:
         """Process and split the scraped content into chunks."""
-        return self.text_splitter.split_text(content)
+        return [chunk.text for chunk in iter_chunks(content, self.chunk_size, self.chunk_overlap)]
 
     def scrape_and_process(self, urls: List[str]) -> List[str]:
         """Main method to scrape URLs and process their content."""
         start_time = time.time()
-        
-        # Run async scraping in an event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        contents = loop.run_until_complete(self.scrape_urls(urls))
-        loop.close()
-        
-        # Process contents in parallel using ThreadPoolExecutor
+
+        # Chunk each page as soon as it is fetched
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            chunks = list(executor.map(self.process_content, contents))
-        
+            futures = [executor.submit(self.process_content, result.text)
+                       for result in self.crawl(urls, conditional=False) if result.text is not None]
+            chunks = [future.result() for future in futures]
+
         # Flatten the chunks list
         all_chunks = [chunk for sublist in chunks for chunk in sublist]
-        
+
         print(f"Scraped and processed {len(urls)} URLs in {time.time() - start_time:.2f} seconds")
-        return all_chunks
\ No newline at end of file
+        return all_chunks